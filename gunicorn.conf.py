@@ -0,0 +1,91 @@
+"""
+Gunicorn settings for the portal (loaded automatically from the working
+directory; see ranch_portal/runtime.py for how the numbers are chosen)
+
+Environment variables:
+
+    GUNICORN_WORKER_CLASS       gthread (default), sync, or uvicorn (serves the ASGI app)
+    WEB_CONCURRENCY             worker count; computed from CPUs and memory if unset
+    GUNICORN_THREADS            threads per gthread worker (default 4)
+    GUNICORN_WORKER_MEMORY_MB   memory budget per worker for the computed count (default 160)
+    GUNICORN_PRELOAD            load the app in the master and fork it (default True)
+    GUNICORN_MAX_REQUESTS       recycle each worker after this many requests (default 1000, 0 = never)
+    GUNICORN_MAX_REQUESTS_JITTER
+    GUNICORN_TIMEOUT            seconds before a silent worker is restarted (default 30)
+    STATSD_HOST                 host:port to send gunicorn's own metrics to
+"""
+import sys
+
+import decouple
+
+from ranch_portal import runtime
+
+
+_profile = runtime.server_profile(
+    worker_class=decouple.config('GUNICORN_WORKER_CLASS', default='gthread'),
+    workers=decouple.config('WEB_CONCURRENCY', default=0, cast=int),
+    threads=decouple.config('GUNICORN_THREADS', default=runtime.THREADS_PER_WORKER, cast=int),
+    worker_memory_mb=decouple.config('GUNICORN_WORKER_MEMORY_MB', default=runtime.WORKER_MEMORY_MB, cast=int),
+)
+
+worker_class = _profile['worker_class']
+workers = _profile['workers']
+threads = _profile['threads']
+# The application follows the worker class, so start gunicorn without one
+wsgi_app = _profile['app']
+
+# Import Django, the URLconf and every template once in the master (the
+# WSGI module warms the templates), so workers start at once and share
+# those pages of memory until they write to them
+preload_app = decouple.config('GUNICORN_PRELOAD', default=True, cast=bool)
+
+max_requests = decouple.config('GUNICORN_MAX_REQUESTS', default=runtime.MAX_REQUESTS, cast=int)
+max_requests_jitter = decouple.config('GUNICORN_MAX_REQUESTS_JITTER', default=runtime.MAX_REQUESTS_JITTER, cast=int)
+timeout = decouple.config('GUNICORN_TIMEOUT', default=30, cast=int)
+
+statsd_host = decouple.config('STATSD_HOST', default=None)
+statsd_prefix = 'ranch_portal'
+
+
+def when_ready(server):
+    server.log.info(
+        'Runtime profile: %d %s workers x %d threads, preload=%s, max_requests=%d (+%d jitter)',
+        workers, worker_class, threads, preload_app, max_requests, max_requests_jitter,
+    )
+
+
+def pre_fork(server, worker):
+    # Connections opened while loading the app must not be shared by the
+    # forked workers
+    if server.cfg.preload_app:
+        from django.core.cache import caches
+        from django.db import connections
+
+        connections.close_all()
+        caches.close_all()
+
+
+def post_worker_init(worker):
+    runtime.worker_stats.start(worker.cfg.worker_class_str, worker.cfg.threads, worker.max_requests)
+
+
+# gunicorn calls these for its own HTTP workers only; uvicorn workers
+# parse requests themselves, so their request counters stay at zero
+def pre_request(worker, req):
+    req.portal_started = runtime.worker_stats.request_started()
+
+
+def post_request(worker, req, environ, resp):
+    runtime.worker_stats.request_finished(req.portal_started, getattr(resp, 'status_code', None))
+
+
+def worker_exit(server, worker):
+    # Also done at interpreter exit; doing it here makes recycling explicit
+    audit = sys.modules.get('members.audit')
+    if audit:
+        audit.audit_writer.flush()
+    stats = runtime.worker_stats.snapshot()
+    server.log.info(
+        'Worker %s exiting after %d requests (%d errors), %.0f MB resident',
+        stats['pid'], stats['requests'], stats['errors'], stats['rss'] / 1024 / 1024,
+    )
@@ -1,13 +1,48 @@
 """
 Django Admin Configuration for Double C Ranch Portal
 """
-from django.contrib import admin
+import io
+
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+
+from .caching import cache_stats, reset_stats
+from .fragments import invalidate_sections
+from .forms import MemberImportUploadForm
+from .imports import CREATED, ERROR, SKIPPED, MemberImporter
+from .merge import MergeError, merge_members
 from .models import (
     User, Member, Document, SignedDocument,
     CheckIn, GoalRequest, Goal, GoalUpdate,
     Note, AuditLog
 )
+from .search import get_search_backend
+from .services import approve_checkins, invalidate_staff_dashboard
+from .summary import invalidate_member_summaries
+
+
+class DeferringChangeList(ChangeList):
+    """ChangeList that leaves its admin's changelist_defer columns unloaded"""
+
+    def get_queryset(self, request, *args, **kwargs):
+        return super().get_queryset(request, *args, **kwargs).defer(*self.model_admin.changelist_defer)
+
+
+class ChangelistDeferMixin:
+    """Leave large text columns in the database on changelist pages"""
+    changelist_defer = ()
+
+    def get_changelist(self, request, **kwargs):
+        if self.changelist_defer:
+            return DeferringChangeList
+        return super().get_changelist(request, **kwargs)
 
 
 @admin.register(User)
@@ -27,9 +62,10 @@ class UserAdmin(BaseUserAdmin):
 
 
 @admin.register(Member)
-class MemberAdmin(admin.ModelAdmin):
+class MemberAdmin(ChangelistDeferMixin, admin.ModelAdmin):
     """Member Admin"""
     list_display = ('full_name', 'membership_tier', 'status', 'attendance_all_time', 'last_checkin_at', 'created_at')
+    changelist_defer = ('search_text',)
     list_filter = ('status', 'membership_tier', 'certification_level')
     search_fields = ('first_name', 'last_name', 'parent_name', 'phone')
     readonly_fields = ('id', 'created_at', 'updated_at', 'attendance_30d', 'attendance_all_time', 'last_checkin_at')
@@ -51,23 +87,116 @@ class MemberAdmin(admin.ModelAdmin):
         }),
     )
     
-    actions = ['approve_members', 'disable_members']
+    actions = ['approve_members', 'disable_members', 'merge_selected_members']
+    
+    def get_urls(self):
+        return [
+            path(
+                'import/',
+                self.admin_site.admin_view(self.import_view),
+                name='members_member_import',
+            ),
+        ] + super().get_urls()
+    
+    def import_view(self, request):
+        """Upload a roster CSV and show what happened to each row that was not created"""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        
+        importer = None
+        problems = []
+        if request.method == 'POST':
+            form = MemberImportUploadForm(request.POST, request.FILES)
+            if form.is_valid():
+                importer = MemberImporter(actor=request.user)
+                lines = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+                try:
+                    problems = [result for result in importer.run(lines) if result.outcome != CREATED]
+                except UnicodeDecodeError:
+                    form.add_error('file', 'The file must be a UTF-8 encoded CSV.')
+                    importer = None
+                else:
+                    self.message_user(
+                        request,
+                        f'Created {importer.counts[CREATED]} members; skipped {importer.counts[SKIPPED]} '
+                        f'existing; {importer.counts[ERROR]} errors.',
+                        messages.WARNING if importer.counts[ERROR] else messages.SUCCESS,
+                    )
+        else:
+            form = MemberImportUploadForm()
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import roster',
+            'form': form,
+            'importer': importer,
+            'problems': problems,
+        }
+        return TemplateResponse(request, 'admin/members/member/import.html', context)
+    
+    def get_search_results(self, request, queryset, search_term):
+        # search_fields only enables the search box; matching uses the portal search backend
+        if not search_term:
+            return queryset, False
+        return get_search_backend().search(queryset, search_term), False
     
     def approve_members(self, request, queryset):
+        member_ids = list(queryset.values_list('pk', flat=True))
         updated = queryset.update(status='Approved')
+        invalidate_staff_dashboard()
+        invalidate_member_summaries(member_ids)
         self.message_user(request, f'{updated} members approved.')
     approve_members.short_description = "Approve selected members"
     
     def disable_members(self, request, queryset):
+        member_ids = list(queryset.values_list('pk', flat=True))
         updated = queryset.update(status='Disabled')
+        invalidate_staff_dashboard()
+        invalidate_member_summaries(member_ids)
         self.message_user(request, f'{updated} members disabled.')
     disable_members.short_description = "Disable selected members"
+    
+    def merge_selected_members(self, request, queryset):
+        """Ask which record to keep, then merge the rest into it"""
+        members = list(queryset.select_related('user').order_by('created_at'))
+        if len(members) < 2:
+            self.message_user(request, 'Select at least two members to merge.', messages.WARNING)
+            return None
+        
+        if request.POST.get('survivor'):
+            survivor = next((member for member in members if str(member.pk) == request.POST['survivor']), None)
+            if survivor is None:
+                self.message_user(request, 'Choose one of the selected members to keep.', messages.ERROR)
+                return None
+            try:
+                summary = merge_members(survivor, members, actor=request.user)
+            except MergeError as exc:
+                self.message_user(request, str(exc), messages.ERROR)
+                return None
+            self.message_user(
+                request,
+                f'Merged {len(summary["merged"])} members into {survivor}; '
+                f'moved {sum(summary["moved"].values())} related records.',
+            )
+            return None
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Merge members',
+            'members': members,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        }
+        return TemplateResponse(request, 'admin/members/member/merge.html', context)
+    merge_selected_members.short_description = "Merge selected members"
 
 
 @admin.register(Document)
-class DocumentAdmin(admin.ModelAdmin):
+class DocumentAdmin(ChangelistDeferMixin, admin.ModelAdmin):
     """Document Template Admin"""
     list_display = ('name', 'code', 'version', 'is_active', 'is_required', 'created_at')
+    changelist_defer = ('content',)
     list_filter = ('is_active', 'is_required')
     search_fields = ('name', 'code')
     readonly_fields = ('id', 'created_at', 'updated_at')
@@ -87,12 +216,14 @@ class DocumentAdmin(admin.ModelAdmin):
 
 
 @admin.register(SignedDocument)
-class SignedDocumentAdmin(admin.ModelAdmin):
+class SignedDocumentAdmin(ChangelistDeferMixin, admin.ModelAdmin):
     """Signed Document Admin"""
     list_display = ('member', 'document', 'signed_name', 'signed_at', 'ip_address')
+    changelist_defer = ('user_agent', 'document__content', 'member__search_text')
+    list_select_related = ('member', 'document')
     list_filter = ('signed_at', 'document')
     search_fields = ('member__first_name', 'member__last_name', 'signed_name', 'signed_for_name')
-    readonly_fields = ('id', 'signed_at', 'created_at', 'document_snapshot', 'ip_address', 'user_agent')
+    readonly_fields = ('id', 'signed_at', 'created_at', 'snapshot', 'document_snapshot', 'ip_address', 'user_agent')
     
     fieldsets = (
         ('Signature Details', {
@@ -102,7 +233,7 @@ class SignedDocumentAdmin(admin.ModelAdmin):
             'fields': ('signed_at', 'ip_address', 'user_agent')
         }),
         ('Legal Record', {
-            'fields': ('document_snapshot',),
+            'fields': ('snapshot', 'document_snapshot'),
             'classes': ('collapse',)
         }),
         ('System', {
@@ -139,21 +270,26 @@ class CheckInAdmin(admin.ModelAdmin):
     actions = ['approve_checkins', 'reject_checkins']
     
     def approve_checkins(self, request, queryset):
-        for checkin in queryset.filter(status='Pending'):
-            checkin.approve(request.user)
-        self.message_user(request, f'{queryset.count()} check-ins approved.')
+        approved = approve_checkins(queryset, request.user)
+        self.message_user(request, f'{approved} check-ins approved.')
     approve_checkins.short_description = "Approve selected check-ins"
     
     def reject_checkins(self, request, queryset):
-        updated = queryset.update(status='Rejected')
+        # updated_at moves the live check-in feed's cursor past these rows
+        member_ids = set(queryset.values_list('member_id', flat=True))
+        updated = queryset.update(status='Rejected', updated_at=timezone.now())
+        invalidate_staff_dashboard()
+        invalidate_member_summaries(member_ids)
+        invalidate_sections(member_ids, ['checkins'])
         self.message_user(request, f'{updated} check-ins rejected.')
     reject_checkins.short_description = "Reject selected check-ins"
 
 
 @admin.register(GoalRequest)
-class GoalRequestAdmin(admin.ModelAdmin):
+class GoalRequestAdmin(ChangelistDeferMixin, admin.ModelAdmin):
     """Goal Request Admin"""
     list_display = ('member', 'timeframe', 'status', 'created_at')
+    changelist_defer = ('content',)
     list_filter = ('status', 'created_at')
     search_fields = ('member__first_name', 'member__last_name', 'content')
     readonly_fields = ('id', 'created_at', 'updated_at')
@@ -170,9 +306,10 @@ class GoalRequestAdmin(admin.ModelAdmin):
 
 
 @admin.register(Goal)
-class GoalAdmin(admin.ModelAdmin):
+class GoalAdmin(ChangelistDeferMixin, admin.ModelAdmin):
     """Goal Admin"""
     list_display = ('member', 'title', 'status', 'target_date', 'created_by', 'created_at')
+    changelist_defer = ('description',)
     list_filter = ('status', 'target_date', 'created_at')
     search_fields = ('member__first_name', 'member__last_name', 'title', 'description')
     readonly_fields = ('id', 'created_at', 'updated_at')
@@ -189,9 +326,10 @@ class GoalAdmin(admin.ModelAdmin):
 
 
 @admin.register(GoalUpdate)
-class GoalUpdateAdmin(admin.ModelAdmin):
+class GoalUpdateAdmin(ChangelistDeferMixin, admin.ModelAdmin):
     """Goal Update Admin"""
     list_display = ('goal', 'author', 'author_type', 'created_at')
+    changelist_defer = ('note',)
     list_filter = ('author_type', 'created_at')
     search_fields = ('goal__title', 'note')
     readonly_fields = ('id', 'created_at')
@@ -208,9 +346,10 @@ class GoalUpdateAdmin(admin.ModelAdmin):
 
 
 @admin.register(Note)
-class NoteAdmin(admin.ModelAdmin):
+class NoteAdmin(ChangelistDeferMixin, admin.ModelAdmin):
     """Note Admin"""
     list_display = ('member', 'category', 'visibility', 'author', 'created_at')
+    changelist_defer = ('content',)
     list_filter = ('category', 'visibility', 'created_at')
     search_fields = ('member__first_name', 'member__last_name', 'content')
     readonly_fields = ('id', 'created_at', 'updated_at')
@@ -227,16 +366,17 @@ class NoteAdmin(admin.ModelAdmin):
 
 
 @admin.register(AuditLog)
-class AuditLogAdmin(admin.ModelAdmin):
+class AuditLogAdmin(ChangelistDeferMixin, admin.ModelAdmin):
     """Audit Log Admin"""
     list_display = ('actor', 'action', 'member', 'created_at')
-    list_filter = ('action', 'created_at')
+    changelist_defer = ('details',)
+    list_filter = ('action_code', 'created_at')
     search_fields = ('actor__email', 'member__first_name', 'member__last_name', 'action')
     readonly_fields = ('id', 'created_at', 'details')
     
     fieldsets = (
         ('Log Entry', {
-            'fields': ('actor', 'member', 'action', 'details')
+            'fields': ('actor', 'member', 'action', 'action_code', 'details')
         }),
         ('System', {
             'fields': ('id', 'created_at'),
@@ -249,3 +389,18 @@ class AuditLogAdmin(admin.ModelAdmin):
     
     def has_change_permission(self, request, obj=None):
         return False
+
+
+def cache_stats_view(request):
+    """Cache hit/miss rates per namespace, shown in the admin"""
+    if request.method == 'POST' and request.user.is_superuser:
+        reset_stats()
+        messages.success(request, 'Cache statistics reset.')
+        return redirect('admin_cache_stats')
+    
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Cache statistics',
+        'stats': cache_stats(),
+    }
+    return TemplateResponse(request, 'admin/cache_stats.html', context)
@@ -0,0 +1,219 @@
+"""
+Monthly AuditLog partitions and archival
+
+On PostgreSQL audit_log is range-partitioned by month of created_at (UTC),
+one ``audit_log_pYYYYMM`` table per month plus ``audit_log_default`` for
+anything outside them (see migration 0008). Archiving a month streams its
+rows to ``audit_log-YYYY-MM.jsonl.gz``, records the file in manifest.json,
+then drops the month's partition; on other databases, and for rows that
+landed in the default partition, the month is deleted with one DELETE.
+"""
+import gzip
+import hashlib
+import json
+import os
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import AuditLog
+
+
+PARTITION_PREFIX = 'audit_log_p'
+DEFAULT_PARTITION = 'audit_log_default'
+MANIFEST_NAME = 'manifest.json'
+ARCHIVE_FIELDS = ('id', 'created_at', 'actor_id', 'member_id', 'action', 'action_code', 'details')
+CHUNK_SIZE = 2000
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """[start, end) of a month as UTC datetimes"""
+    start = datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+    end_month = add_months(month, 1)
+    return start, datetime(end_month.year, end_month.month, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month):
+    return f'{PARTITION_PREFIX}{month:%Y%m}'
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid '
+            'WHERE c.relname = %s',
+            [AuditLog._meta.db_table],
+        )
+        return cursor.fetchone() is not None
+
+
+def existing_partitions():
+    """Names of the tables attached to audit_log"""
+    if not is_partitioned():
+        return set()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid '
+            'JOIN pg_class p ON p.oid = i.inhparent '
+            'WHERE p.relname = %s',
+            [AuditLog._meta.db_table],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def create_partition(cursor, month):
+    """
+    Add the month's partition, moving in any of its rows that already
+    landed in the default partition
+
+    PostgreSQL refuses to create a partition whose range the default
+    partition holds rows for, so the default is detached while they move
+    and attached again afterwards. The detach locks audit_log, so
+    concurrent writers wait rather than fail.
+    """
+    start, end = month_bounds(month)
+    table = AuditLog._meta.db_table
+    name = partition_name(month)
+    in_range = 'created_at >= %s AND created_at < %s'
+    stranded = False
+    if DEFAULT_PARTITION in existing_partitions():
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_range})', [start, end])
+        stranded = cursor.fetchone()[0]
+    if not stranded:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)',
+            [start, end],
+        )
+        return
+    with transaction.atomic():
+        cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {DEFAULT_PARTITION}')
+        cursor.execute(f'CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)', [start, end])
+        columns = ', '.join(field.column for field in AuditLog._meta.concrete_fields)
+        cursor.execute(
+            f'INSERT INTO {name} ({columns}) SELECT {columns} FROM {DEFAULT_PARTITION} WHERE {in_range}',
+            [start, end],
+        )
+        cursor.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE {in_range}', [start, end])
+        cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT')
+
+
+def ensure_partitions(months_ahead=3, today=None):
+    """
+    Create this month's partition and the next ``months_ahead``; returns
+    the new names. Rows that went to the default partition because a
+    month had none yet are moved into it.
+    """
+    if not is_partitioned():
+        return []
+    existing = existing_partitions()
+    this_month = month_start(today or timezone.now().astimezone(dt_timezone.utc))
+    created = []
+    with connection.cursor() as cursor:
+        for offset in range(months_ahead + 1):
+            month = add_months(this_month, offset)
+            if partition_name(month) not in existing:
+                create_partition(cursor, month)
+                created.append(partition_name(month))
+    return created
+
+
+def months_before(cutoff):
+    """Months holding entries older than ``cutoff``, oldest first"""
+    months = (
+        AuditLog.objects.filter(created_at__lt=cutoff)
+        .annotate(month=TruncMonth('created_at', tzinfo=dt_timezone.utc))
+        .order_by('month')
+        .values_list('month', flat=True)
+        .distinct()
+    )
+    return [month_start(month) for month in months]
+
+
+def month_entries(month):
+    start, end = month_bounds(month)
+    return AuditLog.objects.filter(created_at__gte=start, created_at__lt=end)
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def archive_month(month, directory):
+    """Write one month to a gzipped JSON Lines file; returns its manifest record"""
+    path = directory / f'audit_log-{month:%Y-%m}.jsonl.gz'
+    partial = path.with_name(path.name + '.partial')
+    rows = month_entries(month).order_by('created_at', 'id').values_list(*ARCHIVE_FIELDS)
+
+    count = 0
+    first = last = None
+    with gzip.open(partial, 'wt', encoding='utf-8') as fh:
+        for row in rows.iterator(chunk_size=CHUNK_SIZE):
+            entry = dict(zip(ARCHIVE_FIELDS, row))
+            fh.write(json.dumps(entry, cls=DjangoJSONEncoder, sort_keys=True) + '\n')
+            first = first or entry['created_at']
+            last = entry['created_at']
+            count += 1
+    os.replace(partial, path)
+
+    return {
+        'month': f'{month:%Y-%m}',
+        'file': path.name,
+        'rows': count,
+        'sha256': _file_sha256(path),
+        'first_created_at': first.isoformat() if first else None,
+        'last_created_at': last.isoformat() if last else None,
+        'archived_at': timezone.now().isoformat(),
+    }
+
+
+def read_manifest(directory):
+    path = directory / MANIFEST_NAME
+    if not path.exists():
+        return {'table': AuditLog._meta.db_table, 'fields': list(ARCHIVE_FIELDS), 'archives': []}
+    with open(path, encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def record_in_manifest(directory, record):
+    """Add or replace a month's record in manifest.json, written atomically"""
+    manifest = read_manifest(directory)
+    archives = [entry for entry in manifest['archives'] if entry['month'] != record['month']]
+    archives.append(record)
+    manifest['archives'] = sorted(archives, key=lambda entry: entry['month'])
+
+    path = directory / MANIFEST_NAME
+    partial = path.with_name(path.name + '.partial')
+    with open(partial, 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, indent=2)
+    os.replace(partial, path)
+    return manifest
+
+
+def purge_month(month):
+    """Remove an archived month: drop its partition, then delete any stragglers"""
+    name = partition_name(month)
+    with transaction.atomic():
+        if name in existing_partitions():
+            with connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE {AuditLog._meta.db_table} DETACH PARTITION {name}')
+                cursor.execute(f'DROP TABLE {name}')
+        month_entries(month).delete()
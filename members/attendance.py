@@ -0,0 +1,115 @@
+"""
+Rolling 30-day attendance
+
+Confirmed check-ins are counted per member per day in DailyAttendance.
+Member.attendance_30d is the sum of that member's counters inside the
+window. Approving a check-in refreshes only the affected counters and
+members; the recompute_attendance command expires days that fell out of
+the window for everyone in one UPDATE and can rebuild from CheckIn.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Member, CheckIn, DailyAttendance
+
+
+ATTENDANCE_WINDOW_DAYS = 30
+
+
+def window_start(today=None):
+    """First day counted in the rolling window"""
+    today = today or timezone.localdate()
+    return today - timedelta(days=ATTENDANCE_WINDOW_DAYS - 1)
+
+
+def _count_days(checkins):
+    """Upsert DailyAttendance from an aggregate of confirmed check-ins"""
+    rows = (
+        checkins.filter(status='Confirmed')
+        .annotate(day=TruncDate('requested_at'))
+        .order_by()
+        .values('member_id', 'day')
+        .annotate(total=Count('id'))
+    )
+    return DailyAttendance.objects.bulk_create(
+        [DailyAttendance(member_id=row['member_id'], day=row['day'], count=row['total']) for row in rows],
+        update_conflicts=True,
+        unique_fields=['member', 'day'],
+        update_fields=['count'],
+    )
+
+
+def refresh_attendance_30d(member_ids=None, today=None):
+    """Recompute attendance_30d from the daily counters in one UPDATE"""
+    in_window = (
+        DailyAttendance.objects.filter(member=OuterRef('pk'), day__gte=window_start(today))
+        .order_by()
+        .values('member')
+        .annotate(total=Sum('count'))
+        .values('total')
+    )
+    members = Member.objects.all()
+    if member_ids is not None:
+        members = members.filter(pk__in=member_ids)
+    return members.update(attendance_30d=Coalesce(Subquery(in_window), Value(0)))
+
+
+def record_attendance(visits):
+    """
+    Count newly confirmed check-ins
+
+    ``visits`` is an iterable of (member_id, requested_at) pairs. Only the
+    touched (member, day) counters are recounted, so approving the same
+    check-in twice can never double count.
+    """
+    visits = list(visits)
+    if not visits:
+        return
+    member_ids = {member_id for member_id, _ in visits}
+    days = {timezone.localdate(requested_at) for _, requested_at in visits}
+
+    _count_days(
+        CheckIn.objects.filter(member_id__in=member_ids)
+        .annotate(visit_day=TruncDate('requested_at'))
+        .filter(visit_day__in=days)
+    )
+    refresh_attendance_30d(member_ids)
+
+
+def expire_attendance(today=None):
+    """Drop counters older than the window and recompute every member"""
+    expired, _ = DailyAttendance.objects.filter(day__lt=window_start(today)).delete()
+    updated = refresh_attendance_30d(today=today)
+    return expired, updated
+
+
+def rebuild_attendance(today=None):
+    """
+    Rebuild the window's counters from CheckIn and recompute every member
+
+    In one transaction, so pages never see the counters emptied.
+    """
+    with transaction.atomic():
+        DailyAttendance.objects.all().delete()
+        _count_days(
+            CheckIn.objects.annotate(visit_day=TruncDate('requested_at'))
+            .filter(visit_day__gte=window_start(today))
+        )
+        return refresh_attendance_30d(today=today)
+
+
+def recount_attendance(member_ids, today=None):
+    """Rebuild the window's counters for some members, e.g. after their check-ins moved"""
+    member_ids = list(member_ids)
+    with transaction.atomic():
+        DailyAttendance.objects.filter(member_id__in=member_ids).delete()
+        _count_days(
+            CheckIn.objects.filter(member_id__in=member_ids)
+            .annotate(visit_day=TruncDate('requested_at'))
+            .filter(visit_day__gte=window_start(today))
+        )
+        return refresh_attendance_30d(member_ids, today=today)
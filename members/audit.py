@@ -0,0 +1,109 @@
+"""
+Buffered audit log writes
+
+AuditLog.log() hands entries to the process-wide AuditWriter once the
+caller's transaction commits, so a rolled-back action leaves no trail and
+the request never waits on its own INSERT. The writer bulk-inserts what it
+holds when the buffer reaches AUDIT_BATCH_SIZE, when the oldest entry is
+AUDIT_MAX_DELAY seconds old, at the end of every request (after the
+response has gone out) and at interpreter exit.
+
+If a batch insert fails, the rows are inserted one at a time, so one bad
+entry (say, for a member deleted before the flush) cannot hold back the
+rest; entries the database rejects are logged and dropped. While the
+database is unreachable entries are kept, but never more than
+AUDIT_MAX_BUFFER: beyond that, add() writes synchronously.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, transaction
+
+
+logger = logging.getLogger(__name__)
+
+AUDIT_BATCH_SIZE = 100
+AUDIT_MAX_DELAY = 5  # seconds
+AUDIT_MAX_BUFFER = 1000
+
+
+class AuditWriter:
+    def __init__(self, batch_size=None, max_delay=None, max_buffer=None):
+        self.batch_size = batch_size or getattr(settings, 'AUDIT_BATCH_SIZE', AUDIT_BATCH_SIZE)
+        self.max_delay = max_delay if max_delay is not None else getattr(settings, 'AUDIT_MAX_DELAY', AUDIT_MAX_DELAY)
+        self.max_buffer = max_buffer or getattr(settings, 'AUDIT_MAX_BUFFER', AUDIT_MAX_BUFFER)
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._oldest = None
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def add(self, entry):
+        """Buffer one unsaved AuditLog, flushing if a threshold is reached"""
+        with self._lock:
+            full = len(self._buffer) >= self.max_buffer
+            if not full:
+                self._buffer.append(entry)
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+                due = (
+                    len(self._buffer) >= self.batch_size
+                    or time.monotonic() - self._oldest >= self.max_delay
+                )
+        if full:
+            # Earlier entries are stuck; write this one now rather than grow
+            _, kept = self._insert([entry])
+            if kept:
+                logger.error('Audit log buffer full; dropping entry %s %s', entry.action, entry.pk)
+        elif due:
+            self.flush()
+
+    def flush(self):
+        """Insert everything buffered in one statement per batch; returns the count written"""
+        with self._lock:
+            entries, self._buffer = self._buffer, []
+            self._oldest = None
+        if not entries:
+            return 0
+        written, kept = self._insert(entries)
+        if kept:
+            with self._lock:
+                room = max(0, self.max_buffer - len(self._buffer))
+                if len(kept) > room:
+                    logger.error('Audit log buffer full; dropping %d entries', len(kept) - room)
+                self._buffer[:0] = kept[:room]
+                self._oldest = time.monotonic()
+        return written
+
+    def _insert(self, entries):
+        """(rows written, entries to retry later)"""
+        from .models import AuditLog
+
+        try:
+            with transaction.atomic():
+                AuditLog.objects.bulk_create(entries, batch_size=self.batch_size)
+            return len(entries), []
+        except Exception:
+            logger.warning('Batch insert of %d audit log entries failed; retrying one at a time', len(entries))
+
+        written = 0
+        for index, entry in enumerate(entries):
+            try:
+                with transaction.atomic():
+                    AuditLog.objects.bulk_create([entry])
+                written += 1
+            except (IntegrityError, DataError):
+                logger.exception('Dropping audit log entry the database rejects: %s %s', entry.action, entry.pk)
+            except Exception:
+                logger.exception('Could not write audit log entries; keeping %d for the next flush', len(entries) - index)
+                return written, entries[index:]
+        return written, []
+
+
+audit_writer = AuditWriter()
+
+atexit.register(audit_writer.flush)
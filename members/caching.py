@@ -0,0 +1,163 @@
+"""
+Namespaced cache keys and hit/miss statistics
+
+Every cache entry the members app owns lives under
+``members:<namespace>:...``. Lookups through a CacheNamespace are counted
+per namespace in process memory and folded into shared counters in the
+cache every FLUSH_EVERY lookups, so the admin sees totals across workers
+without a cache write per request. (Only Redis increments atomically; on
+the database cache, concurrent flushes can lose counts.)
+"""
+import threading
+from collections import Counter
+
+from django.core.cache import cache
+
+
+KEY_PREFIX = 'members'
+STATS_NAMESPACE = 'cache_stats'
+FLUSH_EVERY = 100
+
+_missing = object()
+_lock = threading.Lock()
+_pending = Counter()
+_namespaces = {}
+
+
+def make_key(namespace, *parts):
+    """``members:<namespace>:<part>:<part>...``"""
+    return ':'.join([KEY_PREFIX, namespace, *(str(part) for part in parts)])
+
+
+def _stats_key(namespace, outcome):
+    return make_key(STATS_NAMESPACE, namespace, outcome)
+
+
+def record(namespace, hit):
+    """Count one lookup, flushing to the shared counters every FLUSH_EVERY"""
+    with _lock:
+        _pending[(namespace, 'hits' if hit else 'misses')] += 1
+        due = sum(_pending.values()) >= FLUSH_EVERY
+    if due:
+        flush_stats()
+
+
+def flush_stats():
+    """Add this process's pending counts to the shared counters"""
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+    for (namespace, outcome), count in pending.items():
+        key = _stats_key(namespace, outcome)
+        if not cache.add(key, count, None):
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                # Evicted between add() and incr()
+                cache.set(key, count, None)
+
+
+def cache_stats():
+    """Hits, misses and hit rate per registered namespace, across processes"""
+    flush_stats()
+    keys = {
+        (name, outcome): _stats_key(name, outcome)
+        for name in _namespaces for outcome in ('hits', 'misses')
+    }
+    values = cache.get_many(keys.values())
+    stats = []
+    for name in sorted(_namespaces):
+        hits = values.get(keys[(name, 'hits')], 0)
+        misses = values.get(keys[(name, 'misses')], 0)
+        lookups = hits + misses
+        stats.append({
+            'namespace': name,
+            'hits': hits,
+            'misses': misses,
+            'lookups': lookups,
+            'hit_rate': hits / lookups if lookups else None,
+        })
+    return stats
+
+
+def get_many(*lookups):
+    """
+    Look up (namespace, key) pairs in one cache round trip
+
+    Returns the values in order, None for misses, and counts each lookup
+    against its own namespace.
+    """
+    found = cache.get_many([key for _, key in lookups])
+    for namespace, key in lookups:
+        record(namespace.name, key in found)
+    return [found.get(key) for _, key in lookups]
+
+
+def reset_stats():
+    with _lock:
+        _pending.clear()
+    cache.delete_many([
+        _stats_key(name, outcome) for name in _namespaces for outcome in ('hits', 'misses')
+    ])
+
+
+class CacheNamespace:
+    """
+    One family of cache entries, e.g. ``CacheNamespace('roles')``
+
+    Wraps the default cache so lookups are counted against the namespace.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        _namespaces[name] = self
+
+    def __repr__(self):
+        return f'<CacheNamespace {self.name}>'
+
+    def key(self, *parts):
+        return make_key(self.name, *parts)
+
+    def get(self, key, default=None):
+        value = cache.get(key, _missing)
+        record(self.name, value is not _missing)
+        return default if value is _missing else value
+
+    def get_many(self, keys):
+        """{key: value} for the keys found, in one round trip"""
+        found = cache.get_many(keys)
+        for key in keys:
+            record(self.name, key in found)
+        return found
+
+    def get_or_set(self, key, default, timeout):
+        """Return the cached value, or compute ``default`` (if callable) and store it"""
+        value = cache.get(key, _missing)
+        record(self.name, value is not _missing)
+        if value is _missing:
+            value = default() if callable(default) else default
+            cache.set(key, value, timeout)
+        return value
+
+    def set(self, key, value, timeout):
+        cache.set(key, value, timeout)
+
+    def set_many(self, mapping, timeout):
+        cache.set_many(mapping, timeout)
+
+    def delete(self, key):
+        cache.delete(key)
+
+    def delete_many(self, keys):
+        cache.delete_many(keys)
+
+
+roles = CacheNamespace('roles')
+roles_version = CacheNamespace('roles_version')
+required_documents = CacheNamespace('required_document_ids')
+document_content = CacheNamespace('document_content')
+staff_dashboard = CacheNamespace('staff_dashboard')
+directory_count = CacheNamespace('directory_count')
+member_summaries = CacheNamespace('member_summary')
+member_sections = CacheNamespace('member_section')
+member_section_versions = CacheNamespace('member_section_version')
@@ -0,0 +1,163 @@
+"""
+Streaming exports of members, check-ins and signed documents
+
+Rows are read with QuerySet.iterator(chunk_size=EXPORT_CHUNK_SIZE) as
+plain value tuples over the joins the columns need, and written one line
+at a time, so memory stays flat however large the table is. The same
+generators back the staff export view and the export_data command.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import Member, CheckIn, SignedDocument
+
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = ('csv', 'jsonl')
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+class ExportSpec:
+    """What one export reads: the model, its (header, field path) columns and filter fields"""
+
+    def __init__(self, model, columns, date_field, status_choices=None):
+        self.model = model
+        self.columns = columns
+        self.date_field = date_field
+        self.status_choices = status_choices
+
+    @property
+    def headers(self):
+        return [header for header, _ in self.columns]
+
+    def queryset(self, since=None, until=None, status=None):
+        queryset = self.model.objects.order_by(self.date_field, 'pk')
+        if since:
+            queryset = queryset.filter(**{f'{self.date_field}__gte': _day_start(since)})
+        if until:
+            queryset = queryset.filter(**{f'{self.date_field}__lt': _day_start(until, next_day=True)})
+        if status:
+            queryset = queryset.filter(status=status)
+        return queryset.values_list(*(path for _, path in self.columns))
+
+
+EXPORTS = {
+    'members': ExportSpec(
+        Member,
+        [
+            ('id', 'id'),
+            ('first_name', 'first_name'),
+            ('last_name', 'last_name'),
+            ('parent_name', 'parent_name'),
+            ('email', 'user__email'),
+            ('phone', 'phone'),
+            ('membership_tier', 'membership_tier'),
+            ('status', 'status'),
+            ('certification_level', 'certification_level'),
+            ('attendance_30d', 'attendance_30d'),
+            ('attendance_all_time', 'attendance_all_time'),
+            ('last_checkin_at', 'last_checkin_at'),
+            ('created_at', 'created_at'),
+        ],
+        date_field='created_at',
+        status_choices=Member.STATUS_CHOICES,
+    ),
+    'checkins': ExportSpec(
+        CheckIn,
+        [
+            ('id', 'id'),
+            ('member_id', 'member_id'),
+            ('member_first_name', 'member__first_name'),
+            ('member_last_name', 'member__last_name'),
+            ('type', 'type'),
+            ('status', 'status'),
+            ('requested_at', 'requested_at'),
+            ('confirmed_at', 'confirmed_at'),
+            ('instructor_email', 'instructor__email'),
+            ('approved_by_email', 'approved_by__email'),
+            ('student_note', 'student_note'),
+            ('staff_note', 'staff_note'),
+        ],
+        date_field='requested_at',
+        status_choices=CheckIn.STATUS_CHOICES,
+    ),
+    'signatures': ExportSpec(
+        SignedDocument,
+        [
+            ('id', 'id'),
+            ('signed_at', 'signed_at'),
+            ('member_id', 'member_id'),
+            ('member_first_name', 'member__first_name'),
+            ('member_last_name', 'member__last_name'),
+            ('document_code', 'document__code'),
+            ('document_name', 'document__name'),
+            ('document_version', 'document__version'),
+            ('signed_name', 'signed_name'),
+            ('signed_for_name', 'signed_for_name'),
+            ('relationship', 'relationship'),
+            ('signer_email', 'user__email'),
+            ('ip_address', 'ip_address'),
+            ('user_agent', 'user_agent'),
+            ('snapshot_sha256', 'snapshot_id'),
+        ],
+        date_field='signed_at',
+    ),
+}
+
+
+def _day_start(day, next_day=False):
+    """Midnight (local time) at the start of ``day``, or of the day after"""
+    if next_day:
+        day += timedelta(days=1)
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class _Echo:
+    """File-like object whose write() returns the line, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+# Leading characters that make spreadsheet apps evaluate a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat()
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # Member-entered text is opened in Excel by the people we send it to
+        return "'" + value
+    return value
+
+
+def csv_lines(spec, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(spec.headers)
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield writer.writerow([_cell(value) for value in row])
+
+
+def jsonl_lines(spec, rows):
+    headers = spec.headers
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def export_lines(name, fmt, since=None, until=None, status=None):
+    """Lines of an export as strings, produced lazily"""
+    spec = EXPORTS[name]
+    rows = spec.queryset(since=since, until=until, status=status)
+    if fmt == 'csv':
+        return csv_lines(spec, rows)
+    return jsonl_lines(spec, rows)
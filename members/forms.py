@@ -1,15 +1,134 @@
 """
 Forms for Double C Ranch Portal
 """
+import copy
+
 from django import forms
+from django.conf import settings
 from django.contrib.auth.forms import UserCreationForm
+from django.forms.boundfield import BoundField
+from django.forms.forms import DeclarativeFieldsMetaclass
+from django.forms.models import ModelFormMetaclass
 from .models import (
     User, Member, SignedDocument, CheckIn,
     Goal, GoalRequest, GoalUpdate, Note
 )
 
 
-class RegistrationForm(UserCreationForm):
+# Rendered widget and label HTML of unbound forms, shared by every request
+# in the process (see MemoizedFieldsMixin)
+_rendered_fields = {}
+RENDERED_FIELDS_LIMIT = 500
+
+
+class MemoizedBoundField(BoundField):
+    """BoundField whose widget and label HTML are rendered once per process"""
+
+    def _memoized(self, kind, render):
+        key = (type(self.form), kind, self.name, self.form.prefix, self.form.auto_id, repr(self.value()))
+        html = _rendered_fields.get(key)
+        if html is None:
+            html = render()
+            if len(_rendered_fields) < RENDERED_FIELDS_LIMIT:
+                _rendered_fields[key] = html
+        return html
+
+    def __str__(self):
+        return self._memoized('widget', lambda: BoundField.__str__(self))
+
+    def label_tag(self, contents=None, attrs=None, label_suffix=None, tag=None):
+        if contents is not None or attrs or label_suffix is not None or tag:
+            return super().label_tag(contents, attrs, label_suffix, tag)
+        return self._memoized('label', lambda: BoundField.label_tag(self))
+
+
+class MemoizedFieldsMixin:
+    """
+    Reuse the rendered HTML of an unbound form's fields across requests
+
+    The member-facing forms are rendered empty on most page loads, and
+    always to the same markup, so in production template mode
+    (TEMPLATE_CACHE) each field's widget and label are rendered once.
+    Bound forms, and forms given their own renderer, render as usual:
+    a form shown again after a failed submission carries the member's
+    values and errors, so it gains nothing from the memo.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._memoize_fields = kwargs.get('renderer') is None
+        super().__init__(*args, **kwargs)
+
+    def __getitem__(self, name):
+        if (
+            name in self.fields
+            and name not in self._bound_fields_cache
+            and self._memoize_fields
+            and not self.is_bound
+            and getattr(settings, 'TEMPLATE_CACHE', False)
+        ):
+            self._bound_fields_cache[name] = MemoizedBoundField(self, self.fields[name], name)
+        return super().__getitem__(name)
+
+
+def bootstrap_class(widget):
+    """The Bootstrap 5 class for a widget"""
+    if isinstance(widget, forms.CheckboxInput):
+        return 'form-check-input'
+    if isinstance(widget, forms.Select):
+        return 'form-select'
+    return 'form-control'
+
+
+def style_fields(form_class):
+    """
+    Give a form class's fields their Bootstrap class and ``field_attrs``
+
+    Runs once, as the class is created. Each field is copied first, since
+    inherited fields (UserCreationForm's passwords, say) are shared with
+    the parent class. Instances get their fields by copying base_fields,
+    so they start out styled.
+    """
+    field_attrs = getattr(form_class, 'field_attrs', {})
+    base_fields = {}
+    for name, field in form_class.base_fields.items():
+        field = copy.deepcopy(field)
+        attrs = {'class': bootstrap_class(field.widget), **field_attrs.get(name, {})}
+        # Input widgets take their type from the constructor, not attrs
+        if 'type' in attrs and hasattr(field.widget, 'input_type'):
+            field.widget.input_type = attrs.pop('type')
+        field.widget.attrs.update(attrs)
+        base_fields[name] = field
+    form_class.base_fields = base_fields
+
+
+class StyledFormMetaclass(DeclarativeFieldsMetaclass):
+    def __new__(mcs, name, bases, attrs):
+        new_class = super().__new__(mcs, name, bases, attrs)
+        style_fields(new_class)
+        return new_class
+
+
+class StyledModelFormMetaclass(StyledFormMetaclass, ModelFormMetaclass):
+    pass
+
+
+class StyledForm(forms.Form, metaclass=StyledFormMetaclass):
+    """
+    Form whose widgets are styled for Bootstrap when the class is created
+
+    Every field gets form-control (form-select for selects, form-check-input
+    for checkboxes). Anything more, such as placeholders and rows, goes in
+    ``field_attrs``, a dict of field name to widget attrs.
+    """
+    field_attrs = {}
+
+
+class StyledModelForm(forms.ModelForm, metaclass=StyledModelFormMetaclass):
+    """ModelForm counterpart of StyledForm"""
+    field_attrs = {}
+
+
+class RegistrationForm(MemoizedFieldsMixin, StyledModelForm, UserCreationForm):
     """User registration form"""
     first_name = forms.CharField(max_length=100, required=True)
     last_name = forms.CharField(max_length=100, required=True)
@@ -19,192 +138,225 @@ class RegistrationForm(UserCreationForm):
     membership_tier = forms.ChoiceField(choices=Member.MEMBERSHIP_TIERS, 
                                        initial='Lesson')
     
+    field_attrs = {
+        'email': {'placeholder': 'Email'},
+        'password1': {'placeholder': 'Password'},
+        'password2': {'placeholder': 'Confirm Password'},
+        'first_name': {'placeholder': 'First Name'},
+        'last_name': {'placeholder': 'Last Name'},
+        'parent_name': {'placeholder': 'Parent/Guardian Name (if under 18)'},
+        'phone': {'placeholder': 'Phone Number'},
+    }
+    
     class Meta:
         model = User
         fields = ('email', 'password1', 'password2', 'first_name', 'last_name', 
                  'parent_name', 'phone', 'membership_tier')
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.fields['email'].widget.attrs.update({'class': 'form-control', 'placeholder': 'Email'})
-        self.fields['password1'].widget.attrs.update({'class': 'form-control', 'placeholder': 'Password'})
-        self.fields['password2'].widget.attrs.update({'class': 'form-control', 'placeholder': 'Confirm Password'})
-        self.fields['first_name'].widget.attrs.update({'class': 'form-control', 'placeholder': 'First Name'})
-        self.fields['last_name'].widget.attrs.update({'class': 'form-control', 'placeholder': 'Last Name'})
-        self.fields['parent_name'].widget.attrs.update({'class': 'form-control', 'placeholder': 'Parent/Guardian Name (if under 18)'})
-        self.fields['phone'].widget.attrs.update({'class': 'form-control', 'placeholder': 'Phone Number'})
-        self.fields['membership_tier'].widget.attrs.update({'class': 'form-select'})
 
 
-class SignDocumentForm(forms.Form):
+class SignDocumentForm(MemoizedFieldsMixin, StyledForm):
     """Form for signing documents"""
     signed_name = forms.CharField(
         max_length=200,
         required=True,
-        label="Legal Name (Type to Sign)",
-        widget=forms.TextInput(attrs={
-            'class': 'form-control',
-            'placeholder': 'Type your full legal name'
-        })
+        label="Legal Name (Type to Sign)"
     )
     signed_for_name = forms.CharField(
         max_length=200,
         required=False,
-        label="Student Name (if signing for someone else)",
-        widget=forms.TextInput(attrs={
-            'class': 'form-control',
-            'placeholder': 'Student name'
-        })
+        label="Student Name (if signing for someone else)"
     )
     relationship = forms.CharField(
         max_length=100,
         required=False,
-        label="Relationship (if signing for someone else)",
-        widget=forms.TextInput(attrs={
-            'class': 'form-control',
-            'placeholder': 'Parent, Guardian, etc.'
-        })
+        label="Relationship (if signing for someone else)"
     )
     agree = forms.BooleanField(
         required=True,
-        label="I have read and agree to the terms and conditions",
-        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+        label="I have read and agree to the terms and conditions"
     )
+    
+    field_attrs = {
+        'signed_name': {'placeholder': 'Type your full legal name'},
+        'signed_for_name': {'placeholder': 'Student name'},
+        'relationship': {'placeholder': 'Parent, Guardian, etc.'},
+    }
 
 
-class CheckInForm(forms.ModelForm):
+class CheckInForm(MemoizedFieldsMixin, StyledModelForm):
     """Form for member check-in"""
+    field_attrs = {
+        'student_note': {'rows': 3, 'placeholder': 'Optional note for staff'},
+    }
+    
     class Meta:
         model = CheckIn
         fields = ('type', 'student_note')
-        widgets = {
-            'type': forms.Select(attrs={'class': 'form-select'}),
-            'student_note': forms.Textarea(attrs={
-                'class': 'form-control',
-                'rows': 3,
-                'placeholder': 'Optional note for staff'
-            })
-        }
+        widgets = {'student_note': forms.Textarea}
 
 
-class StaffCheckInForm(forms.ModelForm):
+class StaffCheckInForm(StyledModelForm):
     """Form for staff to manage check-ins"""
+    field_attrs = {
+        'staff_note': {'rows': 3, 'placeholder': 'Staff notes'},
+    }
+    
     class Meta:
         model = CheckIn
         fields = ('status', 'instructor', 'staff_note')
-        widgets = {
-            'status': forms.Select(attrs={'class': 'form-select'}),
-            'instructor': forms.Select(attrs={'class': 'form-select'}),
-            'staff_note': forms.Textarea(attrs={
-                'class': 'form-control',
-                'rows': 3,
-                'placeholder': 'Staff notes'
-            })
-        }
-
-
-class GoalRequestForm(forms.ModelForm):
+        widgets = {'staff_note': forms.Textarea}
+
+
+class GoalRequestForm(MemoizedFieldsMixin, StyledModelForm):
     """Form for members to request goals"""
+    field_attrs = {
+        'content': {'rows': 4, 'placeholder': 'Describe your goal'},
+        'timeframe': {'placeholder': 'e.g., 3 months, 6 months, 1 year'},
+    }
+    
     class Meta:
         model = GoalRequest
         fields = ('content', 'timeframe')
-        widgets = {
-            'content': forms.Textarea(attrs={
-                'class': 'form-control',
-                'rows': 4,
-                'placeholder': 'Describe your goal'
-            }),
-            'timeframe': forms.TextInput(attrs={
-                'class': 'form-control',
-                'placeholder': 'e.g., 3 months, 6 months, 1 year'
-            })
-        }
-
-
-class GoalForm(forms.ModelForm):
+
+
+class GoalForm(StyledModelForm):
     """Form for staff to create/edit goals"""
+    field_attrs = {
+        'title': {'placeholder': 'Goal title'},
+        'description': {'rows': 3, 'placeholder': 'Goal description'},
+        'target_date': {'type': 'date'},
+    }
+    
     class Meta:
         model = Goal
         fields = ('title', 'description', 'target_date', 'status')
-        widgets = {
-            'title': forms.TextInput(attrs={
-                'class': 'form-control',
-                'placeholder': 'Goal title'
-            }),
-            'description': forms.Textarea(attrs={
-                'class': 'form-control',
-                'rows': 3,
-                'placeholder': 'Goal description'
-            }),
-            'target_date': forms.DateInput(attrs={
-                'class': 'form-control',
-                'type': 'date'
-            }),
-            'status': forms.Select(attrs={'class': 'form-select'})
-        }
-
-
-class GoalUpdateForm(forms.ModelForm):
+
+
+class GoalUpdateForm(StyledModelForm):
     """Form for adding goal updates"""
+    field_attrs = {
+        'note': {'rows': 3, 'placeholder': 'Progress update'},
+    }
+    
     class Meta:
         model = GoalUpdate
         fields = ('note',)
-        widgets = {
-            'note': forms.Textarea(attrs={
-                'class': 'form-control',
-                'rows': 3,
-                'placeholder': 'Progress update'
-            })
-        }
 
 
-class NoteForm(forms.ModelForm):
+class NoteForm(StyledModelForm):
     """Form for instructor notes"""
+    field_attrs = {
+        'content': {'rows': 4, 'placeholder': 'Note content'},
+    }
+    
     class Meta:
         model = Note
         fields = ('category', 'visibility', 'content')
-        widgets = {
-            'category': forms.Select(attrs={'class': 'form-select'}),
-            'visibility': forms.Select(attrs={'class': 'form-select'}),
-            'content': forms.Textarea(attrs={
-                'class': 'form-control',
-                'rows': 4,
-                'placeholder': 'Note content'
-            })
-        }
-
-
-class MemberApprovalForm(forms.ModelForm):
+
+
+class MemberApprovalForm(StyledModelForm):
     """Form for staff to approve/manage members"""
+    field_attrs = {
+        'certification_level': {'placeholder': 'Certification level'},
+    }
+    
     class Meta:
         model = Member
         fields = ('status', 'membership_tier', 'certification_level')
-        widgets = {
-            'status': forms.Select(attrs={'class': 'form-select'}),
-            'membership_tier': forms.Select(attrs={'class': 'form-select'}),
-            'certification_level': forms.TextInput(attrs={
-                'class': 'form-control',
-                'placeholder': 'Certification level'
-            })
-        }
 
 
-class MemberSearchForm(forms.Form):
+class MemberSearchForm(StyledForm):
     """Form for searching members"""
-    query = forms.CharField(
-        required=False,
-        widget=forms.TextInput(attrs={
-            'class': 'form-control',
-            'placeholder': 'Search by name, email, or phone'
-        })
-    )
+    query = forms.CharField(required=False)
     status = forms.ChoiceField(
         required=False,
-        choices=[('', 'All Statuses')] + Member.STATUS_CHOICES,
-        widget=forms.Select(attrs={'class': 'form-select'})
+        choices=[('', 'All Statuses')] + Member.STATUS_CHOICES
     )
     membership_tier = forms.ChoiceField(
         required=False,
-        choices=[('', 'All Tiers')] + Member.MEMBERSHIP_TIERS,
-        widget=forms.Select(attrs={'class': 'form-select'})
+        choices=[('', 'All Tiers')] + Member.MEMBERSHIP_TIERS
+    )
+    
+    field_attrs = {
+        'query': {'placeholder': 'Search by name, email, or phone'},
+    }
+
+
+class ExportForm(StyledForm):
+    """Form for choosing a data export and its filters"""
+    DATASET_CHOICES = [
+        ('members', 'Member roster'),
+        ('checkins', 'Check-ins'),
+        ('signatures', 'Signed documents'),
+    ]
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ]
+    
+    dataset = forms.ChoiceField(choices=DATASET_CHOICES)
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, initial='csv')
+    since = forms.DateField(required=False)
+    until = forms.DateField(required=False)
+    status = forms.ChoiceField(
+        required=False,
+        choices=[('', 'All Statuses')] + [
+            (value, value)
+            for value in dict.fromkeys(value for value, _ in Member.STATUS_CHOICES + CheckIn.STATUS_CHOICES)
+        ]
+    )
+    
+    field_attrs = {
+        'since': {'type': 'date'},
+        'until': {'type': 'date'},
+    }
+    
+    def clean(self):
+        from .exports import EXPORTS
+        
+        cleaned_data = super().clean()
+        since = cleaned_data.get('since')
+        until = cleaned_data.get('until')
+        if since and until and since > until:
+            raise forms.ValidationError('The start date must be on or before the end date.')
+        
+        status = cleaned_data.get('status')
+        spec = EXPORTS.get(cleaned_data.get('dataset'))
+        if status and spec:
+            allowed = [value for value, _ in spec.status_choices or []]
+            if status not in allowed:
+                self.add_error('status', 'This export cannot be filtered by that status.')
+        return cleaned_data
+
+
+class MemberImportForm(forms.Form):
+    """
+    One roster row from a bulk import
+    Fields and rules are taken from the registration and approval forms, so
+    an imported member passes the same checks as one entered by hand
+    """
+    REGISTRATION_FIELDS = ('email', 'first_name', 'last_name', 'parent_name', 'phone', 'membership_tier')
+    APPROVAL_FIELDS = ('status', 'certification_level')
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in self.REGISTRATION_FIELDS:
+            self.fields[name] = copy.deepcopy(RegistrationForm.base_fields[name])
+        for name in self.APPROVAL_FIELDS:
+            field = copy.deepcopy(MemberApprovalForm.base_fields[name])
+            field.required = False
+            self.fields[name] = field
+    
+    def clean_status(self):
+        return self.cleaned_data.get('status') or 'Pending'
+    
+    def clean_certification_level(self):
+        return self.cleaned_data.get('certification_level') or 'None'
+
+
+class MemberImportUploadForm(forms.Form):
+    """Admin upload of a roster CSV"""
+    file = forms.FileField(
+        help_text='CSV with a header row: email, first_name, last_name, parent_name, phone, '
+                  'membership_tier, and optionally status and certification_level'
     )
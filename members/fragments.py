@@ -0,0 +1,123 @@
+"""
+Cached sections of the staff member detail page
+
+Each section (check-ins, goals, notes, signed documents) is rendered on
+its own, capped at SECTION_LIMIT rows, and cached under
+
+    members:member_section:<member id>:<section>:<version>[:all]
+
+The version is a stamp per member and section that signals replace when
+a row in that section changes, so an edit to a note re-renders only the
+notes. All versions, then all fragments, are read with one get_many
+each. The full list behind a capped section is served by the
+staff_member_section endpoint and cached the same way.
+"""
+import uuid
+
+from django.template.loader import render_to_string
+
+from . import caching
+from .models import CheckIn, Goal, Note, SignedDocument
+from .projections import checkin_list, note_list, signed_document_list
+
+
+SECTION_LIMIT = 25
+SECTION_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+class Section:
+    def __init__(self, name, model, rows):
+        self.name = name
+        self.model = model
+        self.rows = rows
+        self.template = f'staff/member_sections/{name}.html'
+
+    def render(self, member_id, show_all=False):
+        rows = self.rows(self.model.objects.filter(member_id=member_id))
+        if show_all:
+            rows, has_more = list(rows), False
+        else:
+            rows = list(rows[:SECTION_LIMIT + 1])
+            has_more = len(rows) > SECTION_LIMIT
+            rows = rows[:SECTION_LIMIT]
+        return render_to_string(self.template, {
+            'member_id': member_id,
+            'section': self.name,
+            'rows': rows,
+            'has_more': has_more,
+        })
+
+
+SECTIONS = {
+    section.name: section
+    for section in (
+        Section('checkins', CheckIn, checkin_list),
+        Section('goals', Goal, lambda queryset: queryset),
+        Section('notes', Note, note_list),
+        Section('signatures', SignedDocument, signed_document_list),
+    )
+}
+
+# Which section each model's rows appear in
+SECTION_FOR_MODEL = {section.model: section.name for section in SECTIONS.values()}
+
+
+def _version_key(member_id, name):
+    return caching.member_section_versions.key(member_id, name)
+
+
+def _fragment_key(member_id, name, version, show_all=False):
+    parts = [member_id, name, version] + (['all'] if show_all else [])
+    return caching.member_sections.key(*parts)
+
+
+def _versions(member_id, names):
+    """Current version stamp of each section, creating any that are missing"""
+    keys = {name: _version_key(member_id, name) for name in names}
+    found = caching.member_section_versions.get_many(list(keys.values()))
+    versions = {}
+    missing = {}
+    for name, key in keys.items():
+        versions[name] = found.get(key)
+        if versions[name] is None:
+            versions[name] = missing[key] = uuid.uuid4().hex
+    if missing:
+        caching.member_section_versions.set_many(missing, None)
+    return versions
+
+
+def render_sections(member_id):
+    """{section name: HTML} for the detail page, rendering only what is not cached"""
+    versions = _versions(member_id, SECTIONS)
+    keys = {name: _fragment_key(member_id, name, version) for name, version in versions.items()}
+    found = caching.member_sections.get_many(list(keys.values()))
+
+    html = {}
+    fresh = {}
+    for name, key in keys.items():
+        if key in found:
+            html[name] = found[key]
+        else:
+            html[name] = fresh[key] = SECTIONS[name].render(member_id)
+    if fresh:
+        caching.member_sections.set_many(fresh, SECTION_CACHE_TIMEOUT)
+    return html
+
+
+def render_full_section(member_id, name):
+    """Every row of one section, for the "Show all" link"""
+    version = _versions(member_id, [name])[name]
+    return caching.member_sections.get_or_set(
+        _fragment_key(member_id, name, version, show_all=True),
+        lambda: SECTIONS[name].render(member_id, show_all=True),
+        SECTION_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_sections(member_ids, names=None):
+    """Give these members' sections (default: all) new versions, orphaning the cached HTML"""
+    names = SECTIONS if names is None else names
+    caching.member_section_versions.set_many(
+        {_version_key(member_id, name): uuid.uuid4().hex for member_id in member_ids for name in names},
+        None,
+    )
@@ -0,0 +1,161 @@
+"""
+Bulk member import from a roster CSV
+
+Rows are read one at a time and validated with MemberImportForm (the
+registration and approval field rules). Valid rows are inserted in chunks:
+one transaction per chunk with a bulk INSERT each for users, members and
+audit entries. Existing emails are loaded in a single query up front and
+rows whose email is already taken are skipped, so re-running a file after
+a partial failure picks up exactly the rows that did not make it in.
+"""
+import csv
+from collections import Counter, namedtuple
+
+from django.contrib.auth.hashers import make_password
+from django.db import DatabaseError, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .forms import MemberImportForm
+from .models import User, Member, AuditLog
+from .search import build_search_text, get_search_backend
+from .services import invalidate_staff_dashboard
+
+
+IMPORT_CHUNK_SIZE = 200
+REPORT_HEADERS = ('row', 'email', 'outcome', 'message')
+
+CREATED = 'created'
+SKIPPED = 'skipped'
+ERROR = 'error'
+
+RowResult = namedtuple('RowResult', REPORT_HEADERS)
+
+
+def _clean_keys(row):
+    """Header names are matched case- and space-insensitively"""
+    return {
+        (key or '').strip().lower().replace(' ', '_'): (value or '').strip()
+        for key, value in row.items()
+    }
+
+
+class MemberImporter:
+    def __init__(self, actor=None, chunk_size=IMPORT_CHUNK_SIZE, dry_run=False):
+        self.actor = actor
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.counts = Counter()
+
+    def run(self, lines, start_row=2):
+        """
+        Import CSV ``lines`` (any iterable of text lines, header first)
+
+        Yields a RowResult per data row; row numbers count the header as
+        row 1, as a spreadsheet does. Rows before ``start_row`` are skipped.
+        """
+        taken = set(User.objects.annotate(email_lower=Lower('email')).values_list('email_lower', flat=True))
+        chunk = []
+        for row_number, raw in enumerate(csv.DictReader(lines), start=2):
+            if row_number < start_row:
+                continue
+            result, data = self._validate(row_number, _clean_keys(raw), taken)
+            if result:
+                yield self._count(result)
+                continue
+            chunk.append((row_number, data))
+            if len(chunk) >= self.chunk_size:
+                yield from self._insert(chunk)
+                chunk = []
+        if chunk:
+            yield from self._insert(chunk)
+        if self.counts[CREATED] and not self.dry_run:
+            invalidate_staff_dashboard()
+
+    def _count(self, result):
+        self.counts[result.outcome] += 1
+        return result
+
+    def _validate(self, row_number, row, taken):
+        form = MemberImportForm(row)
+        email = row.get('email', '')
+        if not form.is_valid():
+            message = '; '.join(
+                f'{field}: {" ".join(errors)}' for field, errors in form.errors.items()
+            )
+            return RowResult(row_number, email, ERROR, message), None
+
+        data = form.cleaned_data
+        key = data['email'].lower()
+        if key in taken:
+            return RowResult(row_number, data['email'], SKIPPED, 'A user with this email already exists.'), None
+        taken.add(key)
+        return None, data
+
+    def _insert(self, chunk):
+        if self.dry_run:
+            for row_number, data in chunk:
+                yield self._count(RowResult(row_number, data['email'], CREATED, 'Valid (dry run).'))
+            return
+
+        now = timezone.now()
+        users = []
+        members = []
+        for _, data in chunk:
+            user = User(
+                email=data['email'],
+                username=data['email'],
+                first_name=data['first_name'],
+                last_name=data['last_name'],
+                # Imported riders set their own password through a reset link
+                password=make_password(None),
+                date_joined=now,
+            )
+            member = Member(
+                user=user,
+                first_name=data['first_name'],
+                last_name=data['last_name'],
+                parent_name=data['parent_name'],
+                phone=data['phone'],
+                membership_tier=data['membership_tier'],
+                status=data['status'],
+                certification_level=data['certification_level'],
+            )
+            # bulk_create skips Member.save(), which normally fills this in
+            member.search_text = build_search_text(member, email=data['email'])
+            users.append(user)
+            members.append(member)
+
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+                Member.objects.bulk_create(members)
+                AuditLog.objects.bulk_create([
+                    AuditLog(
+                        action='Member Imported',
+                        action_code='member_imported',
+                        actor=self.actor,
+                        member=member,
+                        created_at=now,
+                    )
+                    for member in members
+                ])
+                get_search_backend().index_many(members)
+        except DatabaseError as exc:
+            for row_number, data in chunk:
+                yield self._count(RowResult(
+                    row_number, data['email'], ERROR, f'Not imported; its chunk failed: {exc}'
+                ))
+            return
+
+        for row_number, data in chunk:
+            yield self._count(RowResult(row_number, data['email'], CREATED, ''))
+
+
+def write_report(results, fh):
+    """Write RowResults as CSV to ``fh`` while passing them through"""
+    writer = csv.writer(fh)
+    writer.writerow(REPORT_HEADERS)
+    for result in results:
+        writer.writerow(result)
+        yield result
@@ -0,0 +1,224 @@
+"""
+Live feed of check-in changes for staff pages
+
+One CheckInBroadcaster per process fans events out to every connected
+staff browser. Saves in this process are published from a post_save
+receiver as soon as they commit; changes made by other workers (or by
+bulk UPDATEs that send no signal) are picked up by a single poller that
+reads check-ins past a cursor. The poller only runs while someone is
+listening, so any number of open pages costs one query per POLL_INTERVAL.
+
+All of that needs ASGI (gunicorn's uvicorn workers, as render.yaml
+deploys it). Under WSGI (gthread or sync workers) a stream would
+pin a worker thread, so the view answers with the changes since the
+browser's cursor and ends. The browser reconnects after RETRY_MS, so each
+open page costs a few queries every RETRY_MS.
+
+The cursor is the (updated_at, id) of the last change seen, and it is
+also the SSE event id. A bulk approval stamps many rows with the same
+updated_at, so the id is what lets a capped batch, or a reconnecting
+browser, resume in the middle of them.
+"""
+import asyncio
+import json
+import threading
+import uuid
+from collections import OrderedDict, namedtuple
+from datetime import timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import CheckIn
+
+
+POLL_INTERVAL = 2  # seconds
+KEEPALIVE_INTERVAL = 15  # seconds
+# Streams end after this long and the browser reconnects with Last-Event-ID,
+# so a client that vanished without a disconnect is never held for long
+MAX_STREAM_SECONDS = 5 * 60
+RETRY_MS = 3000
+QUEUE_SIZE = 100
+BATCH_SIZE = 200
+RECENT_EVENTS = 1000
+
+# ``id`` is None for a bare timestamp (?since=), meaning "after all of it"
+Cursor = namedtuple('Cursor', 'updated_at id')
+CURSOR_SEPARATOR = '/'
+
+FEED_FIELDS = (
+    'id', 'type', 'status', 'requested_at', 'confirmed_at', 'created_at', 'updated_at',
+    'member', 'member__first_name', 'member__last_name',
+)
+
+
+def checkin_event(checkin):
+    """The JSON-ready payload sent for one check-in"""
+    return {
+        'id': str(checkin.id),
+        'member_id': str(checkin.member_id),
+        'member_name': checkin.member.full_name,
+        'type': checkin.type,
+        'status': checkin.status,
+        'requested_at': checkin.requested_at.isoformat(),
+        'confirmed_at': checkin.confirmed_at.isoformat() if checkin.confirmed_at else None,
+        'created_at': checkin.created_at.isoformat(),
+        'updated_at': checkin.updated_at.isoformat(),
+    }
+
+
+def format_event(event):
+    """Serialize an event for the text/event-stream wire format"""
+    return f"id: {event_cursor(event)}\nevent: checkin\ndata: {json.dumps(event)}\n\n"
+
+
+def event_cursor(event):
+    """The event id: where a reader that has seen this event resumes"""
+    return f"{event['updated_at']}{CURSOR_SEPARATOR}{event['id']}"
+
+
+def parse_cursor(value):
+    """A Last-Event-ID (timestamp/id) or ?since= (timestamp) value as a Cursor, or None"""
+    if not value:
+        return None
+    timestamp, _, checkin_id = value.partition(CURSOR_SEPARATOR)
+    try:
+        updated_at = parse_datetime(timestamp)
+        checkin_id = uuid.UUID(checkin_id) if checkin_id else None
+    except ValueError:
+        return None
+    if updated_at is None:
+        return None
+    if timezone.is_naive(updated_at):
+        updated_at = timezone.make_aware(updated_at, dt_timezone.utc)
+    return Cursor(updated_at, checkin_id)
+
+
+def changes_since(cursor, limit=BATCH_SIZE):
+    """Check-ins created or changed after ``cursor``, oldest change first"""
+    after = Q(updated_at__gt=cursor.updated_at)
+    if cursor.id is not None:
+        after |= Q(updated_at=cursor.updated_at, id__gt=cursor.id)
+    checkins = (
+        CheckIn.objects.filter(after)
+        .select_related('member')
+        .only(*FEED_FIELDS)
+        .order_by('updated_at', 'id')[:limit]
+    )
+    return [checkin_event(checkin) for checkin in checkins]
+
+
+class Subscription:
+    """One connected browser: a bounded queue on the event loop serving it"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    def offer(self, event):
+        """Queue an event from any thread"""
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if self.queue.full():
+            # A stalled client loses its oldest events, not the newest
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class CheckInBroadcaster:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._recent = OrderedDict()
+        self._poller = None
+        self.cursor = None
+
+    @property
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def _first_sighting(self, event):
+        """True unless this exact change was already sent (by signal or poll)"""
+        key = (event['id'], event['status'], event['updated_at'])
+        with self._lock:
+            if key in self._recent:
+                return False
+            self._recent[key] = True
+            if len(self._recent) > RECENT_EVENTS:
+                self._recent.popitem(last=False)
+            return True
+
+    def publish(self, event):
+        """Send an event to every subscriber; safe to call from any thread"""
+        if not self._first_sighting(event):
+            return
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.offer(event)
+
+    def subscribe(self):
+        """Register a subscriber on the running loop, starting the poller if needed"""
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(loop)
+        with self._lock:
+            self._subscribers.add(subscription)
+            if self._poller is None or self._poller.done():
+                self.cursor = Cursor(timezone.now(), None)
+                self._poller = loop.create_task(self._poll())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+            if not self._subscribers and self._poller is not None:
+                self._poller.cancel()
+                self._poller = None
+
+    async def poll_once(self):
+        """Publish every change past the cursor and advance it; returns the count"""
+        published = 0
+        while True:
+            events = await sync_to_async(changes_since)(self.cursor)
+            for event in events:
+                self.publish(event)
+            published += len(events)
+            if events:
+                self.cursor = parse_cursor(event_cursor(events[-1]))
+            if len(events) < BATCH_SIZE:
+                return published
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            await self.poll_once()
+
+
+broadcaster = CheckInBroadcaster()
+
+
+async def event_stream(subscription, backlog):
+    """Yield the catch-up backlog, then live events until MAX_STREAM_SECONDS"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + MAX_STREAM_SECONDS
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        for event in backlog:
+            yield format_event(event)
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                event = await asyncio.wait_for(
+                    subscription.queue.get(), min(KEEPALIVE_INTERVAL, remaining)
+                )
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield format_event(event)
+    finally:
+        broadcaster.unsubscribe(subscription)
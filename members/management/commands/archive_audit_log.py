@@ -0,0 +1,103 @@
+"""
+Management command to archive old audit log months to compressed files
+
+Every month older than --months is written to
+<output-dir>/audit_log-YYYY-MM.jsonl.gz, recorded in manifest.json, and
+then removed from the database (unless --keep-rows). There is no default
+output directory: give --output-dir or set AUDIT_ARCHIVE_DIR to durable
+storage. --partitions-only just creates the partitions, which is all
+the scheduled job in render.yaml does (cron jobs there have no durable
+disk to archive to). On PostgreSQL the upcoming monthly
+partitions are created on every run, so schedule it at least monthly.
+"""
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from members.archive import (
+    add_months, archive_month, ensure_partitions, month_bounds, month_entries,
+    month_start, months_before, purge_month, record_in_manifest,
+)
+
+
+class Command(BaseCommand):
+    help = 'Archive audit log months older than --months to gzipped JSON Lines and drop them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months',
+            type=int,
+            default=getattr(settings, 'AUDIT_RETENTION_MONTHS', 12),
+            help='Keep this many whole months before the current one (default: 12)',
+        )
+        parser.add_argument(
+            '--output-dir',
+            default=getattr(settings, 'AUDIT_ARCHIVE_DIR', None),
+            help='Directory for archive files and manifest.json (default: AUDIT_ARCHIVE_DIR)',
+        )
+        parser.add_argument(
+            '--partitions-ahead',
+            type=int,
+            default=3,
+            help='Monthly partitions to create ahead of time on PostgreSQL (default: 3)',
+        )
+        parser.add_argument(
+            '--partitions-only',
+            action='store_true',
+            help='Only create the upcoming partitions; archive nothing (no output directory needed)',
+        )
+        parser.add_argument(
+            '--keep-rows',
+            action='store_true',
+            help='Write the archives but leave the rows in the database',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List the months that would be archived',
+        )
+
+    def handle(self, *args, **options):
+        if options['months'] < 0:
+            raise CommandError('--months cannot be negative.')
+
+        cutoff, _ = month_bounds(add_months(month_start(timezone.now()), -options['months']))
+        months = months_before(cutoff)
+
+        if options['dry_run']:
+            for month in months:
+                self.stdout.write(f'{month:%Y-%m}: {month_entries(month).count()} entries')
+            self.stdout.write(f'{len(months)} months would be archived.')
+            return
+
+        created = ensure_partitions(options['partitions_ahead'])
+        if created:
+            self.stdout.write(f'Created partitions: {", ".join(created)}')
+        if options['partitions_only']:
+            self.stdout.write(self.style.SUCCESS(f'Partitions are in place; {len(months)} months left to archive.'))
+            return
+
+        # The archive is the only copy once the rows are purged, so it has
+        # to go somewhere that was chosen on purpose
+        if not options['output_dir']:
+            raise CommandError(
+                'Set --output-dir or AUDIT_ARCHIVE_DIR to durable storage; '
+                'archived months are deleted from the database.'
+            )
+        directory = Path(options['output_dir'])
+
+        directory.mkdir(parents=True, exist_ok=True)
+        total = 0
+        for month in months:
+            record = archive_month(month, directory)
+            record_in_manifest(directory, record)
+            if not options['keep_rows']:
+                purge_month(month)
+            total += record['rows']
+            self.stdout.write(f"{record['month']}: {record['rows']} entries -> {record['file']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {total} audit log entries from {len(months)} months to {directory}.'
+        ))
@@ -0,0 +1,61 @@
+"""
+Management command to measure how long audit logging keeps a request
+waiting, with synchronous inserts and with the buffered writer
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from members.audit import audit_writer
+from members.models import AuditLog
+
+
+BENCHMARK_ACTION = 'Audit Benchmark'
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request audit logging latency, synchronous vs buffered'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help='Number of simulated requests, one audit entry each (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        requests = options['requests']
+        audit_writer.flush()
+        batch_size, max_delay = audit_writer.batch_size, audit_writer.max_delay
+
+        try:
+            sync_total = 0.0
+            for i in range(requests):
+                started = time.perf_counter()
+                AuditLog.log(BENCHMARK_ACTION, details={'request': i}, strict=True)
+                sync_total += time.perf_counter() - started
+
+            # Hold every entry so the request path and the batched write are timed apart
+            audit_writer.batch_size, audit_writer.max_delay = requests + 1, float('inf')
+            buffered_total = 0.0
+            for i in range(requests):
+                started = time.perf_counter()
+                AuditLog.log(BENCHMARK_ACTION, details={'request': i})
+                buffered_total += time.perf_counter() - started
+            started = time.perf_counter()
+            audit_writer.flush()
+            flush_total = time.perf_counter() - started
+        finally:
+            audit_writer.batch_size, audit_writer.max_delay = batch_size, max_delay
+            AuditLog.objects.filter(action=BENCHMARK_ACTION).delete()
+
+        sync_ms = 1000 * sync_total / requests
+        buffered_ms = 1000 * buffered_total / requests
+        self.stdout.write(f'Requests:              {requests}')
+        self.stdout.write(f'Synchronous insert:    {sync_ms:.3f} ms/request')
+        self.stdout.write(f'Buffered:              {buffered_ms:.3f} ms/request')
+        self.stdout.write(f'Batched write:         {1000 * flush_total / requests:.3f} ms/entry, after the response')
+        self.stdout.write(self.style.SUCCESS(
+            f'Saved {sync_ms - buffered_ms:.3f} ms per request on the request path'
+        ))
@@ -0,0 +1,106 @@
+"""
+Management command to time construction and validation of every form in
+members/forms.py
+
+    python manage.py benchmark_forms --iterations 2000
+
+Each form is built unbound (as on a GET) and built bound and validated
+against known-good data (as on a POST). Forms whose validation looks
+things up, such as the registration form's unique email, run those
+queries against the configured database; nothing is written.
+"""
+import inspect
+import time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.forms import BaseForm
+
+from members import forms as member_forms
+from members.models import Member, CheckIn, Goal, Note
+
+
+# Valid POST data for each form; a form missing here fails the command,
+# so new forms cannot slip out of the benchmark
+SAMPLE_DATA = {
+    'RegistrationForm': lambda: {
+        'email': 'benchmark.rider@example.com', 'password1': 'c0rral-Gate-latch', 'password2': 'c0rral-Gate-latch',
+        'first_name': 'Ava', 'last_name': 'Rider', 'parent_name': '', 'phone': '555-0100',
+        'membership_tier': Member.MEMBERSHIP_TIERS[0][0],
+    },
+    'SignDocumentForm': lambda: {'signed_name': 'Ava Rider', 'agree': 'on'},
+    'CheckInForm': lambda: {'type': CheckIn.TYPE_CHOICES[0][0], 'student_note': 'Worked on diagonals'},
+    'StaffCheckInForm': lambda: {'status': CheckIn.STATUS_CHOICES[0][0], 'staff_note': 'Good session'},
+    'GoalRequestForm': lambda: {'content': 'Canter a full course', 'timeframe': '6 months'},
+    'GoalForm': lambda: {
+        'title': 'Canter a full course', 'description': 'Steady rhythm throughout',
+        'target_date': '2030-06-01', 'status': Goal.STATUS_CHOICES[0][0],
+    },
+    'GoalUpdateForm': lambda: {'note': 'Two clean rounds this week'},
+    'NoteForm': lambda: {
+        'category': Note.CATEGORY_CHOICES[0][0], 'visibility': Note.VISIBILITY_CHOICES[0][0],
+        'content': 'Needs a shorter rein',
+    },
+    'MemberApprovalForm': lambda: {
+        'status': Member.STATUS_CHOICES[0][0], 'membership_tier': Member.MEMBERSHIP_TIERS[0][0],
+        'certification_level': 'Level 1',
+    },
+    'MemberSearchForm': lambda: {'query': 'rider', 'status': '', 'membership_tier': ''},
+    'ExportForm': lambda: {'dataset': 'members', 'format': 'csv', 'since': '2024-01-01', 'until': '2024-12-31'},
+    'MemberImportForm': lambda: {
+        'email': 'benchmark.import@example.com', 'first_name': 'Ava', 'last_name': 'Rider',
+        'phone': '555-0100', 'membership_tier': Member.MEMBERSHIP_TIERS[0][0],
+    },
+}
+
+SAMPLE_FILES = {
+    'MemberImportUploadForm': lambda: {'file': SimpleUploadedFile('roster.csv', b'email\n', 'text/csv')},
+}
+
+# Abstract bases, not forms of their own
+BASE_FORMS = (member_forms.StyledForm, member_forms.StyledModelForm)
+
+
+def form_classes():
+    """Every concrete form defined in members.forms, in source order"""
+    classes = [
+        value for value in vars(member_forms).values()
+        if inspect.isclass(value) and issubclass(value, BaseForm)
+        and value.__module__ == member_forms.__name__ and value not in BASE_FORMS
+    ]
+    return sorted(classes, key=lambda form_class: inspect.getsourcelines(form_class)[1])
+
+
+def mean_us(build, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        build()
+    return (time.perf_counter() - start) * 1_000_000 / iterations
+
+
+class Command(BaseCommand):
+    help = 'Time construction and validation of every form in members/forms.py'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=1000, help='Runs per form (default: 1000)')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        if iterations < 1:
+            raise CommandError('--iterations must be at least 1.')
+
+        self.stdout.write(f'{"form":<24}{"construct":>12}{"validate":>12}')
+        for form_class in form_classes():
+            name = form_class.__name__
+            if name not in SAMPLE_DATA and name not in SAMPLE_FILES:
+                raise CommandError(f'No sample data for {name}; add it to SAMPLE_DATA.')
+            data = SAMPLE_DATA.get(name, dict)()
+            files = SAMPLE_FILES.get(name, dict)()
+
+            form = form_class(data, files)
+            if not form.is_valid():
+                raise CommandError(f'Sample data for {name} does not validate: {form.errors.as_json()}')
+
+            construct = mean_us(form_class, iterations)
+            validate = mean_us(lambda: form_class(data, files).is_valid(), iterations)
+            self.stdout.write(f'{name:<24}{construct:>10.1f}us{validate:>10.1f}us')
@@ -0,0 +1,69 @@
+"""
+Management command to measure how many bytes the list views pull from the
+database with and without their column projections
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+
+from members.models import Member, Document, CheckIn, AuditLog
+from members.projections import checkin_list, note_list, signed_document_list
+
+
+def payload_bytes(queryset):
+    """Execute a queryset's SQL and total the size of every value returned"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    total = 0
+    for row in rows:
+        for value in row:
+            if value is None:
+                continue
+            if isinstance(value, (bytes, bytearray, memoryview)):
+                total += len(value)
+            else:
+                total += len(str(value).encode('utf-8'))
+    return len(rows), total
+
+
+class Command(BaseCommand):
+    help = 'Compare bytes fetched per list page before and after column projections'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--member',
+            help='Member ID to use for member pages (default: the member with the most signatures)',
+        )
+
+    def handle(self, *args, **options):
+        if options['member']:
+            member = Member.objects.filter(pk=options['member']).first()
+        else:
+            member = Member.objects.annotate(n=Count('signed_documents')).order_by('-n').first()
+        if member is None:
+            raise CommandError('No members found; load some data first.')
+
+        cases = [
+            ('staff_checkins', CheckIn.objects.select_related('member', 'created_by')[:50],
+             checkin_list(CheckIn.objects.all())[:50]),
+            ('staff_member_detail: check-ins', member.checkins.all(),
+             checkin_list(member.checkins.all())),
+            ('staff_member_detail: notes', member.notes.all(),
+             note_list(member.notes.all())),
+            ('staff_member_detail / profile: signatures', member.signed_documents.select_related('document', 'snapshot'),
+             signed_document_list(member.signed_documents.all())),
+            ('admin: documents', Document.objects.all()[:100],
+             Document.objects.defer('content')[:100]),
+            ('admin: audit log', AuditLog.objects.select_related('actor', 'member')[:100],
+             AuditLog.objects.select_related('actor', 'member').defer('details', 'member__search_text')[:100]),
+        ]
+
+        self.stdout.write(f'Member: {member} ({member.pk})')
+        self.stdout.write(f'{"page":<45}{"rows":>6}{"before":>12}{"after":>12}{"saved":>8}')
+        for name, before_qs, after_qs in cases:
+            rows, before = payload_bytes(before_qs)
+            _, after = payload_bytes(after_qs)
+            saved = f'{100 * (before - after) / before:.0f}%' if before else '-'
+            self.stdout.write(f'{name:<45}{rows:>6}{before:>12,}{after:>12,}{saved:>8}')
@@ -0,0 +1,97 @@
+"""
+Management command to measure page render time with and without the
+production template mode (warmed templates and memoized form fields; see
+ranch_portal/templating.py)
+
+    python manage.py benchmark_templates --iterations 500
+
+Both runs use Django's cached loader, as every deployment does, and start
+from empty template caches, so "off" is the portal as it runs without
+the mode. Pages are rendered straight from their templates for an
+anonymous request with unbound forms, which is where the memo applies, so
+the figures are template and form cost only, with no database work.
+"""
+import time
+
+from django.contrib.auth.forms import AuthenticationForm
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.forms.renderers import get_default_renderer
+from django.template.autoreload import reset_loaders
+from django.template.loader import render_to_string
+from django.test import RequestFactory, override_settings
+
+from members import forms as member_forms
+from members.models import Document
+from ranch_portal.templating import warm_templates
+
+
+def pages():
+    """(name, template, context factory) for each page measured"""
+    document = Document(code='WAIVER', name='Liability Waiver', content='I understand the risks.\n' * 40)
+    return [
+        ('home', 'portal/home.html', lambda: {}),
+        ('login', 'registration/login.html', lambda: {'form': AuthenticationForm()}),
+        ('register', 'registration/register.html', lambda: {'form': member_forms.RegistrationForm()}),
+        ('sign_documents', 'portal/sign_document.html', lambda: {
+            'form': member_forms.SignDocumentForm(), 'document': document, 'remaining': 2, 'total': 3,
+        }),
+        ('checkin', 'portal/checkin.html', lambda: {'form': member_forms.CheckInForm()}),
+        ('goals', 'portal/goals.html', lambda: {'form': member_forms.GoalRequestForm()}),
+    ]
+
+
+def reset_template_caches():
+    """Empty the cached loaders of the project engine and the form renderer, and the field memo"""
+    reset_loaders()
+    for loader in get_default_renderer().engine.engine.template_loaders:
+        loader.reset()
+    member_forms._rendered_fields.clear()
+
+
+class Command(BaseCommand):
+    help = 'Compare page render times with and without the production template mode'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='Renders per page (default: 200)')
+
+    def measure(self, iterations):
+        """{page: (first render ms, mean ms)}"""
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        results = {}
+        for name, template, make_context in pages():
+            timings = []
+            for _ in range(iterations + 1):
+                # Fresh forms each time, as a view would build them
+                context = make_context()
+                start = time.perf_counter()
+                render_to_string(template, context, request)
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = (timings[0], sum(timings[1:]) / iterations)
+        return results
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        if iterations < 1:
+            raise CommandError('--iterations must be at least 1.')
+
+        with override_settings(TEMPLATE_CACHE=False):
+            reset_template_caches()
+            before = self.measure(iterations)
+
+        with override_settings(TEMPLATE_CACHE=True):
+            reset_template_caches()
+            warm_start = time.perf_counter()
+            count = warm_templates()
+            warm_ms = (time.perf_counter() - warm_start) * 1000
+            after = self.measure(iterations)
+
+        self.stdout.write(f'Warm-up: {count} templates in {warm_ms:.0f} ms')
+        self.stdout.write(f'{"page":<16}{"first off":>12}{"mean off":>10}{"first on":>10}{"mean on":>9}{"faster":>8}')
+        for name, (first_off, mean_off) in before.items():
+            first_on, mean_on = after[name]
+            faster = f'{mean_off / mean_on:.1f}x' if mean_on else '-'
+            self.stdout.write(
+                f'{name:<16}{first_off:>10.2f}ms{mean_off:>8.2f}ms{first_on:>8.2f}ms{mean_on:>7.2f}ms{faster:>8}'
+            )
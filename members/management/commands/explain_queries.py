@@ -0,0 +1,95 @@
+"""
+Management command to EXPLAIN the hot queries behind each portal view
+and report any that fall back to a sequential scan
+"""
+import re
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from members.models import Member, CheckIn, GoalRequest, Goal, Note, AuditLog
+
+
+# PostgreSQL: "Seq Scan on checkins"
+# SQLite:     "SCAN checkins" (index-backed scans read "SCAN checkins USING INDEX ...")
+SEQ_SCAN_PATTERNS = [
+    re.compile(r'Seq Scan on (\w+)'),
+    re.compile(r'\bSCAN (\w+)(?! USING (?:COVERING )?INDEX)(?:\s|$)'),
+]
+
+
+def view_queries():
+    """Representative querysets for each view, keyed by 'view: description'"""
+    member_id = uuid.uuid4()
+    return {
+        'staff_dashboard: pending members': Member.objects.filter(status='Pending'),
+        'staff_dashboard: pending check-ins': CheckIn.objects.filter(status='Pending'),
+        'staff_dashboard: open goal requests': GoalRequest.objects.filter(status='Open'),
+        'staff_members: filtered directory': Member.objects.filter(
+            status='Approved', membership_tier='Lesson'
+        ).order_by('-created_at')[:50],
+        'staff_members: directory page': Member.objects.order_by('-created_at', '-id')[:51],
+        'staff_checkins: pending queue': CheckIn.objects.filter(status='Pending').order_by('-requested_at')[:50],
+        'dashboard: recent check-ins': CheckIn.objects.filter(member_id=member_id)[:5],
+        'dashboard: active goals': Goal.objects.filter(
+            member_id=member_id, status__in=['NotStarted', 'InProgress']
+        ),
+        'dashboard: student-visible notes': Note.objects.filter(
+            member_id=member_id, visibility='StudentVisible'
+        )[:5],
+        'admin: audit log': AuditLog.objects.order_by('-created_at')[:100],
+    }
+
+
+def find_seq_scans(plan):
+    """Return the tables a query plan scans sequentially"""
+    tables = []
+    for pattern in SEQ_SCAN_PATTERNS:
+        tables.extend(pattern.findall(plan))
+    return tables
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN on the queries behind each view and report sequential scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Print the full plan for every query',
+        )
+        parser.add_argument(
+            '--strict',
+            action='store_true',
+            help='Exit with an error if any sequential scan is found',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Database vendor: {connection.vendor}')
+        offenders = []
+
+        for name, queryset in view_queries().items():
+            plan = queryset.explain()
+            tables = find_seq_scans(plan)
+
+            if tables:
+                offenders.append(name)
+                self.stdout.write(self.style.WARNING(
+                    f'SEQ SCAN  {name} ({", ".join(sorted(set(tables)))})'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'ok        {name}'))
+
+            if options['verbose_plans'] or tables:
+                for line in plan.splitlines():
+                    self.stdout.write(f'          {line}')
+
+        if not offenders:
+            self.stdout.write(self.style.SUCCESS('No sequential scans found.'))
+            return
+
+        message = f'{len(offenders)} quer{"y" if len(offenders) == 1 else "ies"} use a sequential scan.'
+        if options['strict']:
+            raise CommandError(message)
+        self.stdout.write(self.style.WARNING(message))
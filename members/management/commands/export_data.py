@@ -0,0 +1,61 @@
+"""
+Management command to export members, check-ins or signed documents
+
+    python manage.py export_data checkins --since 2025-01-01 --until 2025-12-31 -o checkins.csv
+    python manage.py export_data signatures --format jsonl > signatures.jsonl
+
+Rows are streamed, so memory use does not grow with the table.
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from members.exports import EXPORT_FORMATS, EXPORTS, export_lines
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Invalid date {value!r}; use YYYY-MM-DD.')
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or JSON Lines export of members, check-ins or signed documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--since', type=parse_date, help='First day to include (YYYY-MM-DD)')
+        parser.add_argument('--until', type=parse_date, help='Last day to include (YYYY-MM-DD)')
+        parser.add_argument('--status', help='Only rows with this status (members and check-ins)')
+        parser.add_argument('-o', '--output', help='File to write (default: stdout)')
+
+    def handle(self, *args, **options):
+        spec = EXPORTS[options['dataset']]
+        status = options['status']
+        if status and status not in [value for value, _ in spec.status_choices or []]:
+            raise CommandError(f"{options['dataset']} cannot be filtered by status {status!r}.")
+        if options['since'] and options['until'] and options['since'] > options['until']:
+            raise CommandError('--since must be on or before --until.')
+
+        lines = export_lines(
+            options['dataset'],
+            options['format'],
+            since=options['since'],
+            until=options['until'],
+            status=status,
+        )
+
+        if options['output']:
+            count = 0
+            with open(options['output'], 'w', encoding='utf-8', newline='') as fh:
+                for line in lines:
+                    fh.write(line)
+                    count += 1
+            if options['format'] == 'csv':
+                count -= 1
+            self.stderr.write(self.style.SUCCESS(f'Wrote {count} rows to {options["output"]}.'))
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
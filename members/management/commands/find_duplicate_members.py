@@ -0,0 +1,42 @@
+"""
+Management command to list likely duplicate member records
+
+    python manage.py find_duplicate_members
+    python manage.py find_duplicate_members --threshold 0.9
+
+Pairs are merged from the member admin ("Merge selected members").
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from members.merge import DUPLICATE_THRESHOLD, find_duplicate_candidates
+from members.models import Member
+
+
+class Command(BaseCommand):
+    help = 'List pairs of members that look like the same person registered twice'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=DUPLICATE_THRESHOLD,
+            help=f'Minimum match score between 0 and 1.1 (default: {DUPLICATE_THRESHOLD})',
+        )
+
+    def handle(self, *args, **options):
+        if options['threshold'] <= 0:
+            raise CommandError('--threshold must be positive.')
+
+        candidates = find_duplicate_candidates(threshold=options['threshold'])
+        ids = {pk for candidate in candidates for pk in (candidate.first_id, candidate.second_id)}
+        members = Member.objects.select_related('user').in_bulk(ids)
+
+        for candidate in candidates:
+            first = members[candidate.first_id]
+            second = members[candidate.second_id]
+            self.stdout.write(
+                f'{candidate.score:.2f}  {first} <{first.user.email if first.user else "-"}> ({first.pk})'
+                f'  ~  {second} <{second.user.email if second.user else "-"}> ({second.pk})'
+                f'  [{", ".join(candidate.reasons)}]'
+            )
+        self.stdout.write(self.style.SUCCESS(f'{len(candidates)} possible duplicate pairs.'))
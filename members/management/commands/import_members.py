@@ -0,0 +1,68 @@
+"""
+Management command to import a season roster from CSV
+
+    python manage.py import_members roster.csv
+    python manage.py import_members roster.csv --dry-run
+    python manage.py import_members roster.csv --report roster-errors.csv
+
+Each row's outcome (created, skipped, error) is written to the report.
+The import is safe to re-run: rows whose email already exists are skipped.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from members.imports import IMPORT_CHUNK_SIZE, CREATED, SKIPPED, ERROR, MemberImporter, write_report
+from members.models import User
+
+
+class Command(BaseCommand):
+    help = 'Bulk-create members (and their logins) from a roster CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='Roster CSV with a header row')
+        parser.add_argument(
+            '--report',
+            help='Where to write the per-row report (default: <csv_file>.report.csv)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=IMPORT_CHUNK_SIZE,
+            help=f'Rows per transaction (default: {IMPORT_CHUNK_SIZE})',
+        )
+        parser.add_argument(
+            '--start-row',
+            type=int,
+            default=2,
+            help='Skip data rows before this spreadsheet row number (the header is row 1)',
+        )
+        parser.add_argument('--actor', help='Email of the staff user to record as the importer')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only; write nothing')
+
+    def handle(self, *args, **options):
+        actor = None
+        if options['actor']:
+            actor = User.objects.filter(email=options['actor']).first()
+            if actor is None:
+                raise CommandError(f"No user with email {options['actor']!r}.")
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+
+        report_path = options['report'] or f"{options['csv_file']}.report.csv"
+        importer = MemberImporter(actor=actor, chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+
+        try:
+            source = open(options['csv_file'], encoding='utf-8-sig', newline='')
+        except OSError as exc:
+            raise CommandError(f'Cannot read {options["csv_file"]}: {exc}')
+
+        with source, open(report_path, 'w', encoding='utf-8', newline='') as report:
+            for result in write_report(importer.run(source, start_row=options['start_row']), report):
+                if result.outcome == ERROR:
+                    self.stderr.write(f'Row {result.row}: {result.message}')
+
+        counts = importer.counts
+        verb = 'Would create' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {counts[CREATED]} members; skipped {counts[SKIPPED]} existing; '
+            f'{counts[ERROR]} errors. Report: {report_path}'
+        ))
@@ -0,0 +1,330 @@
+"""
+Management command to load-test the portal under gunicorn and compare
+runtime profiles (gunicorn.conf.py, ranch_portal/runtime.py)
+
+    python manage.py collectstatic --noinput
+    python manage.py loadtest --duration 20 --concurrency 16 --db-latency 5
+    python manage.py loadtest --config sync:WEB_CONCURRENCY=4 --config gthread:WEB_CONCURRENCY=2,GUNICORN_THREADS=8
+
+Each configuration starts gunicorn with gunicorn.conf.py on a local port,
+with DEBUG off and production templates, and a pool of client threads
+requests the public, member and staff pages for --duration seconds.
+Member and staff pages use sessions made for existing users (--member,
+--staff; by default the first of each), which are deleted afterwards.
+
+--db-latency sleeps before every SQL query in the server, standing in
+for the round trip to a hosted database; that wait is what gthread
+workers overlap and sync workers cannot. It wraps the WSGI application,
+so it cannot be combined with the uvicorn configuration.
+"""
+import os
+import re
+import secrets
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Starting environment for each named configuration; --config can add to them
+CONFIGS = {
+    'sync': {'GUNICORN_WORKER_CLASS': 'sync'},
+    'gthread': {'GUNICORN_WORKER_CLASS': 'gthread'},
+    'uvicorn': {'GUNICORN_WORKER_CLASS': 'uvicorn'},
+}
+
+PUBLIC_PAGES = ['home', 'login', 'register']
+MEMBER_PAGES = ['dashboard', 'checkin', 'goals', 'profile']
+STAFF_PAGES = ['staff_dashboard', 'staff_members', 'staff_checkins']
+
+SERVER_START_TIMEOUT = 30  # seconds
+
+
+def latency_application():
+    """
+    The portal's WSGI application with every query delayed by
+    LOADTEST_DB_LATENCY_MS; gunicorn calls this when --db-latency is given
+    """
+    from django.db import connection
+
+    from ranch_portal.wsgi import application
+
+    delay = float(os.environ.get('LOADTEST_DB_LATENCY_MS', 0)) / 1000
+
+    def delayed(execute, sql, params, many, context):
+        time.sleep(delay)
+        return execute(sql, params, many, context)
+
+    def app(environ, start_response):
+        with connection.execute_wrapper(delayed):
+            return application(environ, start_response)
+
+    return app
+
+
+def parse_config(value):
+    """'gthread:WEB_CONCURRENCY=2,GUNICORN_THREADS=8' -> (label, environment)"""
+    name, _, overrides = value.partition(':')
+    if name not in CONFIGS:
+        raise CommandError(f'Unknown configuration {name!r}; start from one of {", ".join(CONFIGS)}.')
+    env = dict(CONFIGS[name])
+    for item in filter(None, overrides.split(',')):
+        key, sep, setting = item.partition('=')
+        if not sep:
+            raise CommandError(f'Expected KEY=VALUE in {value!r}, got {item!r}.')
+        env[key.strip()] = setting.strip()
+    return value, env
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report redirects (such as to the login page) instead of following them"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def proportional_set_size(pid):
+    """PSS of a process and its children in bytes, counting shared pages once; None without /proc"""
+    total = 0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            rollup = Path(f'/proc/{current}/smaps_rollup').read_text()
+            total += int(re.search(r'^Pss:\s+(\d+) kB', rollup, re.MULTILINE).group(1)) * 1024
+            for task in Path(f'/proc/{current}/task').iterdir():
+                pending.extend(int(child) for child in (task / 'children').read_text().split())
+    except (OSError, AttributeError):
+        return None
+    return total
+
+
+class Server:
+    """One gunicorn process tree listening on 127.0.0.1:port"""
+
+    def __init__(self, env, port, app, cwd, log_path):
+        self.url = f'http://127.0.0.1:{port}'
+        self.log_path = log_path
+        self.log = open(log_path, 'wb')
+        # Without an app argument gunicorn.conf.py picks the one the worker class serves
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', *app],
+            cwd=cwd,
+            env=env,
+            stdout=self.log,
+            stderr=subprocess.STDOUT,
+        )
+
+    def log_text(self):
+        return Path(self.log_path).read_text(errors='replace')
+
+    def wait_until_ready(self):
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError(f'gunicorn exited during start-up:\n{self.log_text()[-2000:]}')
+            try:
+                urllib.request.urlopen(self.url + '/', timeout=1).read()
+                return
+            except urllib.error.HTTPError:
+                return
+            except OSError:
+                time.sleep(0.2)
+        self.stop()
+        raise CommandError(f'gunicorn did not answer within {SERVER_START_TIMEOUT}s:\n{self.log_text()[-2000:]}')
+
+    def profile(self):
+        """The worker line gunicorn.conf.py logs once the server is ready"""
+        match = re.search(r'Runtime profile: (\d+ \S+ workers x \d+ threads, preload=\w+)', self.log_text())
+        return match.group(1) if match else '?'
+
+    def stop(self):
+        self.process.send_signal(signal.SIGTERM)
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.log.close()
+
+
+class Command(BaseCommand):
+    help = 'Load-test the real views under gunicorn with each runtime profile and compare them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--config', action='append', dest='configs',
+            help='Configuration to run, e.g. "sync" or "gthread:WEB_CONCURRENCY=2,GUNICORN_THREADS=8" '
+                 '(repeatable; default: sync and gthread)',
+        )
+        parser.add_argument('--duration', type=float, default=15, help='Seconds of load per configuration (default: 15)')
+        parser.add_argument('--concurrency', type=int, default=16, help='Simultaneous clients (default: 16)')
+        parser.add_argument('--db-latency', type=float, default=0, help='Milliseconds added to every SQL query (default: 0)')
+        parser.add_argument('--port', type=int, default=8765, help='Local port for gunicorn (default: 8765)')
+        parser.add_argument('--member', help='Email of the member whose pages are requested (default: the first)')
+        parser.add_argument('--staff', help='Email of the staff user whose pages are requested (default: the first)')
+
+    def handle(self, *args, **options):
+        from django.conf import settings
+
+        if options['duration'] <= 0 or options['concurrency'] < 1:
+            raise CommandError('--duration must be positive and --concurrency at least 1.')
+        if not Path(settings.STATIC_ROOT, 'staticfiles.json').exists():
+            raise CommandError('Run "python manage.py collectstatic --noinput" first; the server runs with DEBUG off.')
+        configs = [parse_config(value) for value in options['configs'] or CONFIGS]
+
+        requests, sessions = self.build_requests(options['member'], options['staff'])
+        try:
+            results = [
+                self.run_config(label, env, requests, options)
+                for label, env in configs
+            ]
+        finally:
+            for session in sessions:
+                session.delete()
+
+        self.stdout.write(
+            f'{len(requests)} pages, {options["concurrency"]} clients, {options["duration"]:g}s each, '
+            f'{options["db_latency"]:g} ms added per query'
+        )
+        self.stdout.write(
+            f'{"config":<36}{"requests":>9}{"req/s":>8}{"p50":>9}{"p95":>9}{"p99":>9}{"errors":>8}{"memory":>9}'
+        )
+        for label, profile, row in results:
+            self.stdout.write(f'{label:<36}{row}')
+            self.stdout.write(f'    {profile}')
+
+    def build_requests(self, member_email, staff_email):
+        """[(page name, path, cookie header)], plus the sessions to delete afterwards"""
+        from importlib import import_module
+
+        from django.conf import settings
+        from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+        from django.db.models import Q
+        from django.urls import reverse
+
+        from members.models import Member, User
+
+        members = Member.objects.select_related('user').filter(user__isnull=False).exclude(status='Merged')
+        member = (members.filter(user__email=member_email) if member_email else members.order_by('created_at')).first()
+        staff_users = User.objects.filter(Q(groups__name='Staff') | Q(is_superuser=True), is_active=True)
+        staff = (staff_users.filter(email=staff_email) if staff_email else staff_users.order_by('pk')).first()
+        if member_email and member is None:
+            raise CommandError(f'No member with email {member_email}.')
+        if staff_email and staff is None:
+            raise CommandError(f'No staff user with email {staff_email}.')
+
+        engine = import_module(settings.SESSION_ENGINE)
+        sessions = []
+
+        def cookie_for(user):
+            session = engine.SessionStore()
+            session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+            session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.create()
+            sessions.append(session)
+            return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+        requests = [(name, reverse(name), '') for name in PUBLIC_PAGES]
+        if member:
+            cookie = cookie_for(member.user)
+            requests += [(name, reverse(name), cookie) for name in MEMBER_PAGES]
+        else:
+            self.stderr.write('No member with a login found; skipping member pages.')
+        if staff:
+            cookie = cookie_for(staff)
+            requests += [(name, reverse(name), cookie) for name in STAFF_PAGES]
+            if member:
+                requests.append(('staff_member_detail', reverse('staff_member_detail', args=[member.pk]), cookie))
+        else:
+            self.stderr.write('No staff user found; skipping staff pages.')
+        return requests, sessions
+
+    def run_config(self, label, config_env, requests, options):
+        """(label, worker profile, formatted result columns) for one configuration"""
+        from django.conf import settings
+
+        from ranch_portal.profiling import quantile
+
+        env = {
+            **os.environ,
+            'DEBUG': 'False',
+            'SECURE_SSL_REDIRECT': 'False',
+            'TEMPLATE_CACHE': 'True',
+            'ALLOWED_HOSTS': '127.0.0.1,localhost',
+            'METRICS_TOKEN': secrets.token_hex(16),
+            **config_env,
+        }
+        app = []
+        if options['db_latency']:
+            if env.get('GUNICORN_WORKER_CLASS') == 'uvicorn':
+                raise CommandError('--db-latency wraps the WSGI application; leave it off for uvicorn.')
+            env['LOADTEST_DB_LATENCY_MS'] = str(options['db_latency'])
+            app = [f'{__name__}:latency_application()']
+
+        self.stderr.write(f'Running {label}...')
+        with tempfile.NamedTemporaryFile(suffix='.log', delete=False) as log:
+            log_path = log.name
+        server = Server(env, options['port'], app, settings.BASE_DIR, log_path)
+        try:
+            server.wait_until_ready()
+            timings, statuses, elapsed = self.generate_load(server.url, requests, options)
+            memory = proportional_set_size(server.process.pid)
+            profile = server.profile()
+        finally:
+            server.stop()
+            os.unlink(log_path)
+
+        timings.sort()
+        errors = sum(1 for status in statuses if status is None or status >= 400)
+        p50, p95, p99 = (quantile(timings, q) * 1000 if timings else 0 for q in (0.5, 0.95, 0.99))
+        memory_mb = f'{memory / 1024 / 1024:.0f}MB' if memory else '-'
+        row = (
+            f'{len(timings):>9}{len(timings) / elapsed:>8.1f}'
+            f'{p50:>7.1f}ms{p95:>7.1f}ms{p99:>7.1f}ms{errors:>8}{memory_mb:>9}'
+        )
+        return label, profile, row
+
+    def generate_load(self, base_url, requests, options):
+        """Request pages from --concurrency threads until --duration is up"""
+        opener = urllib.request.build_opener(NoRedirect)
+        timings = []
+        statuses = []
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+
+        def client(offset):
+            index = offset
+            while time.monotonic() < deadline:
+                _, path, cookie = requests[index % len(requests)]
+                index += 1
+                request = urllib.request.Request(base_url + path, headers={'Cookie': cookie} if cookie else {})
+                start = time.perf_counter()
+                try:
+                    with opener.open(request, timeout=60) as response:
+                        response.read()
+                        status = response.status
+                except urllib.error.HTTPError as error:
+                    status = error.code
+                except OSError:
+                    status = None
+                elapsed = time.perf_counter() - start
+                with lock:
+                    timings.append(elapsed)
+                    statuses.append(status)
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return timings, statuses, time.monotonic() - started
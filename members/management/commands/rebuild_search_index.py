@@ -0,0 +1,25 @@
+"""
+Management command to rebuild the member search index
+"""
+from django.core.management.base import BaseCommand
+
+from members.models import Member
+from members.search import build_search_text, get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Recompute member search text and rebuild the search index'
+
+    def handle(self, *args, **options):
+        updated = 0
+        for member in Member.objects.select_related('user').iterator():
+            search_text = build_search_text(member)
+            if search_text != member.search_text:
+                Member.objects.filter(pk=member.pk).update(search_text=search_text)
+                updated += 1
+
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Search index rebuilt with {type(backend).__name__} ({updated} members refreshed).'
+        ))
@@ -0,0 +1,35 @@
+"""
+Management command to maintain the rolling 30-day attendance counters
+
+Run daily (see render.yaml) to expire days that fell out of the window.
+Use --full to rebuild everything from CheckIn after a repair or import.
+"""
+from django.core.management.base import BaseCommand
+
+from members.attendance import ATTENDANCE_WINDOW_DAYS, expire_attendance, rebuild_attendance
+from members.services import refresh_member_checkin_stats
+
+
+class Command(BaseCommand):
+    help = f'Expire attendance older than {ATTENDANCE_WINDOW_DAYS} days and recompute attendance_30d'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rebuild daily counters and all member attendance stats from check-ins',
+        )
+
+    def handle(self, *args, **options):
+        if options['full']:
+            updated = rebuild_attendance()
+            refresh_member_checkin_stats()
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt attendance from check-ins for {updated} members.'
+            ))
+            return
+
+        expired, updated = expire_attendance()
+        self.stdout.write(self.style.SUCCESS(
+            f'Expired {expired} daily counters; recomputed attendance_30d for {updated} members.'
+        ))
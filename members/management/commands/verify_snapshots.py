@@ -0,0 +1,32 @@
+"""
+Management command to prove every stored document snapshot still matches
+the SHA-256 it is keyed by
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from members.models import DocumentSnapshot
+
+
+class Command(BaseCommand):
+    help = 'Verify that every document snapshot still matches its SHA-256 hash'
+
+    def handle(self, *args, **options):
+        checked = 0
+        corrupted = []
+
+        snapshots = DocumentSnapshot.objects.annotate(signature_count=Count('signatures'))
+        for snapshot in snapshots.iterator(chunk_size=100):
+            checked += 1
+            if not snapshot.verify():
+                corrupted.append(snapshot)
+                self.stdout.write(self.style.ERROR(
+                    f'MISMATCH {snapshot.sha256} '
+                    f'(actual {DocumentSnapshot.digest(snapshot.content)}, '
+                    f'{snapshot.signature_count} signatures affected)'
+                ))
+
+        if corrupted:
+            raise CommandError(f'{len(corrupted)} of {checked} snapshots do not match their hash.')
+
+        self.stdout.write(self.style.SUCCESS(f'All {checked} snapshots match their hash.'))
@@ -0,0 +1,194 @@
+"""
+Merging duplicate member records
+
+merge_members() folds one or more duplicates into a surviving record in a
+single transaction. Related rows are re-pointed with one UPDATE per table
+rather than loaded and saved, the survivor's denormalized stats are
+recomputed from its (now combined) check-ins, and the duplicates are kept
+with status "Merged" and merged_into set, so links to them still resolve.
+Audit entries stay on the member they were written about, and the
+duplicates' logins are deactivated so nobody keeps using a merged record.
+
+find_duplicate_candidates() suggests pairs to merge. Members are grouped
+into blocks by phone number and by surname plus first initial, and only
+members sharing a block are compared, so the work grows with block size
+rather than with the square of the directory.
+"""
+import re
+from collections import defaultdict, namedtuple
+from difflib import SequenceMatcher
+
+from django.db import transaction
+
+from .attendance import recount_attendance
+from .fragments import invalidate_sections
+from .models import User, Member, CheckIn, Goal, GoalRequest, Note, SignedDocument, AuditLog
+from .services import invalidate_staff_dashboard, refresh_member_checkin_stats
+from .summary import invalidate_member_summaries
+
+
+# Tables whose rows simply follow the member; SignedDocument is handled
+# separately because of its (document, member) unique constraint. AuditLog
+# is history and is deliberately left where it was written.
+REPARENTED_MODELS = (CheckIn, Goal, GoalRequest, Note)
+
+DUPLICATE_THRESHOLD = 0.85
+# Same phone number counts for this much on top of the name similarity
+PHONE_MATCH_BONUS = 0.1
+# Blocks bigger than this (a shared office number, say) are not compared
+MAX_BLOCK_SIZE = 50
+
+DuplicateCandidate = namedtuple('DuplicateCandidate', 'score first_id second_id reasons')
+
+
+class MergeError(ValueError):
+    pass
+
+
+def merge_members(survivor, duplicates, actor=None):
+    """
+    Fold ``duplicates`` into ``survivor``
+
+    Returns a dict of what moved, which is also stored in the audit entry.
+    Signatures for a document the survivor has already signed stay on the
+    duplicate record, so no signed copy is ever deleted; where several
+    duplicates signed the same document the latest signature moves.
+    The duplicates' logins are deactivated, so keep the record whose
+    login the member actually uses.
+    """
+    duplicate_ids = [member.pk for member in duplicates if member.pk != survivor.pk]
+    if not duplicate_ids:
+        raise MergeError('Select at least one member besides the one being kept.')
+
+    with transaction.atomic():
+        locked = {
+            member.pk: member
+            for member in Member.objects.select_for_update().filter(pk__in=[survivor.pk, *duplicate_ids])
+        }
+        if survivor.pk not in locked or len(locked) != len(set(duplicate_ids)) + 1:
+            raise MergeError('One of the selected members no longer exists.')
+        already_merged = [str(member) for member in locked.values() if member.status == 'Merged']
+        if already_merged:
+            raise MergeError(f'Already merged: {", ".join(already_merged)}.')
+
+        moved = {}
+        for model in REPARENTED_MODELS:
+            moved[model._meta.model_name] = (
+                model.objects.filter(member_id__in=duplicate_ids).update(member_id=survivor.pk)
+            )
+        moved['signeddocument'], left_behind = _move_signatures(survivor.pk, duplicate_ids)
+
+        # Anything previously merged into a duplicate now points at the survivor
+        Member.objects.filter(merged_into_id__in=duplicate_ids).update(merged_into_id=survivor.pk)
+        Member.objects.filter(pk__in=duplicate_ids).update(status='Merged', merged_into_id=survivor.pk)
+        deactivated = list(
+            User.objects.filter(member_profile__pk__in=duplicate_ids, is_active=True).values_list('pk', flat=True)
+        )
+        User.objects.filter(pk__in=deactivated).update(is_active=False)
+
+        member_ids = [survivor.pk, *duplicate_ids]
+        refresh_member_checkin_stats(member_ids)
+        recount_attendance(member_ids)
+
+        summary = {
+            'survivor': str(survivor.pk),
+            'merged': [str(pk) for pk in duplicate_ids],
+            'moved': moved,
+            'signatures_left_on_duplicates': [str(pk) for pk in left_behind],
+            'deactivated_users': [str(pk) for pk in deactivated],
+        }
+        AuditLog.log('Members Merged', actor=actor, member=survivor, details=summary, strict=True)
+        transaction.on_commit(invalidate_staff_dashboard)
+        transaction.on_commit(lambda: invalidate_member_summaries(member_ids))
+        transaction.on_commit(lambda: invalidate_sections(member_ids))
+
+    survivor.refresh_from_db(fields=['attendance_30d', 'attendance_all_time', 'last_checkin_at'])
+    return summary
+
+
+def _move_signatures(survivor_id, duplicate_ids):
+    """Re-point duplicates' signatures that do not clash; returns (moved, ids left behind)"""
+    signed = set(
+        SignedDocument.objects.filter(member_id=survivor_id).values_list('document_id', flat=True)
+    )
+    latest = {}
+    left_behind = []
+    rows = (
+        SignedDocument.objects.filter(member_id__in=duplicate_ids)
+        .order_by('-signed_at')
+        .values_list('pk', 'document_id')
+    )
+    for pk, document_id in rows:
+        if document_id in signed or document_id in latest:
+            left_behind.append(pk)
+        else:
+            latest[document_id] = pk
+    moved = SignedDocument.objects.filter(pk__in=latest.values()).update(member_id=survivor_id)
+    return moved, left_behind
+
+
+def _normalize(value):
+    return re.sub(r'[^a-z]', '', value.lower())
+
+
+def phone_key(phone):
+    """Last ten digits of a phone number, or '' when there are too few to be useful"""
+    digits = re.sub(r'\D', '', phone or '')[-10:]
+    return digits if len(digits) >= 7 else ''
+
+
+def name_key(first_name, last_name):
+    last = _normalize(last_name)
+    first = _normalize(first_name)
+    return f'{last}:{first[:1]}' if last and first else ''
+
+
+def find_duplicate_candidates(queryset=None, threshold=DUPLICATE_THRESHOLD):
+    """
+    Likely duplicate pairs among ``queryset`` (default: every unmerged member)
+
+    Returns DuplicateCandidate tuples, best match first. The score is the
+    similarity of the full names, plus PHONE_MATCH_BONUS when the phone
+    numbers match, so siblings sharing a parent's phone are not flagged
+    while "Katie" and "Katherine" on the same number are.
+    """
+    if queryset is None:
+        queryset = Member.objects.all()
+    rows = (
+        queryset.exclude(status='Merged')
+        .order_by()
+        .values_list('pk', 'first_name', 'last_name', 'phone')
+    )
+
+    names = {}
+    phones = {}
+    blocks = defaultdict(list)
+    for pk, first_name, last_name, phone in rows.iterator():
+        names[pk] = f'{_normalize(first_name)} {_normalize(last_name)}'
+        phones[pk] = phone_key(phone)
+        if phones[pk]:
+            blocks['phone', phones[pk]].append(pk)
+        key = name_key(first_name, last_name)
+        if key:
+            blocks['name', key].append(pk)
+
+    candidates = {}
+    for members in blocks.values():
+        if len(members) < 2 or len(members) > MAX_BLOCK_SIZE:
+            continue
+        for index, first in enumerate(members):
+            for second in members[index + 1:]:
+                pair = tuple(sorted((first, second), key=str))
+                if pair in candidates:
+                    continue
+                score = SequenceMatcher(None, names[first], names[second]).ratio()
+                reasons = ['similar name'] if score >= threshold else []
+                if phones[first] and phones[first] == phones[second]:
+                    score += PHONE_MATCH_BONUS
+                    reasons.append('same phone')
+                candidates[pair] = DuplicateCandidate(round(min(score, 1.0), 3), *pair, reasons)
+
+    return sorted(
+        (candidate for candidate in candidates.values() if candidate.score >= threshold),
+        key=lambda candidate: -candidate.score,
+    )
@@ -0,0 +1,49 @@
+# Generated by Django 4.2 on 2026-10-17 00:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['-created_at'], name='audit_log_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='checkin',
+            index=models.Index(fields=['status', '-requested_at'], name='checkins_status_req_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='checkin',
+            index=models.Index(condition=models.Q(('status', 'Pending')), fields=['-requested_at'], name='checkins_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='checkin',
+            index=models.Index(fields=['member', '-requested_at'], name='checkins_member_req_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(fields=['member', 'status', '-created_at'], name='goals_member_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goalrequest',
+            index=models.Index(condition=models.Q(('status', 'Open')), fields=['-created_at'], name='goal_requests_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['status', 'membership_tier', '-created_at'], name='members_status_tier_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['-created_at', '-id'], name='members_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['member', 'visibility', '-created_at'], name='notes_member_vis_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2 on 2026-10-17 00:56
+
+import re
+
+from django.db import migrations, models
+
+
+# Frozen copies of members.search as it stood for this migration, so later
+# changes there cannot alter what this migration does
+FTS_TABLE = 'members_search'
+
+
+def build_search_text(member):
+    parts = [
+        member.first_name,
+        member.last_name,
+        member.parent_name,
+        member.user.email if member.user_id else '',
+        re.sub(r'\D', '', member.phone or ''),
+    ]
+    return ' '.join(part.strip().lower() for part in parts if part)
+
+
+def populate_search_text(apps, schema_editor):
+    Member = apps.get_model('members', 'Member')
+    for member in Member.objects.select_related('user').iterator():
+        member.search_text = build_search_text(member)
+        member.save(update_fields=['search_text'])
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS members_search_trgm_idx '
+            'ON members USING gin (search_text gin_trgm_ops)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            f"USING fts5(member_id UNINDEXED, body, tokenize='trigram')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (member_id, body) SELECT id, search_text FROM members'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS members_search_trgm_idx')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0002_add_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(populate_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2 on 2026-10-17 00:59
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def backfill_attendance(apps, schema_editor):
+    Member = apps.get_model('members', 'Member')
+    CheckIn = apps.get_model('members', 'CheckIn')
+    DailyAttendance = apps.get_model('members', 'DailyAttendance')
+
+    start = timezone.localdate() - timedelta(days=29)
+    rows = (
+        CheckIn.objects.filter(status='Confirmed')
+        .annotate(day=TruncDate('requested_at'))
+        .filter(day__gte=start)
+        .order_by()
+        .values('member_id', 'day')
+        .annotate(total=Count('id'))
+    )
+    DailyAttendance.objects.bulk_create([
+        DailyAttendance(member_id=row['member_id'], day=row['day'], count=row['total'])
+        for row in rows
+    ])
+
+    totals = {}
+    for row in rows:
+        totals[row['member_id']] = totals.get(row['member_id'], 0) + row['total']
+    for member_id, total in totals.items():
+        Member.objects.filter(pk=member_id).update(attendance_30d=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0003_member_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAttendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_attendance', to='members.member')),
+            ],
+            options={
+                'verbose_name': 'Daily Attendance',
+                'verbose_name_plural': 'Daily Attendance',
+                'db_table': 'daily_attendance',
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='dailyattendance',
+            index=models.Index(fields=['day'], name='daily_attendance_day_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyattendance',
+            unique_together={('member', 'day')},
+        ),
+        migrations.RunPython(backfill_attendance, migrations.RunPython.noop),
+    ]
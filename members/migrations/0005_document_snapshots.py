@@ -0,0 +1,70 @@
+# Generated by Django 4.2 on 2026-10-17 01:10
+
+import hashlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def dedupe_snapshots(apps, schema_editor):
+    """Move every distinct snapshot text into document_snapshots and point signatures at it"""
+    DocumentSnapshot = apps.get_model('members', 'DocumentSnapshot')
+    SignedDocument = apps.get_model('members', 'SignedDocument')
+
+    texts = SignedDocument.objects.order_by().values_list('document_snapshot', flat=True).distinct()
+    for content in texts.iterator():
+        sha256 = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        DocumentSnapshot.objects.get_or_create(sha256=sha256, defaults={'content': content})
+        SignedDocument.objects.filter(document_snapshot=content).update(snapshot_id=sha256)
+
+
+def restore_snapshots(apps, schema_editor):
+    DocumentSnapshot = apps.get_model('members', 'DocumentSnapshot')
+    SignedDocument = apps.get_model('members', 'SignedDocument')
+
+    for snapshot in DocumentSnapshot.objects.iterator():
+        SignedDocument.objects.filter(snapshot_id=snapshot.sha256).update(document_snapshot=snapshot.content)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0004_daily_attendance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSnapshot',
+            fields=[
+                ('sha256', models.CharField(editable=False, max_length=64, primary_key=True, serialize=False)),
+                ('content', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Document Snapshot',
+                'verbose_name_plural': 'Document Snapshots',
+                'db_table': 'document_snapshots',
+            },
+        ),
+        migrations.AddField(
+            model_name='signeddocument',
+            name='snapshot',
+            field=models.ForeignKey(db_column='snapshot_sha256', help_text='Exact document content at time of signing', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='signatures', to='members.documentsnapshot'),
+        ),
+        migrations.RunPython(dedupe_snapshots, restore_snapshots),
+        # A default lets the column be re-added (and refilled) if this is reversed
+        migrations.AlterField(
+            model_name='signeddocument',
+            name='document_snapshot',
+            field=models.TextField(default='', help_text='Exact document content at time of signing'),
+        ),
+        migrations.RemoveField(
+            model_name='signeddocument',
+            name='document_snapshot',
+        ),
+        migrations.AlterField(
+            model_name='signeddocument',
+            name='snapshot',
+            field=models.ForeignKey(db_column='snapshot_sha256', help_text='Exact document content at time of signing', on_delete=django.db.models.deletion.PROTECT, related_name='signatures', to='members.documentsnapshot'),
+        ),
+    ]
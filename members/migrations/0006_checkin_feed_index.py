@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 01:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0005_document_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='checkin',
+            index=models.Index(fields=['updated_at'], name='checkins_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 4.2 on 2026-10-17 01:15
+
+from datetime import date, timezone as dt_timezone
+
+from django.db import migrations, models
+from django.db.models import Min, Q
+from django.utils import timezone
+
+
+ACTION_CODES = [
+    ('member_registration', 'Member Registration'),
+    ('member_approved', 'Member Approved'),
+    ('document_signed', 'Document Signed'),
+    ('checkin_requested', 'Check-in Requested'),
+    ('checkin_approved', 'Check-in Approved'),
+]
+
+# Months of partitions created past the current one; archive_audit_log keeps extending them
+PARTITIONS_AHEAD = 3
+
+
+def backfill_action_codes(apps, schema_editor):
+    AuditLog = apps.get_model('members', 'AuditLog')
+    for code, label in ACTION_CODES:
+        AuditLog.objects.filter(
+            Q(action=label) | Q(action__startswith=f'{label}:'), action_code=''
+        ).update(action_code=code)
+    AuditLog.objects.filter(action_code='').update(action_code='other')
+
+
+def _months(first, last):
+    month = date(first.year, first.month, 1)
+    while month <= last:
+        yield month
+        month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _recreate_indexes_and_keys(cursor):
+    cursor.execute('CREATE INDEX audit_log_created_idx ON audit_log (created_at DESC)')
+    cursor.execute('CREATE INDEX audit_log_code_created_idx ON audit_log (action_code, created_at DESC)')
+    cursor.execute('CREATE INDEX audit_log_actor_id_idx ON audit_log (actor_id)')
+    cursor.execute('CREATE INDEX audit_log_member_id_idx ON audit_log (member_id)')
+    cursor.execute(
+        'ALTER TABLE audit_log ADD CONSTRAINT audit_log_actor_id_fk '
+        'FOREIGN KEY (actor_id) REFERENCES users (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+    cursor.execute(
+        'ALTER TABLE audit_log ADD CONSTRAINT audit_log_member_id_fk '
+        'FOREIGN KEY (member_id) REFERENCES members (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+
+
+def partition_audit_log(apps, schema_editor):
+    """
+    On PostgreSQL, rebuild audit_log as a table range-partitioned by month
+
+    Nothing references audit_log, so the table can be swapped wholesale.
+    The primary key has to include the partition key, so it becomes
+    (id, created_at); ids are random UUIDs and stay unique in practice.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    AuditLog = apps.get_model('members', 'AuditLog')
+    oldest = AuditLog.objects.aggregate(oldest=Min('created_at'))['oldest'] or timezone.now()
+    today = timezone.now().astimezone(dt_timezone.utc)
+    last = date(today.year, today.month, 1)
+    for _ in range(PARTITIONS_AHEAD):
+        last = date(last.year + last.month // 12, last.month % 12 + 1, 1)
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('ALTER TABLE audit_log RENAME TO audit_log_unpartitioned')
+        cursor.execute(
+            'CREATE TABLE audit_log (LIKE audit_log_unpartitioned INCLUDING DEFAULTS) '
+            'PARTITION BY RANGE (created_at)'
+        )
+        cursor.execute('ALTER TABLE audit_log ADD PRIMARY KEY (id, created_at)')
+        cursor.execute('CREATE TABLE audit_log_default PARTITION OF audit_log DEFAULT')
+        for month in _months(oldest.astimezone(dt_timezone.utc), last):
+            following = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+            cursor.execute(
+                f'CREATE TABLE audit_log_p{month:%Y%m} PARTITION OF audit_log '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [f'{month.isoformat()} 00:00:00+00', f'{following.isoformat()} 00:00:00+00'],
+            )
+        cursor.execute('INSERT INTO audit_log SELECT * FROM audit_log_unpartitioned')
+        cursor.execute('DROP TABLE audit_log_unpartitioned')
+        _recreate_indexes_and_keys(cursor)
+
+
+def unpartition_audit_log(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('ALTER TABLE audit_log RENAME TO audit_log_partitioned')
+        cursor.execute('CREATE TABLE audit_log (LIKE audit_log_partitioned INCLUDING DEFAULTS)')
+        cursor.execute('ALTER TABLE audit_log ADD PRIMARY KEY (id)')
+        cursor.execute('INSERT INTO audit_log SELECT * FROM audit_log_partitioned')
+        cursor.execute('DROP TABLE audit_log_partitioned CASCADE')
+        _recreate_indexes_and_keys(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0007_audit_log_created_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditlog',
+            name='action_code',
+            field=models.CharField(blank=True, choices=[('member_registration', 'Member Registration'), ('member_approved', 'Member Approved'), ('document_signed', 'Document Signed'), ('checkin_requested', 'Check-in Requested'), ('checkin_approved', 'Check-in Approved'), ('other', 'Other')], default='', max_length=30),
+        ),
+        migrations.RunPython(backfill_action_codes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['action_code', '-created_at'], name='audit_log_code_created_idx'),
+        ),
+        migrations.RunPython(partition_audit_log, unpartition_audit_log),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 01:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0008_audit_log_action_code_partitions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditlog',
+            name='action_code',
+            field=models.CharField(blank=True, choices=[('member_registration', 'Member Registration'), ('member_imported', 'Member Imported'), ('member_approved', 'Member Approved'), ('document_signed', 'Document Signed'), ('checkin_requested', 'Check-in Requested'), ('checkin_approved', 'Check-in Approved'), ('other', 'Other')], default='', max_length=30),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-17 01:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0010_audit_log_members_merged'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='checkin',
+            name='member',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='checkins', to='members.member'),
+        ),
+    ]
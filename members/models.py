@@ -2,12 +2,19 @@
 Double C Ranch / Pony Club Riding Center
 Membership Portal - Data Models
 """
+import hashlib
 import uuid
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, F
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.core.validators import EmailValidator
 
+from . import caching
+from .search import build_search_text
+
 
 class User(AbstractUser):
     """
@@ -28,20 +35,51 @@ class User(AbstractUser):
         verbose_name = 'User'
         verbose_name_plural = 'Users'
 
+    ROLE_GROUPS = ('Member', 'Staff', 'Admin')
+    ROLES_CACHE_TIMEOUT = 60 * 60
+
     def __str__(self):
         return self.email
 
+    @staticmethod
+    def roles_version_key(user_id):
+        return caching.roles_version.key(user_id)
+
+    @classmethod
+    def invalidate_roles(cls, user_ids):
+        """Stamp a new roles version for these users so cached role sets are ignored"""
+        caching.roles_version.set_many({cls.roles_version_key(pk): uuid.uuid4().hex for pk in user_ids}, None)
+
+    @cached_property
+    def roles(self):
+        """
+        Names of the role groups this user belongs to
+
+        Resolved once per instance, i.e. once per request, and cached across
+        requests under a version stamp that group membership changes replace.
+        """
+        version = caching.roles_version.get_or_set(
+            self.roles_version_key(self.pk), lambda: uuid.uuid4().hex, None
+        )
+        return caching.roles.get_or_set(
+            caching.roles.key(self.pk, version),
+            lambda: frozenset(
+                self.groups.filter(name__in=self.ROLE_GROUPS).values_list('name', flat=True)
+            ),
+            self.ROLES_CACHE_TIMEOUT,
+        )
+
     @property
     def is_member(self):
-        return self.groups.filter(name='Member').exists()
+        return 'Member' in self.roles
 
     @property
     def is_staff_user(self):
-        return self.groups.filter(name='Staff').exists() or self.is_superuser
+        return 'Staff' in self.roles or self.is_superuser
 
     @property
     def is_admin_user(self):
-        return self.is_superuser or self.groups.filter(name='Admin').exists()
+        return self.is_superuser or 'Admin' in self.roles
 
 
 class Member(models.Model):
@@ -86,6 +124,9 @@ class Member(models.Model):
     attendance_all_time = models.IntegerField(default=0)
     last_checkin_at = models.DateTimeField(null=True, blank=True)
 
+    # Denormalized search document (see members.search)
+    search_text = models.TextField(blank=True, default='', editable=False)
+
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -95,10 +136,26 @@ class Member(models.Model):
         verbose_name = 'Member'
         verbose_name_plural = 'Members'
         ordering = ['-created_at']
+        indexes = [
+            # Staff directory filters, newest first
+            models.Index(fields=['status', 'membership_tier', '-created_at'], name='members_status_tier_idx'),
+            # Keyset pagination key for the staff directory
+            models.Index(fields=['-created_at', '-id'], name='members_created_id_idx'),
+        ]
+
+    SEARCH_SOURCE_FIELDS = {'user', 'first_name', 'last_name', 'parent_name', 'phone'}
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.SEARCH_SOURCE_FIELDS & set(update_fields):
+            self.search_text = build_search_text(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'search_text'}
+        super().save(*args, **kwargs)
+
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
@@ -113,9 +170,50 @@ class Member(models.Model):
 
     def has_signed_all_required_documents(self):
         """Check if member has signed all required active documents"""
-        required_docs = Document.objects.filter(is_active=True, is_required=True)
-        signed_docs = SignedDocument.objects.filter(member=self).values_list('document_id', flat=True)
-        return all(doc.id in signed_docs for doc in required_docs)
+        required = Document.required_ids()
+        if not required:
+            return True
+        signed = SignedDocument.objects.filter(
+            member=self, document_id__in=required
+        ).values_list('document_id', flat=True)
+        return required <= set(signed)
+
+    @classmethod
+    def ids_with_all_required_documents(cls, member_ids):
+        """Return the subset of member_ids that have signed every required document, in one query"""
+        member_ids = list(member_ids)
+        required = Document.required_ids()
+        if not required:
+            return set(member_ids)
+        if not member_ids:
+            return set()
+        complete = (
+            SignedDocument.objects.filter(member_id__in=member_ids, document_id__in=required)
+            .order_by()
+            .values('member_id')
+            .annotate(signed=Count('document_id', distinct=True))
+            .filter(signed=len(required))
+            .values_list('member_id', flat=True)
+        )
+        return set(complete)
+
+
+class DocumentQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """
+        Bulk updates (admin actions, data fixes) send no post_save, so the
+        document caches are cleared here, for the rows as they were and
+        as they are afterwards
+        """
+        pks = list(self.values_list('pk', flat=True))
+        keys = {Document.content_cache_key(code, version) for code, version in self.values_list('code', 'version')}
+        rows = super().update(**kwargs)
+        keys.update(
+            Document.content_cache_key(code, version)
+            for code, version in Document.objects.filter(pk__in=pks).values_list('code', 'version')
+        )
+        Document.invalidate_caches(keys)
+        return rows
 
 
 class Document(models.Model):
@@ -133,6 +231,8 @@ class Document(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = DocumentQuerySet.as_manager()
+
     class Meta:
         db_table = 'documents'
         verbose_name = 'Document'
@@ -140,14 +240,100 @@ class Document(models.Model):
         ordering = ['code', '-version']
         unique_together = ['code', 'version']
 
+    REQUIRED_IDS_CACHE_KEY = caching.required_documents.key()
+    REQUIRED_IDS_CACHE_TIMEOUT = 60 * 60
+    CONTENT_CACHE_TIMEOUT = 24 * 60 * 60
+
     def __str__(self):
         return f"{self.name} (v{self.version})"
 
+    @classmethod
+    def required_ids(cls):
+        """IDs of active required documents, cached until a Document changes"""
+        return caching.required_documents.get_or_set(
+            cls.REQUIRED_IDS_CACHE_KEY,
+            lambda: frozenset(
+                cls.objects.filter(is_active=True, is_required=True).values_list('id', flat=True)
+            ),
+            cls.REQUIRED_IDS_CACHE_TIMEOUT,
+        )
+
+    @classmethod
+    def invalidate_required_ids(cls):
+        caching.required_documents.delete(cls.REQUIRED_IDS_CACHE_KEY)
+
+    @classmethod
+    def invalidate_caches(cls, content_keys):
+        """
+        Drop the required-documents list and the given content entries once
+        the change commits, so a signer in between cannot re-cache the old text
+        """
+        content_keys = list(content_keys)
+
+        def invalidate():
+            cls.invalidate_required_ids()
+            caching.document_content.delete_many(content_keys)
+
+        transaction.on_commit(invalidate)
+
+    @staticmethod
+    def content_cache_key(code, version):
+        return caching.document_content.key(code, version)
+
+    def get_cached_content(self):
+        """
+        Full document text, served from a cache keyed by (code, version)
+        so the waiver is not re-read from the database for every signer
+        """
+        def load():
+            if 'content' in self.get_deferred_fields():
+                return Document.objects.filter(pk=self.pk).values_list('content', flat=True).get()
+            return self.content
+
+        return caching.document_content.get_or_set(
+            self.content_cache_key(self.code, self.version), load, self.CONTENT_CACHE_TIMEOUT
+        )
+
+
+class DocumentSnapshot(models.Model):
+    """
+    Exact document text as agreed to, stored once per distinct content
+    Keyed by the SHA-256 of the UTF-8 text, so every signer of the same
+    document version shares one row
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True, editable=False)
+    content = models.TextField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'document_snapshots'
+        verbose_name = 'Document Snapshot'
+        verbose_name_plural = 'Document Snapshots'
+
+    def __str__(self):
+        return self.sha256
+
+    @staticmethod
+    def digest(content):
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def store(cls, content):
+        """Return the snapshot for ``content``, creating it the first time it is seen"""
+        # A primary-key lookup; the insert only happens for new text
+        snapshot, _ = cls.objects.get_or_create(sha256=cls.digest(content), defaults={'content': content})
+        return snapshot
+
+    def verify(self):
+        """True if the stored text still hashes to its key"""
+        return self.digest(self.content) == self.sha256
+
 
 class SignedDocument(models.Model):
     """
     Record of a member signing a document
-    Stores snapshot of document content at time of signing
+    References a content-addressed snapshot of the document at time of signing
     """
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     document = models.ForeignKey(Document, on_delete=models.PROTECT, related_name='signatures')
@@ -165,7 +351,13 @@ class SignedDocument(models.Model):
     user_agent = models.TextField(blank=True)
 
     # Legal record - exact text they agreed to
-    document_snapshot = models.TextField(help_text="Exact document content at time of signing")
+    snapshot = models.ForeignKey(
+        DocumentSnapshot,
+        on_delete=models.PROTECT,
+        related_name='signatures',
+        db_column='snapshot_sha256',
+        help_text="Exact document content at time of signing"
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -179,6 +371,11 @@ class SignedDocument(models.Model):
     def __str__(self):
         return f"{self.member.full_name} - {self.document.name} - {self.signed_at.date()}"
 
+    @property
+    def document_snapshot(self):
+        """Exact document content at time of signing"""
+        return self.snapshot.content
+
 
 class CheckIn(models.Model):
     """
@@ -200,7 +397,7 @@ class CheckIn(models.Model):
     ]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='checkins')
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='checkins', db_index=False)
 
     # Check-in details
     requested_at = models.DateTimeField(default=timezone.now)
@@ -227,23 +424,83 @@ class CheckIn(models.Model):
         verbose_name = 'Check-In'
         verbose_name_plural = 'Check-Ins'
         ordering = ['-requested_at']
+        indexes = [
+            models.Index(fields=['status', '-requested_at'], name='checkins_status_req_idx'),
+            # Staff queue: only the small pending slice is ever scanned
+            models.Index(
+                fields=['-requested_at'],
+                name='checkins_pending_idx',
+                condition=models.Q(status='Pending'),
+            ),
+            # Member dashboard / check-in page history; it leads with member,
+            # so it also serves the foreign key and that has no index of its own
+            models.Index(fields=['member', '-requested_at'], name='checkins_member_req_idx'),
+            # Live check-in feed cursor
+            models.Index(fields=['updated_at'], name='checkins_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.member.full_name} - {self.type} - {self.requested_at.date()}"
 
     def approve(self, staff_user, instructor=None):
-        """Approve check-in and update member stats"""
-        self.status = 'Confirmed'
-        self.confirmed_at = timezone.now()
-        self.approved_by = staff_user
-        if instructor:
-            self.instructor = instructor
-        self.save()
-        
-        # Update member stats
-        self.member.last_checkin_at = self.confirmed_at
-        self.member.attendance_all_time += 1
-        self.member.save()
+        """
+        Approve check-in and update member stats
+
+        The check-in row is locked for the duration, so concurrent approvals
+        of the same check-in count once; approving an already-confirmed
+        check-in is a no-op. Returns True if this call confirmed it.
+        """
+        with transaction.atomic():
+            locked = CheckIn.objects.select_for_update().get(pk=self.pk)
+            if locked.status == 'Confirmed':
+                self.status = locked.status
+                self.confirmed_at = locked.confirmed_at
+                self.approved_by_id = locked.approved_by_id
+                self.instructor_id = locked.instructor_id
+                return False
+
+            self.status = 'Confirmed'
+            self.confirmed_at = timezone.now()
+            self.approved_by = staff_user
+            if instructor:
+                self.instructor = instructor
+            self.save(update_fields=['status', 'confirmed_at', 'approved_by', 'instructor', 'updated_at'])
+
+            # Increment in the database so concurrent approvals never lose a count
+            Member.objects.filter(pk=self.member_id).update(
+                attendance_all_time=F('attendance_all_time') + 1,
+                last_checkin_at=self.confirmed_at,
+            )
+
+            from .attendance import record_attendance
+            record_attendance([(self.member_id, self.requested_at)])
+
+        if CheckIn.member.is_cached(self):
+            self.member.refresh_from_db(fields=['attendance_all_time', 'attendance_30d', 'last_checkin_at'])
+        return True
+
+
+class DailyAttendance(models.Model):
+    """
+    Confirmed check-ins per member per day
+    Feeds the rolling Member.attendance_30d counter (see members.attendance)
+    """
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='daily_attendance')
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'daily_attendance'
+        verbose_name = 'Daily Attendance'
+        verbose_name_plural = 'Daily Attendance'
+        ordering = ['-day']
+        unique_together = ['member', 'day']
+        indexes = [
+            models.Index(fields=['day'], name='daily_attendance_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.member_id} - {self.day} - {self.count}"
 
 
 class GoalRequest(models.Model):
@@ -272,6 +529,13 @@ class GoalRequest(models.Model):
         verbose_name = 'Goal Request'
         verbose_name_plural = 'Goal Requests'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['-created_at'],
+                name='goal_requests_open_idx',
+                condition=models.Q(status='Open'),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.member.full_name} - {self.timeframe}"
@@ -304,6 +568,9 @@ class Goal(models.Model):
         verbose_name = 'Goal'
         verbose_name_plural = 'Goals'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['member', 'status', '-created_at'], name='goals_member_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.member.full_name} - {self.title}"
@@ -376,6 +643,9 @@ class Note(models.Model):
         verbose_name = 'Note'
         verbose_name_plural = 'Notes'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['member', 'visibility', '-created_at'], name='notes_member_vis_idx'),
+        ]
 
     def __str__(self):
         return f"{self.member.full_name} - {self.category} - {self.created_at.date()}"
@@ -390,27 +660,76 @@ class AuditLog(models.Model):
     actor = models.ForeignKey('User', on_delete=models.SET_NULL, null=True, blank=True, related_name='audit_actions')
     member = models.ForeignKey(Member, on_delete=models.SET_NULL, null=True, blank=True, related_name='audit_logs')
 
+    ACTION_CODE_CHOICES = [
+        ('member_registration', 'Member Registration'),
+        ('member_imported', 'Member Imported'),
+        ('member_approved', 'Member Approved'),
+        ('members_merged', 'Members Merged'),
+        ('document_signed', 'Document Signed'),
+        ('checkin_requested', 'Check-in Requested'),
+        ('checkin_approved', 'Check-in Approved'),
+        ('other', 'Other'),
+    ]
+
     action = models.CharField(max_length=100)
+    # Bounded, indexed form of ``action`` for filtering; the free-form text
+    # (e.g. "Document Signed: Liability Waiver") stays in ``action``
+    action_code = models.CharField(max_length=30, choices=ACTION_CODE_CHOICES, blank=True, default='')
     details = models.JSONField(null=True, blank=True)
 
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Stamped when the action happens, not when a buffered entry is written
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         db_table = 'audit_log'
         verbose_name = 'Audit Log Entry'
         verbose_name_plural = 'Audit Log'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='audit_log_created_idx'),
+            models.Index(fields=['action_code', '-created_at'], name='audit_log_code_created_idx'),
+        ]
 
     def __str__(self):
         actor_name = self.actor.email if self.actor else 'System'
         return f"{actor_name} - {self.action} - {self.created_at}"
 
+    def save(self, *args, **kwargs):
+        if not self.action_code:
+            self.action_code = self.code_for(self.action)
+        super().save(*args, **kwargs)
+
     @classmethod
-    def log(cls, action, actor=None, member=None, details=None):
-        """Convenience method to create audit log entries"""
-        return cls.objects.create(
+    def code_for(cls, action):
+        """Action code for a free-form action, matched on the text before any colon"""
+        label = action.split(':', 1)[0].strip()
+        for code, code_label in cls.ACTION_CODE_CHOICES:
+            if code_label == label:
+                return code
+        return 'other'
+
+    @classmethod
+    def log(cls, action, actor=None, member=None, details=None, strict=False):
+        """
+        Convenience method to create audit log entries
+
+        Entries are buffered and written in batches after the surrounding
+        transaction commits (see members.audit). Pass ``strict=True`` for
+        legally significant actions: the entry is then inserted right away,
+        inside the caller's transaction, so it commits or rolls back with
+        the action it records.
+        """
+        entry = cls(
             action=action,
+            action_code=cls.code_for(action),
             actor=actor,
             member=member,
             details=details or {}
         )
+        if strict or not getattr(settings, 'AUDIT_LOG_BUFFERED', True):
+            entry.save(force_insert=True)
+            return entry
+
+        from .audit import audit_writer
+        transaction.on_commit(lambda: audit_writer.add(entry))
+        return entry
@@ -0,0 +1,74 @@
+"""
+Keyset (cursor) pagination for staff list views
+
+Pages are keyed on (created_at, id), newest first. The cursor encodes the
+last row of the previous page, so fetching page N costs the same as page 1
+instead of scanning and discarding N * page_size rows like OFFSET does.
+"""
+import base64
+import binascii
+import uuid
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class KeysetPage:
+    """A single page of results plus the cursor for the next one"""
+
+    def __init__(self, object_list, next_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(obj):
+    """Encode the (created_at, id) key of a row as an opaque URL-safe cursor"""
+    raw = f"{obj.created_at.isoformat()}|{obj.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor back to (created_at, id), or None if it is malformed"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, pk = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def paginate_keyset(queryset, cursor=None, page_size=50):
+    """
+    Return a KeysetPage of ``queryset`` ordered newest first on (created_at, id)
+
+    One extra row is fetched to find out whether another page exists, so no
+    separate COUNT query is needed.
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+
+    key = decode_cursor(cursor)
+    if key is not None:
+        created_at, pk = key
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) |
+            Q(created_at=created_at, id__lt=pk)
+        )
+
+    rows = list(queryset[:page_size + 1])
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return KeysetPage(rows, encode_cursor(rows[-1]))
+    return KeysetPage(rows)
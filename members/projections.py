@@ -0,0 +1,38 @@
+"""
+Column projections for list views
+
+List pages never display the large text columns (signature user agents,
+document and note bodies, audit details, search text), so these helpers
+select only what the templates read and leave the rest in the database
+until a detail view asks for it.
+"""
+
+# Signed documents as listed on the profile and staff member detail pages
+SIGNED_DOCUMENT_LIST_FIELDS = (
+    'id', 'member', 'signed_name', 'signed_for_name', 'relationship',
+    'signed_at', 'ip_address',
+    'document', 'document__name', 'document__version',
+)
+
+# Check-ins as listed on the staff check-ins page and dashboard
+CHECKIN_LIST_FIELDS = (
+    'id', 'type', 'status', 'requested_at', 'confirmed_at',
+    'student_note', 'staff_note',
+    'member', 'member__first_name', 'member__last_name',
+    'instructor', 'instructor__first_name', 'instructor__last_name',
+)
+
+
+def signed_document_list(queryset):
+    return queryset.select_related('document').only(*SIGNED_DOCUMENT_LIST_FIELDS)
+
+
+def checkin_list(queryset):
+    return queryset.select_related('member', 'instructor').only(*CHECKIN_LIST_FIELDS)
+
+
+def note_list(queryset):
+    return queryset.select_related('author').only(
+        'id', 'member', 'category', 'visibility', 'content', 'created_at',
+        'author', 'author__first_name', 'author__last_name',
+    )
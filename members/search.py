@@ -0,0 +1,188 @@
+"""
+Ranked member search for the staff directory and admin
+
+Each Member carries a denormalized, lower-cased ``search_text`` column
+(names, login email and phone digits) that is kept in sync on Member and
+User save. The active backend indexes that text:
+
+* PostgreSQL: pg_trgm GIN index on members.search_text, ranked by
+  trigram similarity
+* SQLite: an FTS5 shadow table (trigram tokenizer), ranked by bm25
+
+Set ``MEMBER_SEARCH_BACKEND`` to a dotted path to force a backend.
+"""
+import re
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models import Case, When, IntegerField
+from django.utils.module_loading import import_string
+
+
+FTS_TABLE = 'members_search'
+
+# Search results are ranked and capped rather than paginated; search()
+# callers apply their other filters first so the cap comes after them
+MAX_RESULTS = 500
+
+PHONE_QUERY_RE = re.compile(r'^[\d\s().+-]+$')
+
+
+def normalize_phone(value):
+    """Strip a phone number down to its digits so formatting never matters"""
+    return re.sub(r'\D', '', value or '')
+
+
+def normalize_query(query):
+    """Lower-case a query, and reduce phone-looking queries to digits"""
+    query = (query or '').strip().lower()
+    if any(ch.isdigit() for ch in query) and PHONE_QUERY_RE.match(query):
+        return normalize_phone(query)
+    return query
+
+
+def build_search_text(member, email=None):
+    """Build the denormalized search text for a member"""
+    if email is None and member.user_id:
+        email = member.user.email
+    parts = [
+        member.first_name,
+        member.last_name,
+        member.parent_name,
+        email or '',
+        normalize_phone(member.phone),
+    ]
+    return ' '.join(part.strip().lower() for part in parts if part)
+
+
+def _rank_by_ids(queryset, ids):
+    """Restrict ``queryset`` to ``ids`` and annotate their position as search_rank"""
+    if not ids:
+        return queryset.none()
+    ordering = Case(
+        *[When(id=pk, then=position) for position, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(id__in=ids).annotate(search_rank=ordering).order_by('search_rank')
+
+
+class BaseSearchBackend:
+    """Interface shared by all member search backends"""
+
+    def search(self, queryset, query):
+        """
+        Filter ``queryset`` to matches for ``query``, best match first
+
+        Apply any other filters to ``queryset`` beforehand; the ranked
+        result may be capped at MAX_RESULTS.
+        """
+        term = normalize_query(query)
+        if not term:
+            return queryset
+        return self.rank(queryset, term)
+
+    def rank(self, queryset, term):
+        raise NotImplementedError
+
+    def index(self, member):
+        """Update the index entry for one member"""
+
+    def index_many(self, members):
+        """Add index entries for newly created members"""
+        for member in members:
+            self.index(member)
+
+    def remove(self, member_id):
+        """Drop the index entry for one member"""
+
+    def rebuild(self):
+        """Rebuild the whole index from members.search_text"""
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """Substring match on search_text; used where no index is available"""
+
+    def rank(self, queryset, term):
+        return queryset.filter(search_text__contains=term)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """pg_trgm similarity over the GIN-indexed search_text column"""
+
+    def rank(self, queryset, term):
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        # A plain LIKE on the lower-cased column is served by the trigram index
+        return queryset.filter(search_text__contains=term).annotate(
+            similarity=TrigramSimilarity('search_text', term)
+        ).order_by('-similarity', '-created_at')
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """FTS5 shadow table with the trigram tokenizer, ranked by bm25"""
+
+    def rank(self, queryset, term):
+        if len(term) < 3:
+            # The trigram tokenizer cannot match fewer than three characters
+            return SimpleSearchBackend().rank(queryset, term)
+
+        # The caller's filters go inside the match, so MAX_RESULTS caps the
+        # matches that pass them rather than hiding them behind others
+        try:
+            members_sql, members_params = queryset.order_by().values('id').query.sql_with_params()
+        except EmptyResultSet:
+            return queryset.none()
+        phrase = '"' + term.replace('"', '""') + '"'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT member_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'AND member_id IN ({members_sql}) ORDER BY rank LIMIT %s',
+                [phrase, *members_params, MAX_RESULTS],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        return _rank_by_ids(queryset, ids)
+
+    def index(self, member):
+        member_id = member.id.hex
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE member_id = %s', [member_id])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (member_id, body) VALUES (%s, %s)',
+                [member_id, member.search_text],
+            )
+
+    def index_many(self, members):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (member_id, body) VALUES (%s, %s)',
+                [(member.id.hex, member.search_text) for member in members],
+            )
+
+    def remove(self, member_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE member_id = %s', [member_id.hex])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(f'INSERT INTO {FTS_TABLE} (member_id, body) SELECT id, search_text FROM members')
+
+
+_backend = None
+
+
+def get_search_backend():
+    """Return the configured search backend, chosen by database vendor by default"""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'MEMBER_SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == 'postgresql':
+            _backend = PostgresSearchBackend()
+        elif connection.vendor == 'sqlite':
+            _backend = SQLiteSearchBackend()
+        else:
+            _backend = SimpleSearchBackend()
+    return _backend
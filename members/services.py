@@ -0,0 +1,132 @@
+"""
+Set-based operations shared by the staff views and the admin
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import caching
+from .attendance import record_attendance
+from .fragments import invalidate_sections
+from .models import Member, CheckIn, GoalRequest, AuditLog
+from .projections import checkin_list
+from .summary import invalidate_member_summaries
+
+
+STAFF_DASHBOARD_CACHE_KEY = caching.staff_dashboard.key()
+STAFF_DASHBOARD_CACHE_TIMEOUT = 5  # seconds
+
+
+def refresh_member_checkin_stats(member_ids=None):
+    """
+    Recompute attendance_all_time and last_checkin_at for the given members
+    (or everyone) from their confirmed check-ins, in one grouped UPDATE
+    """
+    confirmed = CheckIn.objects.filter(
+        member=OuterRef('pk'), status='Confirmed'
+    ).order_by().values('member')
+
+    members = Member.objects.all()
+    if member_ids is not None:
+        members = members.filter(pk__in=member_ids)
+    return members.update(
+        attendance_all_time=Coalesce(
+            Subquery(confirmed.annotate(total=Count('id')).values('total')),
+            Value(0),
+        ),
+        last_checkin_at=Subquery(confirmed.annotate(last=Max('confirmed_at')).values('last')),
+    )
+
+
+def approve_checkins(queryset, staff_user):
+    """
+    Confirm every pending check-in in ``queryset``
+
+    Runs one UPDATE for the check-ins, one UPDATE for the affected members'
+    stats and one bulk INSERT for the audit trail, whatever the number of
+    rows. Like CheckIn.approve, it adds the newly confirmed check-ins to
+    each member's attendance_all_time rather than recounting it. Returns
+    the number of check-ins approved.
+    """
+    with transaction.atomic():
+        pending = list(
+            queryset.select_for_update()
+            .filter(status='Pending')
+            .order_by()
+            .values_list('id', 'member_id', 'requested_at')
+        )
+        if not pending:
+            return 0
+
+        checkin_ids = [checkin_id for checkin_id, _, _ in pending]
+        member_ids = {member_id for _, member_id, _ in pending}
+        now = timezone.now()
+
+        CheckIn.objects.filter(pk__in=checkin_ids).update(
+            status='Confirmed',
+            confirmed_at=now,
+            approved_by=staff_user,
+            updated_at=now,
+        )
+        added = Counter(member_id for _, member_id, _ in pending)
+        Member.objects.filter(pk__in=member_ids).update(
+            attendance_all_time=F('attendance_all_time') + Case(
+                *[When(pk=member_id, then=Value(count)) for member_id, count in added.items()],
+                default=Value(0),
+            ),
+            last_checkin_at=now,
+        )
+        record_attendance((member_id, requested_at) for _, member_id, requested_at in pending)
+
+        AuditLog.objects.bulk_create([
+            AuditLog(
+                action='Check-in Approved',
+                action_code='checkin_approved',
+                actor=staff_user,
+                member_id=member_id,
+                details={'checkin_id': str(checkin_id), 'bulk': True},
+            )
+            for checkin_id, member_id, _ in pending
+        ])
+
+    invalidate_staff_dashboard()
+    invalidate_member_summaries(member_ids)
+    invalidate_sections(member_ids, ['checkins'])
+    return len(pending)
+
+
+def staff_dashboard_counts():
+    """Pending members, pending check-ins and open goal requests, one query per table"""
+    return {
+        **Member.objects.aggregate(pending_members=Count('pk', filter=Q(status='Pending'))),
+        **CheckIn.objects.aggregate(pending_checkins=Count('pk', filter=Q(status='Pending'))),
+        **GoalRequest.objects.aggregate(open_goal_requests=Count('pk', filter=Q(status='Open'))),
+    }
+
+
+def staff_dashboard_data():
+    """
+    Counters and recent activity for the staff dashboard
+
+    Shared by every open dashboard for a few seconds, and dropped early
+    when a member, check-in or goal request changes.
+    """
+    def build():
+        # The live check-in feed picks up from here
+        generated_at = timezone.now()
+        data = staff_dashboard_counts()
+        data['generated_at'] = generated_at
+        data['recent_checkins'] = list(checkin_list(CheckIn.objects.all())[:10])
+        data['recent_members'] = list(
+            Member.objects.only('id', 'first_name', 'last_name', 'membership_tier', 'status', 'created_at')[:10]
+        )
+        return data
+
+    return caching.staff_dashboard.get_or_set(STAFF_DASHBOARD_CACHE_KEY, build, STAFF_DASHBOARD_CACHE_TIMEOUT)
+
+
+def invalidate_staff_dashboard():
+    caching.staff_dashboard.delete(STAFF_DASHBOARD_CACHE_KEY)
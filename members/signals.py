@@ -0,0 +1,139 @@
+"""
+Signal receivers for the members app
+"""
+from django.contrib.auth.models import Group
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .audit import audit_writer
+from .fragments import SECTION_FOR_MODEL, invalidate_sections
+from .models import User, Member, Document, CheckIn, Goal, GoalRequest, Note, SignedDocument
+from .live import broadcaster, checkin_event
+from .search import build_search_text, get_search_backend
+from .services import invalidate_staff_dashboard
+from .summary import invalidate_member_summaries, invalidate_member_summary
+
+
+@receiver(post_save, sender=Member)
+def index_member(sender, instance, update_fields=None, **kwargs):
+    """Keep the search index in step with the member's search text"""
+    if update_fields is None or 'search_text' in update_fields:
+        get_search_backend().index(instance)
+
+
+@receiver(post_delete, sender=Member)
+def unindex_member(sender, instance, **kwargs):
+    get_search_backend().remove(instance.id)
+
+
+@receiver(post_save, sender=User)
+def reindex_user_member(sender, instance, created, update_fields=None, **kwargs):
+    """Re-index the linked member when a user's email changes"""
+    if created or (update_fields is not None and 'email' not in update_fields):
+        return
+    member = Member.objects.filter(user=instance).first()
+    if member is None:
+        return
+    search_text = build_search_text(member, email=instance.email)
+    if search_text != member.search_text:
+        member.search_text = search_text
+        Member.objects.filter(pk=member.pk).update(search_text=search_text)
+        get_search_backend().index(member)
+
+
+@receiver(post_save, sender=Document)
+@receiver(post_delete, sender=Document)
+def invalidate_document_caches(sender, instance, **kwargs):
+    Document.invalidate_caches([Document.content_cache_key(instance.code, instance.version)])
+
+
+def _invalidate_roles_on_commit(user_ids):
+    # After commit, so a request in between cannot cache the old groups
+    # under the new version (revoked Staff access would then last an hour)
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: User.invalidate_roles(user_ids))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_user_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drop cached role sets when group membership changes from either side"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _invalidate_roles_on_commit([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        _invalidate_roles_on_commit(pk_set)
+    elif action == 'pre_clear':
+        _invalidate_roles_on_commit(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_group_roles(sender, instance, **kwargs):
+    """A renamed or deleted group changes the roles of everyone in it"""
+    if instance.pk:
+        _invalidate_roles_on_commit(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Member)
+@receiver(post_delete, sender=Member)
+@receiver(post_save, sender=CheckIn)
+@receiver(post_delete, sender=CheckIn)
+@receiver(post_save, sender=GoalRequest)
+@receiver(post_delete, sender=GoalRequest)
+def refresh_staff_dashboard(sender, **kwargs):
+    transaction.on_commit(invalidate_staff_dashboard)
+
+
+@receiver(post_save, sender=Member)
+@receiver(post_delete, sender=Member)
+def refresh_member_summary(sender, instance, **kwargs):
+    # After commit, so a dashboard load in between cannot re-cache the old rows
+    transaction.on_commit(lambda: invalidate_member_summary(instance))
+
+
+@receiver(post_save, sender=CheckIn)
+@receiver(post_delete, sender=CheckIn)
+@receiver(post_save, sender=Goal)
+@receiver(post_delete, sender=Goal)
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+@receiver(post_save, sender=SignedDocument)
+@receiver(post_delete, sender=SignedDocument)
+def refresh_owner_summary(sender, instance, **kwargs):
+    """A member's check-in, goal, note or signature changed"""
+    if sender.member.is_cached(instance):
+        member = instance.member
+        transaction.on_commit(lambda: invalidate_member_summary(member))
+    else:
+        member_id = instance.member_id
+        transaction.on_commit(lambda: invalidate_member_summaries([member_id]))
+
+
+@receiver(post_save, sender=CheckIn)
+@receiver(post_delete, sender=CheckIn)
+@receiver(post_save, sender=Goal)
+@receiver(post_delete, sender=Goal)
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+@receiver(post_save, sender=SignedDocument)
+@receiver(post_delete, sender=SignedDocument)
+def refresh_member_section(sender, instance, **kwargs):
+    """Re-render just the staff detail section this row appears in"""
+    member_id = instance.member_id
+    transaction.on_commit(lambda: invalidate_sections([member_id], [SECTION_FOR_MODEL[sender]]))
+
+
+@receiver(post_save, sender=CheckIn)
+def publish_checkin(sender, instance, **kwargs):
+    """Push the change to live staff pages in this process once it commits"""
+    if broadcaster.has_subscribers:
+        event = checkin_event(instance)
+        transaction.on_commit(lambda: broadcaster.publish(event))
+
+
+@receiver(request_finished)
+def flush_audit_log(sender, **kwargs):
+    """Write the request's buffered audit entries once the response is out"""
+    audit_writer.flush()
@@ -0,0 +1,119 @@
+"""
+Cached read model behind the member dashboard
+
+MemberSummary holds everything the dashboard shows for one member: the
+profile fields it displays, recent check-ins, active goals, recent
+student-visible notes and the ids of the documents signed. It is built
+lazily on the first dashboard load, cached per user (the dashboard knows
+the user before it knows the member) and dropped when the member or one
+of their check-ins, goals, notes or signatures changes. A warm dashboard
+is then one cache round trip for the summary and the required document
+ids, and no queries beyond the session and user.
+
+Code that changes those rows with QuerySet.update() or bulk_create()
+skips the signals and must call invalidate_member_summaries() itself.
+"""
+from collections import namedtuple
+
+from . import caching
+from .models import Member, Document, Goal, Note
+
+
+MEMBER_SUMMARY_CACHE_TIMEOUT = 24 * 60 * 60
+# Bump when MemberSummary changes shape, so old pickles are not read back
+MEMBER_SUMMARY_VERSION = 1
+RECENT_CHECKINS = 5
+RECENT_NOTES = 5
+
+CheckInRow = namedtuple('CheckInRow', 'type status requested_at')
+GoalRow = namedtuple('GoalRow', 'title status status_display target_date')
+NoteRow = namedtuple('NoteRow', 'category_display visibility content created_at')
+
+
+class MemberSummary:
+    """What the member dashboard shows, in plain values"""
+
+    PROFILE_FIELDS = ('id', 'first_name', 'last_name', 'membership_tier', 'status', 'attendance_all_time')
+
+    def __init__(self, profile, recent_checkins, active_goals, recent_notes, signed_document_ids):
+        for field in self.PROFILE_FIELDS:
+            setattr(self, field, profile[field])
+        self.recent_checkins = recent_checkins
+        self.active_goals = active_goals
+        self.recent_notes = recent_notes
+        self.signed_document_ids = signed_document_ids
+
+    def __repr__(self):
+        return f'<MemberSummary {self.first_name} {self.last_name}>'
+
+    @property
+    def full_name(self):
+        return f'{self.first_name} {self.last_name}'
+
+    def needs_documents(self, required_ids):
+        return not required_ids <= self.signed_document_ids
+
+    @classmethod
+    def build(cls, member):
+        """Read the summary for ``member`` from the database"""
+        goal_statuses = dict(Goal.STATUS_CHOICES)
+        note_categories = dict(Note.CATEGORY_CHOICES)
+        return cls(
+            profile={field: getattr(member, field) for field in cls.PROFILE_FIELDS},
+            recent_checkins=[
+                CheckInRow(*row)
+                for row in member.checkins.values_list('type', 'status', 'requested_at')[:RECENT_CHECKINS]
+            ],
+            active_goals=[
+                GoalRow(title, status, goal_statuses.get(status, status), target_date)
+                for title, status, target_date in member.goals.filter(
+                    status__in=['NotStarted', 'InProgress']
+                ).values_list('title', 'status', 'target_date')
+            ],
+            recent_notes=[
+                NoteRow(note_categories.get(category, category), visibility, content, created_at)
+                for category, visibility, content, created_at in member.notes.filter(
+                    visibility='StudentVisible'
+                ).values_list('category', 'visibility', 'content', 'created_at')[:RECENT_NOTES]
+            ],
+            signed_document_ids=frozenset(member.signed_documents.values_list('document_id', flat=True)),
+        )
+
+
+def summary_key(user_id):
+    return caching.member_summaries.key(user_id, MEMBER_SUMMARY_VERSION)
+
+
+def get_member_summary(user):
+    """
+    (summary, needs_documents) for ``user``'s member profile, or
+    (None, False) when the user has no profile
+    """
+    key = summary_key(user.pk)
+    summary, required = caching.get_many(
+        (caching.member_summaries, key),
+        (caching.required_documents, Document.REQUIRED_IDS_CACHE_KEY),
+    )
+    if summary is None:
+        member = Member.objects.filter(user_id=user.pk).first()
+        if member is None:
+            return None, False
+        summary = MemberSummary.build(member)
+        caching.member_summaries.set(key, summary, MEMBER_SUMMARY_CACHE_TIMEOUT)
+    if required is None:
+        required = Document.required_ids()
+    return summary, summary.needs_documents(required)
+
+
+def invalidate_member_summary(member):
+    """Drop the cached summary of a Member instance"""
+    if member.user_id:
+        caching.member_summaries.delete(summary_key(member.user_id))
+
+
+def invalidate_member_summaries(member_ids):
+    """Drop the cached summaries of these members, looking up their users in one query"""
+    user_ids = Member.objects.filter(pk__in=list(member_ids), user__isnull=False).values_list('user_id', flat=True)
+    keys = [summary_key(user_id) for user_id in user_ids]
+    if keys:
+        caching.member_summaries.delete_many(keys)
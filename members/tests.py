@@ -1,3 +1,1668 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import json
+import os
+import re
+import runpy
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta, timezone as dt_timezone
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib import admin
+from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.models import Group
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.forms.renderers import get_default_renderer
+from django.db import OperationalError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ranch_portal import profiling, runtime
+from ranch_portal.caches import parse_cache_url
+from ranch_portal.templating import template_names, warm_templates
+from ranch_portal.testing import TEST_CACHES
+
+from . import archive, caching
+from .attendance import expire_attendance, rebuild_attendance
+from .audit import AuditWriter, audit_writer
+from . import forms as member_forms
+from .exports import export_lines
+from .fragments import SECTION_LIMIT
+from .imports import MemberImporter
+from .management.commands.explain_queries import find_seq_scans, view_queries
+from .management.commands.loadtest import parse_config as parse_loadtest_config
+from .merge import MergeError, find_duplicate_candidates, merge_members
+from .search import get_search_backend
+from .live import BATCH_SIZE as FEED_BATCH_SIZE, Cursor, broadcaster
+from .models import (
+    User, Member, Document, DocumentSnapshot, SignedDocument,
+    CheckIn, Goal, GoalRequest, Note, AuditLog, DailyAttendance
+)
+from .services import approve_checkins, staff_dashboard_counts
+from .summary import summary_key
+
+
+# The manifest storage used in production needs collectstatic to have run
+plain_static = override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'
+)
+
+
+def make_user(email, **kwargs):
+    return User.objects.create_user(username=email, email=email, **kwargs)
+
+
+def make_staff(email='staff@example.com'):
+    user = make_user(email)
+    user.groups.add(Group.objects.get_or_create(name='Staff')[0])
+    return user
+
+
+def make_members(count, start=0):
+    for i in range(start, start + count):
+        user = make_user(f'rider{i}@example.com')
+        Member.objects.create(user=user, first_name='Rider', last_name=str(i), phone=f'555-{i:04d}')
+
+
+@plain_static
+class StaffMemberDirectoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(make_staff())
+        self.url = reverse('staff_members')
+        Document.objects.create(code='WAIVER', name='Waiver', content='...')
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_roster(self):
+        make_members(5)
+        small = self.count_queries(self.url)
+        make_members(120, start=5)
+        large = self.count_queries(self.url)
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 10)
+
+    def test_cursor_walks_every_member_once(self):
+        make_members(120)
+        seen = []
+        url = self.url
+        while url:
+            response = self.client.get(url)
+            seen.extend(m.id for m in response.context['members'])
+            next_query = response.context['next_query']
+            url = f'{self.url}?{next_query}' if next_query else None
+        self.assertEqual(len(seen), 120)
+        self.assertEqual(len(set(seen)), 120)
+        self.assertEqual(response.context['total'], 120)
+
+    def test_total_count_is_cached(self):
+        make_members(3)
+        self.client.get(self.url)
+        make_members(2, start=3)
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['total'], 3)
+
+
+class QueryPlanTests(TestCase):
+    def test_explain_queries_command(self):
+        out = StringIO()
+        call_command('explain_queries', '--verbose-plans', stdout=out)
+        self.assertIn(f'Database vendor: {connection.vendor}', out.getvalue())
+        for name in view_queries():
+            self.assertIn(name, out.getvalue())
+
+    def test_seq_scan_detection(self):
+        self.assertEqual(find_seq_scans('Seq Scan on checkins  (cost=0.00..1.01 rows=1)'), ['checkins'])
+        self.assertEqual(find_seq_scans('SCAN members'), ['members'])
+        self.assertEqual(find_seq_scans('SCAN checkins USING INDEX checkins_status_req_idx'), [])
+        self.assertEqual(find_seq_scans('SEARCH checkins USING INDEX checkins_member_req_idx (member_id=?)'), [])
+
+    def test_checkin_member_has_one_index(self):
+        # checkins_member_req_idx leads with member_id, so a separate FK index would be dead weight
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, CheckIn._meta.db_table)
+        member_indexes = [
+            name for name, info in constraints.items()
+            if info['index'] and info['columns'] and info['columns'][0] == 'member_id'
+        ]
+        self.assertEqual(member_indexes, ['checkins_member_req_idx'])
+
+
+class RequiredDocumentsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.waiver = Document.objects.create(code='WAIVER', name='Waiver', content='...')
+        self.lessons = Document.objects.create(code='LESSONS', name='Lessons', content='...')
+        self.member = Member.objects.create(user=make_user('rider@example.com'), first_name='Rider', last_name='One')
+
+    def sign(self, member, document):
+        SignedDocument.objects.create(
+            document=document, member=member, user=member.user,
+            signed_name=member.full_name, snapshot=DocumentSnapshot.store(document.content)
+        )
+
+    def test_single_member_check_is_one_query_when_warm(self):
+        Document.required_ids()
+        self.sign(self.member, self.waiver)
+        with self.assertNumQueries(1):
+            self.assertFalse(self.member.has_signed_all_required_documents())
+        self.sign(self.member, self.lessons)
+        self.assertTrue(self.member.has_signed_all_required_documents())
+
+    def test_document_changes_invalidate_cache(self):
+        self.sign(self.member, self.waiver)
+        self.assertFalse(self.member.has_signed_all_required_documents())
+        self.lessons.is_required = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lessons.save()
+        self.assertTrue(self.member.has_signed_all_required_documents())
+        with self.captureOnCommitCallbacks(execute=True):
+            Document.objects.create(code='TACK', name='Tack Policy', content='...')
+        self.assertFalse(self.member.has_signed_all_required_documents())
+
+    def test_bulk_updates_invalidate_cache(self):
+        self.sign(self.member, self.waiver)
+        self.assertFalse(self.member.has_signed_all_required_documents())
+        with self.captureOnCommitCallbacks(execute=True):
+            Document.objects.filter(pk=self.lessons.pk).update(is_active=False)
+        self.assertTrue(self.member.has_signed_all_required_documents())
+
+        self.assertEqual(self.waiver.get_cached_content(), self.waiver.content)
+        with self.captureOnCommitCallbacks(execute=True):
+            Document.objects.filter(pk=self.waiver.pk).update(content='Revised waiver')
+        self.assertEqual(Document.objects.get(pk=self.waiver.pk).get_cached_content(), 'Revised waiver')
+
+    def test_batched_check(self):
+        other = Member.objects.create(user=make_user('other@example.com'), first_name='Other', last_name='Rider')
+        self.sign(self.member, self.waiver)
+        self.sign(self.member, self.lessons)
+        self.sign(other, self.waiver)
+        Document.required_ids()
+        with self.assertNumQueries(1):
+            complete = Member.ids_with_all_required_documents([self.member.id, other.id])
+        self.assertEqual(complete, {self.member.id})
+
+
+@plain_static
+class SignDocumentsWizardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.waiver = Document.objects.create(code='WAIVER', name='Waiver', content='Waiver text ' * 500)
+        self.lessons = Document.objects.create(code='LESSONS', name='Lessons', content='Lesson terms')
+        self.member = Member.objects.create(user=make_user('rider@example.com'), first_name='Rider', last_name='One')
+        self.client.force_login(self.member.user)
+        self.url = reverse('sign_documents')
+        self.signature = {'signed_name': 'Rider One', 'agree': 'on'}
+
+    def test_wizard_query_counts(self):
+        # Warm the document caches as any earlier signer would have
+        Document.required_ids()
+        for document in (self.lessons, self.waiver):
+            DocumentSnapshot.store(document.get_cached_content())
+        self.member.user.roles
+        for document in (self.lessons, self.waiver):
+            with self.assertNumQueries(4):
+                response = self.client.get(self.url)
+            self.assertEqual(response.context['document'], document)
+            # Includes the snapshot lookup and the savepoint pair around the
+            # signature and its audit entry
+            with self.assertNumQueries(9):
+                self.client.post(self.url, self.signature)
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+    def test_snapshot_is_exact_document_text(self):
+        self.client.post(self.url, self.signature)
+        self.client.post(self.url, self.signature)
+        for document in (self.waiver, self.lessons):
+            signed = SignedDocument.objects.get(member=self.member, document=document)
+            self.assertEqual(signed.document_snapshot, document.content)
+            self.assertEqual(signed.snapshot_id, DocumentSnapshot.digest(document.content))
+
+    def test_edited_content_is_not_served_stale(self):
+        self.client.get(self.url)
+        self.lessons.content = 'Revised lesson terms'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lessons.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Revised lesson terms')
+
+
+class DocumentSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_identical_text_is_stored_once(self):
+        first = DocumentSnapshot.store('Waiver text')
+        second = DocumentSnapshot.store('Waiver text')
+        DocumentSnapshot.store('Other text')
+        self.assertEqual(first.sha256, second.sha256)
+        self.assertEqual(DocumentSnapshot.objects.count(), 2)
+
+    def test_store_returns_the_saved_row(self):
+        DocumentSnapshot.store('Waiver text')
+        with self.assertNumQueries(1):
+            snapshot = DocumentSnapshot.store('Waiver text')
+        self.assertFalse(snapshot._state.adding)
+        self.assertIsNotNone(snapshot.created_at)
+
+    def test_verify_command_detects_tampering(self):
+        snapshot = DocumentSnapshot.store('Waiver text')
+        call_command('verify_snapshots', stdout=StringIO())
+        DocumentSnapshot.objects.filter(pk=snapshot.pk).update(content='Edited waiver text')
+        with self.assertRaises(CommandError):
+            call_command('verify_snapshots', stdout=StringIO())
+
+
+@plain_static
+class ListProjectionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = make_staff()
+        self.member = Member.objects.create(user=make_user('rider@example.com'), first_name='Rider', last_name='One')
+        document = Document.objects.create(code='WAIVER', name='Waiver', content='Waiver text ' * 500)
+        SignedDocument.objects.create(
+            document=document, member=self.member, user=self.member.user, signed_name='Rider One',
+            user_agent='Mozilla/5.0 ' * 20, snapshot=DocumentSnapshot.store(document.content)
+        )
+        CheckIn.objects.create(member=self.member, created_by=self.member.user, instructor=self.staff)
+        AuditLog.log('Member Registration', actor=self.member.user, member=self.member, details={'x': 1}, strict=True)
+
+    def test_list_pages_skip_heavy_columns(self):
+        self.client.force_login(self.staff)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('staff_member_detail', args=[self.member.id]))
+            self.client.get(reverse('staff_checkins'))
+        sql = ' '.join(q['sql'] for q in ctx.captured_queries)
+        for column in ('user_agent', '"documents"."content"', 'search_text', 'snapshot_sha256'):
+            self.assertNotIn(column, sql)
+
+    def test_admin_changelists_render(self):
+        self.client.force_login(make_user('admin@example.com', is_staff=True, is_superuser=True))
+        for model in ('member', 'document', 'signeddocument', 'note', 'auditlog', 'goal', 'goalrequest', 'goalupdate'):
+            response = self.client.get(reverse(f'admin:members_{model}_changelist'))
+            self.assertEqual(response.status_code, 200, model)
+
+    def test_admin_defers_only_on_the_changelist(self):
+        self.client.force_login(make_user('admin@example.com', is_staff=True, is_superuser=True))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('admin:members_member_changelist'))
+        self.assertNotIn('search_text', ' '.join(q['sql'] for q in ctx.captured_queries))
+        # The admin's own queryset, used by its other views, loads whole rows
+        model_admin = admin.site._registry[Member]
+        self.assertEqual(model_admin.get_queryset(self.client.get('/').wsgi_request).query.deferred_loading[0], set())
+
+    def test_benchmark_command_runs(self):
+        out = StringIO()
+        call_command('benchmark_projections', stdout=out)
+        self.assertIn('staff_checkins', out.getvalue())
+
+
+@plain_static
+class MemberDetailSectionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = make_staff()
+        self.client.force_login(self.staff)
+        self.member = Member.objects.create(user=make_user('rider@example.com'), first_name='Rider', last_name='One')
+        CheckIn.objects.bulk_create([
+            CheckIn(member=self.member, created_by=self.member.user, instructor=self.staff,
+                    requested_at=timezone.now() - timedelta(days=day), student_note=f'visit {day}')
+            for day in range(SECTION_LIMIT + 5)
+        ])
+        self.url = reverse('staff_member_detail', args=[self.member.id])
+
+    def section_url(self, section):
+        return reverse('staff_member_section', args=[self.member.id, section])
+
+    def test_sections_are_capped_with_show_all(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, 'visit 0')
+        self.assertNotContains(response, f'visit {SECTION_LIMIT}<')
+        self.assertContains(response, self.section_url('checkins'))
+        self.assertNotContains(response, self.section_url('notes'))
+
+        response = self.client.get(self.section_url('checkins'))
+        self.assertContains(response, f'visit {SECTION_LIMIT + 4}<')
+        self.assertNotContains(response, '<html')
+
+    def test_warm_page_renders_from_cache(self):
+        self.client.get(self.url)
+        # Session, user, member; role lookups and all four sections are cached
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+
+    def test_change_rerenders_only_its_section(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Note.objects.create(member=self.member, author=self.staff, category='Safety', visibility='StaffOnly', content='Check girth')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Check girth')
+        tables = ' '.join(query['sql'] for query in ctx.captured_queries)
+        self.assertIn('"notes"', tables)
+        self.assertNotIn('"checkins"', tables)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            approve_checkins(self.member.checkins.all(), self.staff)
+        self.assertContains(self.client.get(self.url), 'badge-confirmed')
+
+    def test_section_endpoint_checks(self):
+        self.assertEqual(self.client.get(reverse('staff_member_section', args=[self.member.id, 'secrets'])).status_code, 404)
+        self.client.force_login(self.member.user)
+        self.assertEqual(self.client.get(self.section_url('checkins')).status_code, 302)
+
+
+@plain_static
+class RoleResolutionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = make_staff()
+        self.client.force_login(self.staff)
+
+    def group_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [q for q in ctx.captured_queries if 'auth_group' in q['sql']]
+
+    def test_staff_page_makes_no_group_queries_after_the_first(self):
+        url = reverse('staff_checkins')
+        self.assertEqual(len(self.group_queries(url)), 1)
+        self.assertEqual(self.group_queries(url), [])
+        self.assertEqual(self.group_queries(reverse('staff_dashboard')), [])
+
+    def test_membership_changes_invalidate_roles(self):
+        self.assertTrue(User.objects.get(pk=self.staff.pk).is_staff_user)
+        admin_group = Group.objects.create(name='Admin')
+        with self.captureOnCommitCallbacks(execute=True):
+            admin_group.user_set.add(self.staff)
+        self.assertTrue(User.objects.get(pk=self.staff.pk).is_admin_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.staff.groups.clear()
+            # Not before commit: a request in between would re-cache the old groups under the new version
+            self.assertTrue(User.objects.get(pk=self.staff.pk).is_staff_user)
+        user = User.objects.get(pk=self.staff.pk)
+        self.assertFalse(user.is_staff_user)
+        self.assertFalse(user.is_admin_user)
+        self.assertEqual(self.client.get(reverse('staff_checkins')).status_code, 302)
+
+    def test_group_rename_invalidates_roles(self):
+        Group.objects.filter(name='Staff').get().user_set.add(self.staff)
+        self.assertTrue(User.objects.get(pk=self.staff.pk).is_staff_user)
+        group = Group.objects.get(name='Staff')
+        group.name = 'Volunteers'
+        with self.captureOnCommitCallbacks(execute=True):
+            group.save()
+        self.assertFalse(User.objects.get(pk=self.staff.pk).is_staff_user)
+
+
+@plain_static
+class MemberDashboardSummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('rider@example.com')
+        self.member = Member.objects.create(user=self.user, first_name='Ava', last_name='Stone', status='Approved')
+        self.staff = make_staff()
+        self.waiver = Document.objects.create(code='WAIVER', name='Waiver', content='...')
+        self.client.force_login(self.user)
+        self.url = reverse('dashboard')
+
+    def change(self, fn):
+        """Run ``fn`` as its own committed change, so the summary is dropped"""
+        with self.captureOnCommitCallbacks(execute=True):
+            return fn()
+
+    def test_warm_dashboard_is_session_and_user_only(self):
+        self.change(lambda: Goal.objects.create(member=self.member, created_by=self.staff, title='Canter'))
+        self.client.get(self.url)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Welcome, Ava!')
+        self.assertContains(response, 'Canter')
+        self.assertContains(response, 'Action Required')
+        self.assertEqual(response.context['member'].active_goals[0].status_display, 'Not Started')
+
+    def test_changes_drop_the_summary(self):
+        self.client.get(self.url)
+        key = summary_key(self.user.pk)
+        self.assertIsNotNone(cache.get(key))
+
+        checkin = self.change(lambda: CheckIn.objects.create(member=self.member, created_by=self.user))
+        self.assertIsNone(cache.get(key))
+        self.assertContains(self.client.get(self.url), 'badge-pending')
+
+        self.change(lambda: approve_checkins(CheckIn.objects.filter(pk=checkin.pk), self.staff))
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['member'].attendance_all_time, 1)
+        self.assertContains(response, 'badge-confirmed')
+
+        self.change(lambda: Note.objects.create(
+            member=self.member, author=self.staff, category='Safety', visibility='StudentVisible', content='Helmet on',
+        ))
+        self.assertContains(self.client.get(self.url), 'Helmet on')
+
+        self.change(lambda: SignedDocument.objects.create(
+            document=self.waiver, member=self.member, user=self.user, signed_name='Ava Stone',
+            snapshot=DocumentSnapshot.store(self.waiver.content),
+        ))
+        self.assertNotContains(self.client.get(self.url), 'Action Required')
+
+        # A newly required document applies without touching any summary
+        self.change(lambda: Document.objects.create(code='PHOTO', name='Photo Release', content='...'))
+        self.assertContains(self.client.get(self.url), 'Action Required')
+
+    def test_other_members_are_untouched(self):
+        other = Member.objects.create(user=make_user('other@example.com'), first_name='Ben', last_name='Cole')
+        self.client.get(self.url)
+        self.change(lambda: CheckIn.objects.create(member=other, created_by=other.user))
+        self.assertIsNotNone(cache.get(summary_key(self.user.pk)))
+
+    def test_user_without_profile(self):
+        self.client.force_login(make_user('admin@example.com', is_staff=True))
+        self.assertRedirects(self.client.get(self.url), '/admin/', fetch_redirect_response=False)
+
+
+@plain_static
+class StaffDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = make_staff()
+        self.client.force_login(self.staff)
+        self.member = Member.objects.create(user=make_user('rider@example.com'), first_name='Rider', last_name='One')
+        Member.objects.create(first_name='Approved', last_name='Rider', status='Approved')
+        CheckIn.objects.create(member=self.member, created_by=self.member.user)
+        CheckIn.objects.create(member=self.member, created_by=self.member.user, status='Confirmed')
+        GoalRequest.objects.create(member=self.member, submitted_by=self.member.user, content='Canter')
+
+    def test_counts_in_one_query_per_table(self):
+        with self.assertNumQueries(3):
+            counts = staff_dashboard_counts()
+        self.assertEqual(counts, {'pending_members': 1, 'pending_checkins': 1, 'open_goal_requests': 1})
+
+    def test_counts_with_empty_tables(self):
+        Member.objects.all().delete()
+        self.assertEqual(
+            staff_dashboard_counts(),
+            {'pending_members': 0, 'pending_checkins': 0, 'open_goal_requests': 0}
+        )
+
+    def test_repeat_views_are_served_from_cache(self):
+        url = reverse('staff_dashboard')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        tables = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('"checkins"', tables)
+        self.assertNotIn('"members"', tables)
+
+    def test_status_change_invalidates(self):
+        url = reverse('staff_dashboard')
+        self.assertEqual(self.client.get(url).context['pending_checkins'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            CheckIn.objects.create(member=self.member, created_by=self.member.user)
+        self.assertEqual(self.client.get(url).context['pending_checkins'], 2)
+        approve_checkins(CheckIn.objects.all(), self.staff)
+        self.assertEqual(self.client.get(url).context['pending_checkins'], 0)
+
+
+class CacheConfigTests(TestCase):
+    def test_redis_url(self):
+        config = parse_cache_url('redis://cache.internal:6379/1', key_prefix='ranch_portal')
+        self.assertEqual(config['BACKEND'], 'django.core.cache.backends.redis.RedisCache')
+        self.assertEqual(config['LOCATION'], 'redis://cache.internal:6379/1')
+        self.assertEqual(config['KEY_PREFIX'], 'ranch_portal')
+
+    def test_fallback_urls(self):
+        self.assertEqual(parse_cache_url('db://')['LOCATION'], 'portal_cache')
+        self.assertEqual(parse_cache_url('db://shared_cache')['LOCATION'], 'shared_cache')
+        self.assertEqual(parse_cache_url('file:///var/tmp/portal')['LOCATION'], '/var/tmp/portal')
+        self.assertEqual(
+            parse_cache_url('locmem://tests')['BACKEND'],
+            'django.core.cache.backends.locmem.LocMemCache'
+        )
+
+    def test_unknown_scheme(self):
+        with self.assertRaises(ValueError):
+            parse_cache_url('memcached://localhost:11211')
+
+    def test_tests_never_share_a_cache(self):
+        # setUp clears the cache; that must not reach a developer's or a shared one
+        self.assertEqual(settings.CACHES, TEST_CACHES)
+        self.assertIsInstance(caches['default'], LocMemCache)
+
+
+@plain_static
+@override_settings(CACHES={'default': parse_cache_url('locmem://cache-stats')})
+class CacheStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caching.reset_stats()
+
+    def stats_for(self, namespace):
+        return next(row for row in caching.cache_stats() if row['namespace'] == namespace)
+
+    def test_keys_are_namespaced(self):
+        self.assertEqual(caching.roles.key('abc', 3), 'members:roles:abc:3')
+        self.assertEqual(caching.staff_dashboard.key(), 'members:staff_dashboard')
+
+    def test_hits_and_misses_per_namespace(self):
+        key = caching.document_content.key('WAIVER', 1)
+        self.assertEqual(caching.document_content.get_or_set(key, lambda: 'text', 60), 'text')
+        self.assertEqual(caching.document_content.get_or_set(key, lambda: 'other', 60), 'text')
+        self.assertEqual(caching.document_content.get(key), 'text')
+        row = self.stats_for('document_content')
+        self.assertEqual((row['hits'], row['misses']), (2, 1))
+        self.assertAlmostEqual(row['hit_rate'], 2 / 3)
+        self.assertIsNone(self.stats_for('roles')['hit_rate'])
+
+    def test_counts_are_flushed_to_the_shared_cache(self):
+        key = caching.directory_count.key('all')
+        for _ in range(caching.FLUSH_EVERY):
+            caching.directory_count.get(key)
+        # Flushed without a stats read, so other workers would see them
+        self.assertEqual(cache.get(caching.make_key('cache_stats', 'directory_count', 'misses')), caching.FLUSH_EVERY)
+
+    def test_admin_page(self):
+        admin_user = make_user('admin@example.com', is_staff=True, is_superuser=True)
+        self.client.force_login(admin_user)
+        Document.required_ids()
+        Document.required_ids()
+        response = self.client.get(reverse('admin_cache_stats'))
+        self.assertContains(response, 'members:required_document_ids')
+        self.assertContains(response, '50%')
+
+        response = self.client.post(reverse('admin_cache_stats'))
+        self.assertRedirects(response, reverse('admin_cache_stats'))
+        self.assertEqual(self.stats_for('required_document_ids')['lookups'], 0)
+
+    def test_admin_page_requires_staff(self):
+        self.client.force_login(make_user('rider@example.com'))
+        response = self.client.get(reverse('admin_cache_stats'))
+        self.assertEqual(response.status_code, 302)
+
+
+def parse_events(body):
+    """Data payloads of the checkin events in a text/event-stream body"""
+    return [
+        json.loads(line[len('data: '):])
+        for line in body.splitlines() if line.startswith('data: ')
+    ]
+
+
+
+def event_ids(body):
+    """The id lines of a text/event-stream body"""
+    return [line[len('id: '):] for line in body.splitlines() if line.startswith('id: ')]
+
+@plain_static
+@override_settings(REQUEST_PROFILING_SAMPLE_RATE=1.0)
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        profiling.samples.clear()
+        profiling.totals.clear()
+        self.addCleanup(profiling.samples.clear)
+        self.addCleanup(profiling.totals.clear)
+
+    def sample(self, view, duration, queries=1, duplicates=0):
+        return profiling.Sample(view, 'GET', 200, duration, queries, duration / 2, duration / 4, duplicates, '')
+
+    def test_records_staff_page(self):
+        make_members(5)
+        self.client.force_login(make_staff())
+        self.client.get(reverse('staff_members'))
+        sample = profiling.samples.snapshot()[-1]
+        self.assertEqual((sample.view, sample.status), ('staff_members', 200))
+        self.assertGreater(sample.queries, 0)
+        self.assertGreater(sample.template_time, 0)
+        self.assertLessEqual(sample.sql_time, sample.duration)
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=0)
+    def test_sampling_off(self):
+        self.client.get(reverse('home'))
+        self.assertEqual(len(profiling.samples), 0)
+
+    def test_repeated_queries_are_fingerprinted(self):
+        profile = profiling.RequestProfile()
+        for member_id in (1, 2, 3):
+            profile(lambda *args: None, 'SELECT email FROM users WHERE id = %s', [member_id], False, {})
+        profile(lambda *args: None, 'SELECT * FROM members WHERE id IN (%s, %s)', [1, 2], False, {})
+        self.assertEqual(profile.queries, 4)
+        self.assertEqual(profile.duplicates(), (2, '3x SELECT email FROM users WHERE id = %s'))
+        self.assertEqual(
+            profiling.fingerprint("SELECT 1 FROM t WHERE a IN (%s, %s, %s) AND b = 'x'"),
+            profiling.fingerprint("SELECT 2 FROM t WHERE a IN (%s) AND b = 'y'"),
+        )
+
+    def test_percentiles_and_prometheus_text(self):
+        rows = profiling.summarize(
+            [self.sample('staff_members', ms / 1000) for ms in range(1, 101)] + [self.sample('home', 0.001)]
+        )
+        self.assertEqual([row['view'] for row in rows], ['staff_members', 'home'])
+        latency = rows[0]['duration']
+        self.assertEqual((latency['p50'], latency['p95'], latency['p99']), (0.051, 0.096, 0.1))
+
+        view_totals = {
+            'staff_members': {'count': 250, 'duration': 12.5, 'queries': 250, 'sql_time': 6, 'template_time': 3, 'duplicate_queries': 0},
+            'home': {'count': 1, 'duration': 0.001, 'queries': 1, 'sql_time': 0, 'template_time': 0, 'duplicate_queries': 0},
+            # Seen earlier in this worker's life, but no longer in the buffer
+            'login': {'count': 7, 'duration': 0.2, 'queries': 7, 'sql_time': 0.1, 'template_time': 0, 'duplicate_queries': 0},
+        }
+        text = profiling.prometheus_text(rows, view_totals, pid=42)
+        self.assertIn('# TYPE portal_request_duration_seconds summary', text)
+        self.assertIn('portal_request_duration_seconds{view="staff_members",pid="42",quantile="0.95"} 0.096', text)
+        # _count and _sum are the running totals, not the buffer's
+        self.assertIn('portal_request_duration_seconds_count{view="staff_members",pid="42"} 250', text)
+        self.assertIn('portal_request_queries_count{view="home",pid="42"} 1', text)
+        self.assertIn('portal_request_duration_seconds_sum{view="login",pid="42"} 0.2', text)
+        self.assertNotIn('view="login",pid="42",quantile', text)
+
+    def test_totals_outlive_the_buffer(self):
+        buffer = profiling.SampleBuffer(size=2)
+        view_totals = profiling.ViewTotals()
+        for ms in (10, 20, 30):
+            sample = self.sample('home', ms / 1000)
+            buffer.add(sample)
+            view_totals.add(sample)
+        self.assertEqual(len(buffer), 2)
+        self.assertEqual(view_totals.snapshot()['home']['count'], 3)
+        self.assertAlmostEqual(view_totals.snapshot()['home']['duration'], 0.06)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_endpoints_are_staff_only(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual((response.status_code, response['Content-Type'][:10]), (200, 'text/plain'))
+        self.assertEqual(self.client.get(reverse('admin_profiling')).status_code, 302)
+
+        self.client.force_login(make_user('admin@example.com', is_staff=True, is_superuser=True))
+        self.client.get(reverse('home'))
+        self.assertContains(self.client.get(reverse('admin_profiling')), '<code>home</code>')
+        self.assertContains(self.client.get(reverse('metrics')), f'portal_request_duration_seconds{{view="home",pid="{os.getpid()}"')
+
+
+class RuntimeProfileTests(TestCase):
+    def test_worker_count_from_cpus_and_memory(self):
+        gigabyte = 1024 ** 3
+        self.assertEqual(runtime.worker_count('sync', cpus=2, memory=8 * gigabyte), 5)
+        self.assertEqual(runtime.worker_count('gthread', cpus=2, memory=8 * gigabyte), 3)
+        # 512 MB fits two 160 MB workers beside the master
+        self.assertEqual(runtime.worker_count('sync', cpus=4, memory=512 * 1024 ** 2), 2)
+        self.assertEqual(runtime.worker_count('sync', cpus=1, memory=100 * 1024 ** 2), 1)
+
+    def test_server_profile(self):
+        self.assertEqual(
+            runtime.server_profile('sync', cpus=2, memory=0),
+            {'worker_class': 'sync', 'workers': 5, 'threads': 1, 'app': 'ranch_portal.wsgi:application'},
+        )
+        self.assertEqual(
+            runtime.server_profile('uvicorn', cpus=2, memory=0),
+            {
+                'worker_class': 'uvicorn.workers.UvicornWorker', 'workers': 3, 'threads': 1,
+                'app': 'ranch_portal.asgi:application',
+            },
+        )
+        self.assertEqual(runtime.server_profile('gthread', workers=2, threads=8)['workers'], 2)
+        with self.assertRaises(ValueError):
+            runtime.server_profile('eventlet')
+
+    def test_gunicorn_config_reads_environment(self):
+        path = str(Path(__file__).resolve().parent.parent / 'gunicorn.conf.py')
+        env = {'GUNICORN_WORKER_CLASS': 'sync', 'WEB_CONCURRENCY': '3', 'GUNICORN_MAX_REQUESTS': '50'}
+        with mock.patch.dict(os.environ, env):
+            conf = runpy.run_path(path)
+        self.assertEqual((conf['worker_class'], conf['workers'], conf['threads']), ('sync', 3, 1))
+        self.assertEqual(conf['wsgi_app'], 'ranch_portal.wsgi:application')
+        self.assertEqual(conf['max_requests'], 50)
+        self.assertTrue(conf['preload_app'])
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_worker_stats_in_metrics(self):
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertNotContains(response, 'portal_worker_requests_total')
+
+        runtime.worker_stats.start('gthread', 4, 1000)
+        self.addCleanup(setattr, runtime.worker_stats, 'active', False)
+        runtime.worker_stats.request_finished(runtime.worker_stats.request_started(), 200)
+        runtime.worker_stats.request_finished(runtime.worker_stats.request_started(), 502)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+        labels = f'pid="{os.getpid()}",worker_class="gthread"'
+        self.assertContains(response, f'portal_worker_requests_total{{{labels}}} 2')
+        self.assertContains(response, f'portal_worker_errors_total{{{labels}}} 1')
+        self.assertContains(response, f'portal_worker_threads{{{labels}}} 4')
+
+    def test_load_test_configurations(self):
+        self.assertEqual(
+            parse_loadtest_config('gthread:WEB_CONCURRENCY=2, GUNICORN_THREADS=8'),
+            ('gthread:WEB_CONCURRENCY=2, GUNICORN_THREADS=8',
+             {'GUNICORN_WORKER_CLASS': 'gthread', 'WEB_CONCURRENCY': '2', 'GUNICORN_THREADS': '8'}),
+        )
+        with self.assertRaises(CommandError):
+            parse_loadtest_config('meinheld')
+        with self.assertRaises(CommandError):
+            parse_loadtest_config('sync:WEB_CONCURRENCY')
+
+
+@plain_static
+class TemplateModeTests(TestCase):
+    def setUp(self):
+        member_forms._rendered_fields.clear()
+        self.addCleanup(member_forms._rendered_fields.clear)
+
+    @override_settings(TEMPLATE_CACHE=True)
+    def test_unbound_form_fields_are_memoized(self):
+        expected = str(member_forms.RegistrationForm(renderer=get_default_renderer())['email'])
+        self.assertFalse(member_forms._rendered_fields)
+        html = str(member_forms.RegistrationForm()['email'])
+        self.assertEqual(html, expected)
+        self.assertIn('placeholder="Email"', html)
+        self.assertTrue(member_forms._rendered_fields)
+
+        cached = len(member_forms._rendered_fields)
+        self.assertEqual(str(member_forms.RegistrationForm()['email']), html)
+        self.assertEqual(len(member_forms._rendered_fields), cached)
+
+        bound = member_forms.RegistrationForm({'email': 'ava@example.com'})
+        self.assertIn('value="ava@example.com"', str(bound['email']))
+        self.assertEqual(len(member_forms._rendered_fields), cached)
+
+    def test_templates_use_the_cached_loader_in_every_mode(self):
+        self.assertIsInstance(engines['django'].engine.template_loaders[0], CachedLoader)
+
+    def test_memo_is_off_outside_template_mode(self):
+        str(member_forms.CheckInForm()['type'])
+        self.assertFalse(member_forms._rendered_fields)
+
+    def test_warm_up_compiles_every_template(self):
+        names = template_names()
+        self.assertIn('base.html', names)
+        self.assertIn('staff/member_sections/checkins.html', names)
+        with override_settings(TEMPLATE_CACHE=True), self.assertNoLogs('ranch_portal.templating', 'ERROR'):
+            self.assertEqual(warm_templates(), len(names))
+        self.assertTrue(member_forms._rendered_fields)
+
+    def test_pages_render_the_same_in_template_mode(self):
+        plain = self.client.get(reverse('register')).content
+        with override_settings(TEMPLATE_CACHE=True):
+            self.client.get(reverse('register'))
+            memoized = self.client.get(reverse('register')).content
+        strip_csrf = lambda html: re.sub(rb'name="csrfmiddlewaretoken" value="[^"]+"', b'', html)
+        self.assertEqual(strip_csrf(memoized), strip_csrf(plain))
+
+    def test_benchmark_command_runs(self):
+        out = StringIO()
+        call_command('benchmark_templates', iterations=1, stdout=out)
+        self.assertIn('register', out.getvalue())
+
+
+class FormStylingTests(TestCase):
+    def test_styles_are_applied_to_the_class(self):
+        email = member_forms.RegistrationForm.base_fields['email'].widget
+        self.assertEqual(email.attrs['class'], 'form-control')
+        self.assertEqual(email.attrs['placeholder'], 'Email')
+        self.assertEqual(member_forms.RegistrationForm.base_fields['membership_tier'].widget.attrs['class'], 'form-select')
+        self.assertEqual(member_forms.SignDocumentForm.base_fields['agree'].widget.attrs['class'], 'form-check-input')
+        self.assertEqual(member_forms.NoteForm.base_fields['content'].widget.attrs['rows'], 4)
+
+        form = member_forms.RegistrationForm()
+        self.assertIsNot(form.fields['email'].widget, email)
+        self.assertIn('placeholder="Email"', str(form['email']))
+
+    def test_inherited_fields_are_not_styled_in_the_parent(self):
+        self.assertNotIn('class', UserCreationForm.base_fields['password1'].widget.attrs)
+        self.assertEqual(member_forms.RegistrationForm.base_fields['password1'].widget.attrs['class'], 'form-control')
+
+    def test_type_attr_sets_the_input_type(self):
+        html = str(member_forms.GoalForm()['target_date'])
+        self.assertEqual(html.count('type='), 1)
+        self.assertIn('type="date"', html)
+        self.assertIn('type="date"', str(member_forms.ExportForm()['since']))
+
+    def test_benchmark_covers_every_form(self):
+        out = StringIO()
+        call_command('benchmark_forms', iterations=1, stdout=out)
+        for name in ('RegistrationForm', 'CheckInForm', 'ExportForm', 'MemberImportUploadForm'):
+            self.assertIn(name, out.getvalue())
+
+
+@plain_static
+class LiveCheckInFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = make_staff()
+        self.member = Member.objects.create(user=make_user('rider@example.com'), first_name='Rider', last_name='One')
+        self.url = reverse('staff_checkin_stream')
+
+    def new_checkin(self):
+        return CheckIn.objects.create(member=self.member, created_by=self.member.user)
+
+    def test_requires_staff(self):
+        self.client.force_login(self.member.user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_wsgi_replays_changes_since_cursor(self):
+        old = self.new_checkin()
+        since = timezone.now()
+        new = self.new_checkin()
+        self.client.force_login(self.staff)
+
+        response = self.client.get(self.url, {'since': since.isoformat()})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = response.content.decode()
+        self.assertTrue(body.startswith('retry: '))
+        self.assertEqual([event['id'] for event in parse_events(body)], [str(new.id)])
+
+        # A reconnect resumes from the last event it saw
+        new.approve(self.staff)
+        response = self.client.get(self.url, HTTP_LAST_EVENT_ID=event_ids(body)[-1])
+        events = parse_events(response.content.decode())
+        self.assertEqual([(event['id'], event['status']) for event in events], [(str(new.id), 'Confirmed')])
+        self.assertNotIn(str(old.id), response.content.decode())
+
+    def test_bulk_approval_larger_than_a_batch_is_not_cut_off(self):
+        checkins = CheckIn.objects.bulk_create(
+            CheckIn(member=self.member, created_by=self.member.user) for _ in range(FEED_BATCH_SIZE + 1)
+        )
+        since = timezone.now()
+        # Every row gets the same updated_at
+        approve_checkins(CheckIn.objects.all(), self.staff)
+        self.client.force_login(self.staff)
+
+        seen = []
+        body = self.client.get(self.url, {'since': since.isoformat()}).content.decode()
+        seen += parse_events(body)
+        self.assertEqual(len(seen), FEED_BATCH_SIZE)
+        # The browser reconnects with the last id and gets the rest
+        body = self.client.get(self.url, HTTP_LAST_EVENT_ID=event_ids(body)[-1]).content.decode()
+        seen += parse_events(body)
+        self.assertEqual(sorted(event['id'] for event in seen), sorted(str(checkin.id) for checkin in checkins))
+        self.assertEqual(parse_events(self.client.get(self.url, HTTP_LAST_EVENT_ID=event_ids(body)[-1]).content.decode()), [])
+
+    def test_pages_link_the_feed(self):
+        self.client.force_login(self.staff)
+        # Rendered even with no check-ins, so new ones can appear
+        for name in ('staff_checkins', 'staff_dashboard'):
+            self.assertContains(self.client.get(reverse(name)), 'data-checkin-feed="' + self.url)
+
+    async def test_stream_sends_backlog_then_live_events(self):
+        await sync_to_async(self.client.force_login)(self.staff)
+        self.async_client.cookies = self.client.cookies
+        since = timezone.now()
+        backlog = await sync_to_async(self.new_checkin)()
+
+        response = await self.async_client.get(self.url, {'since': since.isoformat()})
+        stream = response.streaming_content
+        try:
+            self.assertTrue(broadcaster.has_subscribers)
+            self.assertTrue((await stream.__anext__()).startswith(b'retry: '))
+            first = parse_events((await stream.__anext__()).decode())
+            self.assertEqual(first[0]['id'], str(backlog.id))
+
+            # Saved in this process: pushed by the signal once it commits
+            with self.captureOnCommitCallbacks(execute=True):
+                live = await sync_to_async(self.new_checkin)()
+            pushed = parse_events((await stream.__anext__()).decode())
+            self.assertEqual(pushed[0]['id'], str(live.id))
+
+            # Changed without a signal (e.g. by another worker): found by the poller
+            await sync_to_async(approve_checkins)(CheckIn.objects.filter(pk=live.pk), self.staff)
+            self.assertEqual(await broadcaster.poll_once(), 1)
+            polled = parse_events((await stream.__anext__()).decode())
+            self.assertEqual((polled[0]['id'], polled[0]['status']), (str(live.id), 'Confirmed'))
+
+            # Re-reading changes that were already pushed sends nothing twice
+            broadcaster.cursor = Cursor(since, None)
+            self.assertEqual(await broadcaster.poll_once(), 2)
+            polled = parse_events((await stream.__anext__()).decode())
+            self.assertEqual(polled[0]['id'], str(backlog.id))
+            await asyncio.sleep(0)
+            self.assertTrue(all(subscription.queue.empty() for subscription in broadcaster._subscribers))
+        finally:
+            await stream.aclose()
+            for subscription in list(broadcaster._subscribers):
+                broadcaster.unsubscribe(subscription)
+        self.assertFalse(broadcaster.has_subscribers)
+
+
+@plain_static
+class BufferedAuditLogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        audit_writer.flush()
+        self.member = Member.objects.create(user=make_user('rider@example.com'), first_name='Rider', last_name='One')
+
+    def test_entries_wait_for_commit_then_flush_in_one_insert(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = AuditLog.log('Member Registration', actor=self.member.user, member=self.member)
+            AuditLog.log('Check-in Requested: Lesson', actor=self.member.user, member=self.member)
+            self.assertEqual(len(audit_writer), 0)
+        self.assertEqual(len(audit_writer), 2)
+        self.assertFalse(AuditLog.objects.exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(audit_writer.flush(), 2)
+        # One INSERT (inside a savepoint, so a failed batch can be retried row by row)
+        self.assertEqual([query['sql'][:6] for query in queries if 'SAVEPOINT' not in query['sql']], ['INSERT'])
+        # Stamped when logged, not when written
+        self.assertEqual(AuditLog.objects.get(pk=first.pk).created_at, first.created_at)
+
+    def test_rolled_back_actions_are_not_logged(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(ValueError):
+                with transaction.atomic():
+                    AuditLog.log('Member Approved', member=self.member)
+                    raise ValueError
+        self.assertEqual(callbacks, [])
+        self.assertEqual(len(audit_writer), 0)
+
+    def test_size_and_age_thresholds(self):
+        writer = AuditWriter(batch_size=3, max_delay=60)
+        for _ in range(2):
+            writer.add(AuditLog(action='Member Approved', member=self.member))
+        self.assertFalse(AuditLog.objects.exists())
+        writer.add(AuditLog(action='Member Approved', member=self.member))
+        self.assertEqual(AuditLog.objects.count(), 3)
+
+        writer = AuditWriter(batch_size=100, max_delay=0)
+        writer.add(AuditLog(action='Member Approved', member=self.member))
+        self.assertEqual(AuditLog.objects.count(), 4)
+
+    def test_unwritable_entry_is_dropped_not_retried(self):
+        writer = AuditWriter(batch_size=100, max_delay=60)
+        writer.add(AuditLog(action='Member Approved', member=self.member))
+        # NOT NULL violation: the database will never accept it
+        writer.add(AuditLog(action=None, action_code='other', member=self.member))
+        writer.add(AuditLog(action='Member Approved', member=self.member))
+        with self.assertLogs('members.audit', 'ERROR'):
+            self.assertEqual(writer.flush(), 2)
+        self.assertEqual(len(writer), 0)
+        self.assertEqual(AuditLog.objects.count(), 2)
+
+    def test_entries_kept_while_database_fails_up_to_the_cap(self):
+        writer = AuditWriter(batch_size=100, max_delay=60, max_buffer=2)
+        for _ in range(2):
+            writer.add(AuditLog(action='Member Approved', member=self.member))
+        with mock.patch.object(AuditLog.objects, 'bulk_create', side_effect=OperationalError('gone away')):
+            with self.assertLogs('members.audit', 'ERROR'):
+                self.assertEqual(writer.flush(), 0)
+        self.assertEqual(len(writer), 2)
+
+        # Full: the next entry is written straight away instead of buffered
+        writer.add(AuditLog(action='Member Approved', member=self.member))
+        self.assertEqual((len(writer), AuditLog.objects.count()), (2, 1))
+        self.assertEqual(writer.flush(), 2)
+
+    def test_flushed_at_end_of_request(self):
+        audit_writer.add(AuditLog(action='Member Approved', member=self.member))
+        self.client.get(reverse('home'))
+        self.assertEqual(len(audit_writer), 0)
+        self.assertTrue(AuditLog.objects.filter(action='Member Approved').exists())
+
+    def test_strict_entries_are_written_immediately(self):
+        AuditLog.log('Document Signed: Waiver', member=self.member, strict=True)
+        self.assertEqual(len(audit_writer), 0)
+        self.assertTrue(AuditLog.objects.filter(action='Document Signed: Waiver').exists())
+
+    @override_settings(AUDIT_LOG_BUFFERED=False)
+    def test_buffering_can_be_switched_off(self):
+        AuditLog.log('Member Approved', member=self.member)
+        self.assertTrue(AuditLog.objects.exists())
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_audit_log', '--requests', '5', stdout=out)
+        self.assertIn('ms per request', out.getvalue())
+        self.assertFalse(AuditLog.objects.exists())
+        self.assertEqual(audit_writer.batch_size, 100)
+
+
+@plain_static
+class AuditLogArchiveTests(TestCase):
+    def setUp(self):
+        self.member = Member.objects.create(first_name='Rider', last_name='One')
+        self.now = timezone.now()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = Path(tmp.name)
+
+    def entry(self, action, days_ago):
+        return AuditLog.objects.create(
+            action=action, member=self.member, created_at=self.now - timedelta(days=days_ago)
+        )
+
+    def archive(self, *args):
+        out = StringIO()
+        call_command('archive_audit_log', '--months', '2', '--output-dir', str(self.directory), *args, stdout=out)
+        return out.getvalue()
+
+    def test_action_codes(self):
+        self.assertEqual(AuditLog.code_for('Document Signed: Liability Waiver'), 'document_signed')
+        self.assertEqual(AuditLog.code_for('Check-in Requested: Lesson'), 'checkin_requested')
+        self.assertEqual(AuditLog.code_for('Member Approved'), 'member_approved')
+        self.assertEqual(AuditLog.code_for('Something Else'), 'other')
+        self.assertEqual(AuditLog.log('Member Registration', strict=True).action_code, 'member_registration')
+
+    def test_admin_filter_is_bounded(self):
+        for name in ('A', 'B', 'C'):
+            AuditLog.log(f'Document Signed: {name}', member=self.member, strict=True)
+        self.client.force_login(make_user('admin@example.com', is_staff=True, is_superuser=True))
+        url = reverse('admin:members_auditlog_changelist')
+        response = self.client.get(url, {'action_code': 'document_signed'})
+        self.assertEqual(response.context['cl'].result_count, 3)
+        self.assertNotContains(self.client.get(url), 'action__exact')
+
+    def test_archives_old_months_with_manifest(self):
+        old = [self.entry('Member Registration', 200), self.entry('Member Approved', 201), self.entry('Member Approved', 400)]
+        recent = self.entry('Check-in Requested: Lesson', 1)
+
+        output = self.archive()
+        self.assertIn('Archived 3 audit log entries', output)
+        self.assertEqual(list(AuditLog.objects.values_list('pk', flat=True)), [recent.pk])
+
+        manifest = json.loads((self.directory / 'manifest.json').read_text())
+        self.assertEqual(sum(record['rows'] for record in manifest['archives']), 3)
+        archived = set()
+        for record in manifest['archives']:
+            with gzip.open(self.directory / record['file'], 'rt') as fh:
+                rows = [json.loads(line) for line in fh]
+            self.assertEqual(len(rows), record['rows'])
+            archived.update(row['id'] for row in rows)
+            self.assertEqual(rows[0]['action_code'], AuditLog.code_for(rows[0]['action']))
+        self.assertEqual(archived, {str(entry.pk) for entry in old})
+
+        # Nothing left to archive, and the manifest keeps earlier runs
+        self.assertIn('Archived 0', self.archive())
+        self.assertEqual(json.loads((self.directory / 'manifest.json').read_text()), manifest)
+
+    def test_dry_run_and_keep_rows(self):
+        self.entry('Member Approved', 200)
+        self.assertIn('1 months would be archived', self.archive('--dry-run'))
+        self.assertFalse((self.directory / 'manifest.json').exists())
+
+        self.archive('--keep-rows')
+        self.assertTrue((self.directory / 'manifest.json').exists())
+        self.assertEqual(AuditLog.objects.count(), 1)
+
+    @override_settings(AUDIT_ARCHIVE_DIR=None)
+    def test_refuses_to_purge_without_an_output_directory(self):
+        self.entry('Member Approved', 200)
+        with self.assertRaises(CommandError):
+            call_command('archive_audit_log', '--months', '2', stdout=StringIO())
+        self.assertEqual(AuditLog.objects.count(), 1)
+
+        # The scheduled job only keeps the partitions ahead, so it needs no directory
+        out = StringIO()
+        call_command('archive_audit_log', '--months', '2', '--partitions-only', stdout=out)
+        self.assertIn('1 months left to archive', out.getvalue())
+        self.assertEqual(AuditLog.objects.count(), 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'audit_log is only partitioned on PostgreSQL')
+class AuditLogPartitionMigrationTests(TransactionTestCase):
+    before = [('members', '0007_audit_log_created_default')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def partition_rows(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {name}')
+            return cursor.fetchone()[0]
+
+    def test_existing_rows_move_into_monthly_partitions(self):
+        latest = MigrationExecutor(connection).loader.graph.leaf_nodes('members')
+        old_apps = self.migrate(self.before)
+        self.addCleanup(self.migrate, latest)
+        long_ago = timezone.now() - timedelta(days=400)
+        old_apps.get_model('members', 'AuditLog').objects.create(action='Member Approved', created_at=long_ago)
+        old_apps.get_model('members', 'AuditLog').objects.create(action='Check-in Requested: Lesson')
+
+        self.migrate(latest)
+        self.assertTrue(archive.is_partitioned())
+        month = archive.month_start(long_ago.astimezone(dt_timezone.utc))
+        name = archive.partition_name(month)
+        self.assertIn(name, archive.existing_partitions())
+        self.assertIn(archive.DEFAULT_PARTITION, archive.existing_partitions())
+        self.assertEqual(self.partition_rows(name), 1)
+        self.assertEqual(
+            sorted(AuditLog.objects.values_list('action_code', flat=True)),
+            ['checkin_requested', 'member_approved'],
+        )
+
+        # Archiving drops the month's partition with its rows
+        archive.purge_month(month)
+        self.assertNotIn(name, archive.existing_partitions())
+        self.assertEqual(AuditLog.objects.count(), 1)
+
+    def test_rows_in_the_default_partition_move_to_a_new_partition(self):
+        # A month nobody created a partition for in time
+        later = archive.add_months(archive.month_start(timezone.now().astimezone(dt_timezone.utc)), 6)
+        name = archive.partition_name(later)
+        self.addCleanup(archive.purge_month, later)
+        entry = AuditLog.objects.create(action='Member Approved', created_at=archive.month_bounds(later)[0] + timedelta(days=2))
+        self.assertNotIn(name, archive.existing_partitions())
+        self.assertEqual(self.partition_rows(archive.DEFAULT_PARTITION), 1)
+
+        self.assertIn(name, archive.ensure_partitions(months_ahead=6))
+        self.assertEqual(self.partition_rows(name), 1)
+        self.assertEqual(self.partition_rows(archive.DEFAULT_PARTITION), 0)
+        self.assertIn(archive.DEFAULT_PARTITION, archive.existing_partitions())
+        self.assertEqual(list(AuditLog.objects.values_list('pk', flat=True)), [entry.pk])
+
+    def test_reverse_keeps_rows(self):
+        latest = MigrationExecutor(connection).loader.graph.leaf_nodes('members')
+        AuditLog.objects.create(action='Member Approved', created_at=timezone.now() - timedelta(days=400))
+        self.addCleanup(self.migrate, latest)
+        old_apps = self.migrate(self.before)
+        self.assertFalse(archive.is_partitioned())
+        self.assertEqual(old_apps.get_model('members', 'AuditLog').objects.count(), 1)
+
+
+@plain_static
+class DataExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = make_staff()
+        self.client.force_login(self.staff)
+        self.url = reverse('staff_export')
+        make_members(3)
+        self.rider = Member.objects.get(last_name='0')
+        self.rider.status = 'Approved'
+        self.rider.first_name = '=HYPERLINK("http://evil")'
+        self.rider.save()
+
+    def download(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_member_roster_csv(self):
+        rows = list(csv.reader(self.download(dataset='members', format='csv').splitlines()))
+        self.assertEqual(rows[0][:3], ['id', 'first_name', 'last_name'])
+        self.assertEqual(len(rows), 4)
+        # Formula-looking text is neutralised for spreadsheet apps
+        self.assertIn('\'=HYPERLINK("http://evil")', [row[1] for row in rows])
+
+    def test_filters(self):
+        rows = list(csv.reader(self.download(dataset='members', format='csv', status='Approved').splitlines()))
+        self.assertEqual([row[0] for row in rows[1:]], [str(self.rider.pk)])
+
+        CheckIn.objects.create(member=self.rider, created_by=self.rider.user, requested_at=timezone.now() - timedelta(days=400))
+        recent = CheckIn.objects.create(member=self.rider, created_by=self.rider.user)
+        since = (timezone.localdate() - timedelta(days=30)).isoformat()
+        lines = self.download(dataset='checkins', format='jsonl', since=since).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [str(recent.pk)])
+
+    def test_one_query_whatever_the_size(self):
+        for count in (3, 40):
+            make_members(count, start=100 + count)
+            with self.assertNumQueries(1):
+                lines = list(export_lines('members', 'jsonl'))
+            self.assertEqual(len(lines), Member.objects.count())
+
+    def test_signatures_have_no_status_filter(self):
+        response = self.client.get(self.url, {'dataset': 'signatures', 'format': 'csv', 'status': 'Pending'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_is_audited(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.download(dataset='signatures', format='csv')
+        audit_writer.flush()
+        self.assertTrue(AuditLog.objects.filter(action='Data Export: signatures', actor=self.staff).exists())
+
+    def test_staff_only(self):
+        self.client.force_login(self.rider.user)
+        self.assertEqual(self.client.get(self.url, {'dataset': 'members'}).status_code, 302)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_data', 'members', '--format', 'jsonl', '--status', 'Approved', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['id'], str(self.rider.pk))
+        with self.assertRaises(CommandError):
+            call_command('export_data', 'signatures', '--status', 'Approved')
+
+
+ROSTER = """Email,First Name,Last Name,Parent Name,Phone,Membership Tier,Status
+ava@example.com,Ava,Stone,Pat Stone,555-0101,Lesson,
+RIDER@example.com,Dupe,Existing,,555-0102,Lesson,
+ben@example.com,Ben,Cole,,555-0103,Camp,Approved
+not-an-email,Cal,Reed,,555-0104,Lesson,
+dan@example.com,Dan,Fox,,555-0105,Unicorn,
+ava@EXAMPLE.com,Ava,Again,,555-0106,Lesson,
+"""
+
+
+@plain_static
+class MemberImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        audit_writer.flush()
+        Member.objects.create(user=make_user('rider@example.com'), first_name='Rider', last_name='One')
+
+    def run_import(self, text, **kwargs):
+        importer = MemberImporter(chunk_size=2, **kwargs)
+        results = list(importer.run(text.splitlines(keepends=True)))
+        return importer, {result.row: result for result in results}
+
+    def test_creates_valid_rows_and_reports_the_rest(self):
+        importer, results = self.run_import(ROSTER)
+        self.assertEqual(
+            {row: result.outcome for row, result in results.items()},
+            {2: 'created', 3: 'skipped', 4: 'created', 5: 'error', 6: 'error', 7: 'skipped'},
+        )
+        self.assertIn('email', results[5].message)
+        self.assertIn('membership_tier', results[6].message)
+        self.assertEqual(importer.counts['created'], 2)
+
+        ava = Member.objects.select_related('user').get(user__email='ava@example.com')
+        self.assertEqual((ava.parent_name, ava.status, ava.certification_level), ('Pat Stone', 'Pending', 'None'))
+        self.assertFalse(ava.user.has_usable_password())
+        self.assertEqual(Member.objects.get(first_name='Ben').status, 'Approved')
+        self.assertEqual(AuditLog.objects.filter(action_code='member_imported').count(), 2)
+        # Searchable straight away, although bulk_create skips save()
+        self.assertIn('ava@example.com', ava.search_text)
+        self.assertEqual(list(get_search_backend().search(Member.objects.all(), 'Stone')), [ava])
+
+    def test_rerun_is_resumable(self):
+        self.run_import(ROSTER)
+        importer, results = self.run_import(ROSTER)
+        self.assertEqual(importer.counts['created'], 0)
+        self.assertEqual(results[2].outcome, 'skipped')
+        self.assertEqual(Member.objects.count(), 3)
+
+    def test_queries_per_chunk_not_per_row(self):
+        rows = ''.join(f'r{i}@example.com,R,{i},,555,Lesson,\n' for i in range(20))
+        header = ROSTER.splitlines()[0] + '\n'
+        with CaptureQueriesContext(connection) as ctx:
+            importer = MemberImporter(chunk_size=10)
+            list(importer.run((header + rows).splitlines(keepends=True)))
+        self.assertEqual(importer.counts['created'], 20)
+        # One email lookup, then per chunk: savepoint, 3 INSERTs, FTS insert, release
+        self.assertLessEqual(len(ctx.captured_queries), 1 + 2 * 6)
+
+    def test_dry_run_writes_nothing(self):
+        importer, _ = self.run_import(ROSTER, dry_run=True)
+        self.assertEqual(importer.counts['created'], 2)
+        self.assertEqual(Member.objects.count(), 1)
+
+    def test_command_writes_report(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        source = Path(tmp.name) / 'roster.csv'
+        source.write_text(ROSTER)
+        out = StringIO()
+        call_command('import_members', str(source), stdout=out, stderr=StringIO())
+        self.assertIn('Created 2 members; skipped 2 existing; 2 errors', out.getvalue())
+        with open(f'{source}.report.csv') as fh:
+            report = sorted(csv.DictReader(fh), key=lambda row: int(row['row']))
+        # Rows are reported as their chunk completes, so sort by row number
+        self.assertEqual([row['outcome'] for row in report], ['created', 'skipped', 'created', 'error', 'error', 'skipped'])
+
+    def test_admin_upload(self):
+        self.client.force_login(make_user('admin@example.com', is_staff=True, is_superuser=True))
+        url = reverse('admin:members_member_import')
+        self.assertContains(self.client.get(reverse('admin:members_member_changelist')), url)
+        response = self.client.post(url, {'file': SimpleUploadedFile('roster.csv', ROSTER.encode('utf-8-sig'))})
+        self.assertContains(response, 'Created 2 members')
+        self.assertContains(response, 'not-an-email')
+        self.assertTrue(User.objects.filter(email='ben@example.com').exists())
+
+
+@plain_static
+class MemberMergeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        audit_writer.flush()
+        self.staff = make_staff()
+        self.keep = Member.objects.create(user=make_user('katherine@example.com'), first_name='Katherine', last_name='Smith', phone='(555) 010-0000')
+        self.dupe = Member.objects.create(user=make_user('katie@example.com'), first_name='Katie', last_name='Smith', phone='555-010-0000')
+        self.waiver = Document.objects.create(code='WAIVER', name='Waiver', content='...')
+        self.photo = Document.objects.create(code='PHOTO', name='Photo Release', content='...')
+
+    def sign(self, member, document, **kwargs):
+        return SignedDocument.objects.create(
+            document=document, member=member, user=member.user, signed_name=member.full_name,
+            snapshot=DocumentSnapshot.store(document.content), **kwargs,
+        )
+
+    def visit(self, member, days_ago):
+        return CheckIn.objects.create(
+            member=member, created_by=member.user, requested_at=timezone.now() - timedelta(days=days_ago)
+        )
+
+    def test_merge_reparents_everything(self):
+        approve_checkins(CheckIn.objects.filter(pk__in=[
+            self.visit(self.keep, 2).pk, self.visit(self.dupe, 1).pk, self.visit(self.dupe, 60).pk,
+        ]), self.staff)
+        Goal.objects.create(member=self.dupe, created_by=self.staff, title='Lope')
+        GoalRequest.objects.create(member=self.dupe, submitted_by=self.dupe.user, content='Jump')
+        Note.objects.create(member=self.dupe, author=self.staff, category='Riding', visibility='StaffOnly', content='...')
+        AuditLog.log('Member Approved', actor=self.staff, member=self.dupe, strict=True)
+        history = set(AuditLog.objects.filter(member=self.dupe))
+        kept_waiver = self.sign(self.keep, self.waiver)
+        clashing_waiver = self.sign(self.dupe, self.waiver)
+        photo = self.sign(self.dupe, self.photo)
+
+        with CaptureQueriesContext(connection) as ctx:
+            summary = merge_members(self.keep, [self.keep, self.dupe], actor=self.staff)
+        self.assertLess(len(ctx.captured_queries), 30)
+
+        self.assertEqual(self.keep.checkins.count(), 3)
+        self.assertEqual((self.keep.goals.count(), self.keep.goal_requests.count(), self.keep.notes.count()), (1, 1, 1))
+        self.assertEqual(set(self.keep.signed_documents.all()), {kept_waiver, photo})
+        # The clashing signature is kept, on the merged record
+        self.assertEqual(list(self.dupe.signed_documents.all()), [clashing_waiver])
+        self.assertEqual(summary['signatures_left_on_duplicates'], [str(clashing_waiver.pk)])
+        self.assertEqual(summary['moved']['checkin'], 2)
+
+        self.assertEqual(self.keep.attendance_all_time, 3)
+        self.assertEqual(self.keep.attendance_30d, 2)
+        self.dupe.refresh_from_db()
+        self.assertEqual((self.dupe.status, self.dupe.merged_into, self.dupe.attendance_all_time), ('Merged', self.keep, 0))
+        self.assertFalse(DailyAttendance.objects.filter(member=self.dupe).exists())
+
+        entry = AuditLog.objects.get(action_code='members_merged')
+        self.assertEqual((entry.member, entry.details['merged']), (self.keep, [str(self.dupe.pk)]))
+        # History stays on the record it was written about
+        self.assertEqual(set(AuditLog.objects.filter(member=self.dupe)), history)
+        self.assertNotIn('auditlog', summary['moved'])
+
+        # The duplicate can no longer sign in; the survivor still can
+        self.assertFalse(User.objects.get(pk=self.dupe.user_id).is_active)
+        self.assertTrue(User.objects.get(pk=self.keep.user_id).is_active)
+        self.assertEqual(summary['deactivated_users'], [str(self.dupe.user_id)])
+
+    def test_merged_members_cannot_be_merged_again(self):
+        merge_members(self.keep, [self.dupe])
+        third = Member.objects.create(first_name='Kate', last_name='Smith')
+        with self.assertRaises(MergeError):
+            merge_members(third, [self.dupe])
+        with self.assertRaises(MergeError):
+            merge_members(self.keep, [self.keep])
+
+    def test_admin_action_asks_which_to_keep(self):
+        self.client.force_login(make_user('admin@example.com', is_staff=True, is_superuser=True))
+        url = reverse('admin:members_member_changelist')
+        data = {'action': 'merge_selected_members', '_selected_action': [self.keep.pk, self.dupe.pk]}
+        response = self.client.post(url, data)
+        self.assertContains(response, 'Choose the record to keep')
+        self.assertEqual(Member.objects.filter(status='Merged').count(), 0)
+
+        response = self.client.post(url, {**data, 'survivor': self.dupe.pk}, follow=True)
+        self.assertContains(response, 'Merged 1 members into Katie Smith')
+        self.keep.refresh_from_db()
+        self.assertEqual((self.keep.status, self.keep.merged_into), ('Merged', self.dupe))
+
+    def test_duplicate_candidates(self):
+        sibling = Member.objects.create(first_name='Ava', last_name='Smith', phone='555 010 0000')
+        typo = Member.objects.create(first_name='Jon', last_name='Reed', phone='555-020-0000')
+        Member.objects.create(first_name='John', last_name='Reed')
+        Member.objects.create(first_name='Zed', last_name='Other', phone='555-030-0000')
+
+        candidates = find_duplicate_candidates()
+        pairs = {frozenset((candidate.first_id, candidate.second_id)) for candidate in candidates}
+        self.assertIn(frozenset((self.keep.pk, self.dupe.pk)), pairs)
+        self.assertNotIn(frozenset((self.keep.pk, sibling.pk)), pairs)
+        self.assertEqual(len(pairs), 2)
+        self.assertIn(typo.pk, [pk for pair in pairs for pk in pair])
+
+        merge_members(self.keep, [self.dupe])
+        self.assertEqual(len(find_duplicate_candidates()), 1)
+
+    def test_command_lists_candidates(self):
+        out = StringIO()
+        call_command('find_duplicate_members', stdout=out)
+        self.assertIn('Katherine Smith <katherine@example.com>', out.getvalue())
+        self.assertIn('1 possible duplicate pairs.', out.getvalue())
+
+
+@plain_static
+class MemberSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(make_staff())
+        self.jane = Member.objects.create(
+            user=make_user('jane.doe@example.com'),
+            first_name='Jane', last_name='Doe', phone='(555) 1234'
+        )
+        self.john = Member.objects.create(
+            user=make_user('jdoe@example.org'),
+            first_name='John', last_name='Doerr', phone='555.9876'
+        )
+
+    def search(self, query, **filters):
+        response = self.client.get(reverse('staff_members'), {'query': query, **filters})
+        return [m.id for m in response.context['members']]
+
+    def test_phone_formatting_is_ignored(self):
+        self.assertEqual(self.search('555-1234'), [self.jane.id])
+        self.assertEqual(self.search('5551234'), [self.jane.id])
+
+    def test_matches_name_and_email(self):
+        self.assertCountEqual(self.search('doe'), [self.jane.id, self.john.id])
+        self.assertEqual(self.search('example.org'), [self.john.id])
+
+    def test_result_cap_applies_after_filters(self):
+        Member.objects.filter(pk=self.jane.pk).update(status='Approved')
+        # Whichever of the two ranks first, the other must still be found
+        with mock.patch('members.search.MAX_RESULTS', 1):
+            self.assertEqual(self.search('doe', status='Approved'), [self.jane.id])
+            self.assertEqual(self.search('doe', status='Pending'), [self.john.id])
+            self.assertEqual(self.search('doe', status='Disabled'), [])
+
+    def test_index_follows_user_email_change(self):
+        user = self.jane.user
+        user.email = 'jane.rider@barn.test'
+        user.save()
+        self.assertEqual(self.search('barn.test'), [self.jane.id])
+        self.assertEqual(self.search('jane.doe@'), [])
+
+    def test_index_follows_member_edit_and_delete(self):
+        self.john.last_name = 'Smithers'
+        self.john.save()
+        self.assertEqual(self.search('smithers'), [self.john.id])
+        self.john.delete()
+        self.assertEqual(self.search('smithers'), [])
+
+    def test_admin_uses_search_backend(self):
+        self.client.force_login(make_user('admin@example.com', is_staff=True, is_superuser=True))
+        response = self.client.get(reverse('admin:members_member_changelist'), {'q': '555-1234'})
+        self.assertEqual([m.id for m in response.context['cl'].result_list], [self.jane.id])
+
+
+class CheckInApprovalTests(TestCase):
+    def setUp(self):
+        self.staff = make_staff()
+        self.member = Member.objects.create(user=make_user('rider@example.com'), first_name='Rider', last_name='One')
+        self.checkin = CheckIn.objects.create(member=self.member, created_by=self.member.user)
+
+    def test_approve_updates_stats(self):
+        self.assertTrue(self.checkin.approve(self.staff))
+        self.member.refresh_from_db()
+        self.assertEqual(self.member.attendance_all_time, 1)
+        self.assertEqual(self.member.last_checkin_at, self.checkin.confirmed_at)
+
+    def test_approve_is_idempotent(self):
+        self.checkin.approve(self.staff)
+        stale = CheckIn.objects.get(pk=self.checkin.pk)
+        stale.status = 'Pending'
+        self.assertFalse(stale.approve(self.staff))
+        self.assertEqual(stale.status, 'Confirmed')
+        self.member.refresh_from_db()
+        self.assertEqual(self.member.attendance_all_time, 1)
+
+    def test_stale_member_copies_do_not_lose_increments(self):
+        other = CheckIn.objects.create(member=self.member, created_by=self.member.user)
+        first = CheckIn.objects.select_related('member').get(pk=self.checkin.pk)
+        second = CheckIn.objects.select_related('member').get(pk=other.pk)
+        first.approve(self.staff)
+        second.approve(self.staff)
+        self.member.refresh_from_db()
+        self.assertEqual(self.member.attendance_all_time, 2)
+        self.assertEqual(second.member.attendance_all_time, 2)
+
+
+@plain_static
+class BulkCheckInApprovalTests(TestCase):
+    def setUp(self):
+        self.staff = make_staff()
+        self.riders = [
+            Member.objects.create(user=make_user(f'rider{i}@example.com'), first_name='Rider', last_name=str(i))
+            for i in range(3)
+        ]
+
+    def make_checkins(self, per_member):
+        return [
+            CheckIn.objects.create(member=member, created_by=member.user)
+            for member in self.riders
+            for _ in range(per_member)
+        ]
+
+    def test_query_count_is_constant(self):
+        self.make_checkins(1)
+        with CaptureQueriesContext(connection) as small:
+            approve_checkins(CheckIn.objects.all(), self.staff)
+        self.make_checkins(10)
+        with CaptureQueriesContext(connection) as large:
+            approve_checkins(CheckIn.objects.all(), self.staff)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_stats_and_audit_rows(self):
+        checkins = self.make_checkins(2)
+        checkins[0].approve(self.staff)
+        approved = approve_checkins(CheckIn.objects.all(), self.staff)
+        self.assertEqual(approved, 5)
+        self.assertEqual(AuditLog.objects.filter(action='Check-in Approved').count(), 5)
+        for member in self.riders:
+            member.refresh_from_db()
+            self.assertEqual(member.attendance_all_time, 2)
+            self.assertIsNotNone(member.last_checkin_at)
+
+    def test_bulk_and_single_approval_both_add_to_the_count(self):
+        # An imported member whose earlier visits have no CheckIn rows
+        Member.objects.filter(pk=self.riders[0].pk).update(attendance_all_time=10)
+        checkins = self.make_checkins(3)
+        checkins[0].approve(self.staff)
+        approve_checkins(CheckIn.objects.all(), self.staff)
+        rider = Member.objects.get(pk=self.riders[0].pk)
+        self.assertEqual(rider.attendance_all_time, 13)
+        self.assertEqual(Member.objects.get(pk=self.riders[1].pk).attendance_all_time, 3)
+
+    def test_staff_view_approves_selected(self):
+        checkins = self.make_checkins(1)
+        self.client.force_login(self.staff)
+        response = self.client.post(
+            reverse('staff_bulk_approve_checkins'),
+            {'checkin_ids': [str(checkins[0].id), str(checkins[1].id), 'not-a-uuid']},
+        )
+        self.assertRedirects(response, reverse('staff_checkins'))
+        self.assertEqual(CheckIn.objects.filter(status='Confirmed').count(), 2)
+
+
+class RollingAttendanceTests(TestCase):
+    def setUp(self):
+        self.staff = make_staff()
+        self.member = Member.objects.create(user=make_user('rider@example.com'), first_name='Rider', last_name='One')
+
+    def checkin(self, days_ago):
+        return CheckIn.objects.create(
+            member=self.member,
+            created_by=self.member.user,
+            requested_at=timezone.now() - timedelta(days=days_ago),
+        )
+
+    def attendance_30d(self):
+        self.member.refresh_from_db()
+        return self.member.attendance_30d
+
+    def test_approval_counts_recent_visits_only(self):
+        self.checkin(0).approve(self.staff)
+        approve_checkins(CheckIn.objects.filter(pk=self.checkin(3).pk), self.staff)
+        self.checkin(45).approve(self.staff)
+        self.assertEqual(self.attendance_30d(), 2)
+        self.assertEqual(self.member.attendance_all_time, 3)
+
+    def test_expire_drops_days_outside_window(self):
+        self.checkin(10).approve(self.staff)
+        self.checkin(1).approve(self.staff)
+        expire_attendance(today=timezone.localdate() + timedelta(days=25))
+        self.assertEqual(self.attendance_30d(), 1)
+        self.assertEqual(DailyAttendance.objects.count(), 1)
+
+    def test_full_rebuild_repairs_counters(self):
+        self.checkin(2).approve(self.staff)
+        self.checkin(2).approve(self.staff)
+        DailyAttendance.objects.all().delete()
+        Member.objects.update(attendance_30d=0)
+        rebuild_attendance()
+        self.assertEqual(self.attendance_30d(), 2)
+        self.assertEqual(DailyAttendance.objects.get().count, 2)
+
+    def test_failed_rebuild_keeps_the_counters(self):
+        self.checkin(2).approve(self.staff)
+        with mock.patch('members.attendance.refresh_attendance_30d', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                rebuild_attendance()
+        self.assertEqual(DailyAttendance.objects.get().count, 1)
+
+
+class ConcurrentCheckInApprovalTests(TransactionTestCase):
+    def test_no_lost_increments(self):
+        staff = make_staff()
+        member = Member.objects.create(user=make_user('rider@example.com'), first_name='Rider', last_name='One')
+        checkin_ids = [
+            CheckIn.objects.create(member=member, created_by=member.user).pk
+            for _ in range(20)
+        ]
+        retries = []
+
+        def approve(pk):
+            try:
+                while True:
+                    try:
+                        # Each worker holds a stale copy, as two staff browsers would
+                        return CheckIn.objects.get(pk=pk).approve(staff)
+                    except OperationalError:
+                        # SQLite has no row locks: a writer that finds the
+                        # database locked fails and is retried, as a request
+                        # would be
+                        retries.append(pk)
+                        time.sleep(0.01)
+            finally:
+                connections.close_all()
+
+        # Every check-in is approved twice, from different threads
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(approve, checkin_ids * 2))
+
+        self.assertEqual(results.count(True), 20)
+        if connection.features.has_select_for_update:
+            # Row locks make the second approval wait rather than fail
+            self.assertEqual(retries, [])
+        member.refresh_from_db()
+        self.assertEqual(member.attendance_all_time, 20)
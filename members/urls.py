@@ -20,7 +20,11 @@ urlpatterns = [
     path('staff/', views.staff_dashboard, name='staff_dashboard'),
     path('staff/members/', views.staff_members, name='staff_members'),
     path('staff/members/<uuid:member_id>/', views.staff_member_detail, name='staff_member_detail'),
+    path('staff/members/<uuid:member_id>/sections/<slug:section>/', views.staff_member_section, name='staff_member_section'),
     path('staff/members/<uuid:member_id>/approve/', views.staff_approve_member, name='staff_approve_member'),
     path('staff/checkins/', views.staff_checkins, name='staff_checkins'),
     path('staff/checkins/<uuid:checkin_id>/approve/', views.staff_approve_checkin, name='staff_approve_checkin'),
+    path('staff/checkins/approve/', views.staff_bulk_approve_checkins, name='staff_bulk_approve_checkins'),
+    path('staff/checkins/stream/', views.staff_checkin_stream, name='staff_checkin_stream'),
+    path('staff/export/', views.staff_export, name='staff_export'),
 ]
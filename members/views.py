@@ -1,23 +1,44 @@
 """
 Views for Double C Ranch Portal
 """
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.views.decorators.http import require_POST
 from django.contrib import messages
+from django.db import transaction
 from django.utils import timezone
-from django.db.models import Q, Count
+from django.db.models import Count
 from datetime import datetime, timedelta
+import hashlib
+import uuid
 
+from . import caching
 from .models import (
-    User, Member, Document, SignedDocument,
-    CheckIn, Goal, GoalUpdate, GoalRequest, Note, AuditLog
+    User, Member, Document, DocumentSnapshot, SignedDocument,
+    CheckIn, Goal, GoalUpdate, Note, AuditLog
 )
 from .forms import (
     RegistrationForm, SignDocumentForm, CheckInForm,
     GoalForm, GoalUpdateForm, GoalRequestForm, NoteForm,
-    MemberApprovalForm, StaffCheckInForm, MemberSearchForm
+    MemberApprovalForm, StaffCheckInForm, MemberSearchForm, ExportForm
 )
+from .exports import CONTENT_TYPES, export_lines
+from .fragments import SECTIONS, render_full_section, render_sections
+from .live import RETRY_MS, broadcaster, changes_since, event_stream, format_event, parse_cursor
+from .pagination import KeysetPage, paginate_keyset
+from .projections import checkin_list, signed_document_list
+from .search import get_search_backend
+from .services import approve_checkins, staff_dashboard_data
+from .summary import get_member_summary
+
+
+# Staff member directory
+MEMBER_PAGE_SIZE = 50
+MEMBER_COUNT_CACHE_TIMEOUT = 60  # seconds
 
 
 def get_client_ip(request):
@@ -100,9 +121,11 @@ def register(request):
 
 @login_required
 def dashboard(request):
-    """Member dashboard"""
+    """Member dashboard, served from the member's cached summary"""
+    summary, needs_documents = get_member_summary(request.user)
+    
     # Check if user has member profile
-    if not hasattr(request.user, 'member_profile'):
+    if summary is None:
         messages.error(request, 'Member profile not found. Please contact an administrator.')
         # If staff/admin, redirect to admin panel
         if request.user.is_staff or request.user.is_superuser:
@@ -110,25 +133,11 @@ def dashboard(request):
         # Otherwise show error on home page
         return render(request, 'portal/home.html')
     
-    member = request.user.member_profile
-    
-    # Get recent check-ins
-    recent_checkins = member.checkins.all()[:5]
-    
-    # Get active goals
-    active_goals = member.goals.filter(status__in=['NotStarted', 'InProgress'])
-    
-    # Get recent notes (student-visible only)
-    recent_notes = member.notes.filter(visibility='StudentVisible')[:5]
-    
-    # Check if documents are signed
-    needs_documents = not member.has_signed_all_required_documents()
-    
     context = {
-        'member': member,
-        'recent_checkins': recent_checkins,
-        'active_goals': active_goals,
-        'recent_notes': recent_notes,
+        'member': summary,
+        'recent_checkins': summary.recent_checkins,
+        'active_goals': summary.active_goals,
+        'recent_notes': summary.recent_notes,
         'needs_documents': needs_documents,
     }
     
@@ -144,51 +153,54 @@ def sign_documents(request):
         messages.error(request, 'Member profile not found.')
         return redirect('home')
     
-    # Get all required active documents
-    required_docs = Document.objects.filter(is_active=True, is_required=True)
-    
-    # Get documents already signed by this member
-    signed_doc_ids = SignedDocument.objects.filter(
-        member=member
-    ).values_list('document_id', flat=True)
-    
-    # Get unsigned documents
-    unsigned_docs = required_docs.exclude(id__in=signed_doc_ids)
+    # Required documents this member has not signed yet, fetched once per
+    # request; the large content column is served from the document cache
+    signed_doc_ids = SignedDocument.objects.filter(member=member).values('document_id')
+    unsigned_docs = list(
+        Document.objects.filter(is_active=True, is_required=True)
+        .exclude(id__in=signed_doc_ids)
+        .defer('content')
+    )
     
-    if not unsigned_docs.exists():
+    if not unsigned_docs:
         messages.info(request, 'All required documents have been signed.')
         return redirect('dashboard')
     
     # Get the first unsigned document
-    document = unsigned_docs.first()
+    document = unsigned_docs[0]
+    document.content = document.get_cached_content()
     
     if request.method == 'POST':
         form = SignDocumentForm(request.POST)
         if form.is_valid():
-            # Create signed document record
-            SignedDocument.objects.create(
-                document=document,
-                member=member,
-                user=request.user,
-                signed_name=form.cleaned_data['signed_name'],
-                signed_for_name=form.cleaned_data.get('signed_for_name', ''),
-                relationship=form.cleaned_data.get('relationship', ''),
-                ip_address=get_client_ip(request),
-                user_agent=request.META.get('HTTP_USER_AGENT', ''),
-                document_snapshot=document.content
-            )
+            snapshot = DocumentSnapshot.store(document.content)
             
-            # Log audit
-            AuditLog.log(
-                f'Document Signed: {document.name}',
-                actor=request.user,
-                member=member
-            )
+            # The signature and its audit entry are recorded together or not at all
+            with transaction.atomic():
+                SignedDocument.objects.create(
+                    document=document,
+                    member=member,
+                    user=request.user,
+                    signed_name=form.cleaned_data['signed_name'],
+                    signed_for_name=form.cleaned_data.get('signed_for_name', ''),
+                    relationship=form.cleaned_data.get('relationship', ''),
+                    ip_address=get_client_ip(request),
+                    user_agent=request.META.get('HTTP_USER_AGENT', ''),
+                    snapshot=snapshot
+                )
+                
+                # Log audit
+                AuditLog.log(
+                    f'Document Signed: {document.name}',
+                    actor=request.user,
+                    member=member,
+                    strict=True
+                )
             
             messages.success(request, f'Document "{document.name}" signed successfully.')
             
             # Check if there are more documents to sign
-            if unsigned_docs.count() > 1:
+            if len(unsigned_docs) > 1:
                 return redirect('sign_documents')
             else:
                 messages.success(request, 'All required documents signed! Your membership is pending approval.')
@@ -199,8 +211,8 @@ def sign_documents(request):
     context = {
         'document': document,
         'form': form,
-        'remaining': unsigned_docs.count(),
-        'total': required_docs.count()
+        'remaining': len(unsigned_docs),
+        'total': len(Document.required_ids())
     }
     
     return render(request, 'portal/sign_document.html', context)
@@ -297,7 +309,7 @@ def profile(request):
         return redirect('home')
     
     # Get signed documents
-    signed_docs = member.signed_documents.all()
+    signed_docs = signed_document_list(member.signed_documents.all())
     
     context = {
         'member': member,
@@ -315,54 +327,70 @@ def profile(request):
 @user_passes_test(is_staff)
 def staff_dashboard(request):
     """Staff dashboard"""
-    # Pending approvals
-    pending_members = Member.objects.filter(status='Pending').count()
-    pending_checkins = CheckIn.objects.filter(status='Pending').count()
-    open_goal_requests = GoalRequest.objects.filter(status='Open').count()
-    
-    # Recent activity
-    recent_checkins = CheckIn.objects.select_related('member').all()[:10]
-    recent_members = Member.objects.all()[:10]
-    
-    context = {
-        'pending_members': pending_members,
-        'pending_checkins': pending_checkins,
-        'open_goal_requests': open_goal_requests,
-        'recent_checkins': recent_checkins,
-        'recent_members': recent_members,
-    }
+    # Pending approvals and recent activity, shared briefly across viewers
+    context = staff_dashboard_data()
     
     return render(request, 'staff/dashboard.html', context)
 
 
+def _member_count_cache_key(params):
+    """Cache key for the directory total under a given set of filters"""
+    filters = '&'.join(f'{k}={params.get(k) or ""}' for k in ('query', 'status', 'membership_tier'))
+    return caching.directory_count.key(hashlib.md5(filters.encode()).hexdigest())
+
+
 @login_required
 @user_passes_test(is_staff)
 def staff_members(request):
     """Staff member management"""
     form = MemberSearchForm(request.GET)
-    members = Member.objects.all()
+    members = Member.objects.select_related('user').defer('search_text')
+    filters = {}
     
     if form.is_valid():
+        filters = form.cleaned_data
         query = form.cleaned_data.get('query')
         status = form.cleaned_data.get('status')
         tier = form.cleaned_data.get('membership_tier')
         
-        if query:
-            members = members.filter(
-                Q(first_name__icontains=query) |
-                Q(last_name__icontains=query) |
-                Q(phone__icontains=query) |
-                Q(user__email__icontains=query)
-            )
-        
         if status:
             members = members.filter(status=status)
         
         if tier:
             members = members.filter(membership_tier=tier)
+        
+        # Last, so that a capped search result is capped after the filters
+        if query:
+            members = get_search_backend().search(members, query)
+    
+    # The total only labels the table, so a slightly stale count is fine
+    total = caching.directory_count.get_or_set(
+        _member_count_cache_key(filters),
+        members.count,
+        MEMBER_COUNT_CACHE_TIMEOUT
+    )
+    
+    if filters.get('query'):
+        # Searches show the best-ranked matches rather than paging by date
+        page = KeysetPage(list(members[:MEMBER_PAGE_SIZE]))
+    else:
+        page = paginate_keyset(members, request.GET.get('cursor'), MEMBER_PAGE_SIZE)
+    
+    documents_complete = Member.ids_with_all_required_documents(m.id for m in page)
+    for member in page:
+        member.documents_complete = member.id in documents_complete
+    
+    next_query = None
+    if page.has_next:
+        params = request.GET.copy()
+        params['cursor'] = page.next_cursor
+        next_query = params.urlencode()
     
     context = {
-        'members': members,
+        'members': page.object_list,
+        'page': page,
+        'total': total,
+        'next_query': next_query,
         'form': form
     }
     
@@ -372,26 +400,27 @@ def staff_members(request):
 @login_required
 @user_passes_test(is_staff)
 def staff_member_detail(request, member_id):
-    """Staff view of member details"""
-    member = get_object_or_404(Member, id=member_id)
-    
-    # Get all related data
-    checkins = member.checkins.all()
-    goals = member.goals.all()
-    notes = member.notes.all()
-    signed_docs = member.signed_documents.all()
+    """Staff view of member details; the history sections come from the fragment cache"""
+    member = get_object_or_404(Member.objects.select_related('user').defer('search_text'), id=member_id)
     
     context = {
         'member': member,
-        'checkins': checkins,
-        'goals': goals,
-        'notes': notes,
-        'signed_docs': signed_docs,
+        'sections': render_sections(member.id),
     }
     
     return render(request, 'staff/member_detail.html', context)
 
 
+@login_required
+@user_passes_test(is_staff)
+def staff_member_section(request, member_id, section):
+    """Every row of one member detail section, as an HTML fragment for the "Show all" link"""
+    if section not in SECTIONS or not Member.objects.filter(id=member_id).exists():
+        raise Http404
+    
+    return HttpResponse(render_full_section(member_id, section))
+
+
 @login_required
 @user_passes_test(is_staff)
 def staff_approve_member(request, member_id):
@@ -415,21 +444,112 @@ def staff_approve_member(request, member_id):
 @user_passes_test(is_staff)
 def staff_checkins(request):
     """Staff check-in management"""
-    checkins = CheckIn.objects.select_related('member', 'created_by').all()[:50]
+    checkins = checkin_list(CheckIn.objects.all())[:50]
     
     context = {
-        'checkins': checkins
+        'checkins': checkins,
+        'feed_since': timezone.now(),
     }
     
     return render(request, 'staff/checkins.html', context)
 
 
+def _is_staff_request(request):
+    return request.user.is_authenticated and is_staff(request.user)
+
+
+async def staff_checkin_stream(request):
+    """Server-sent events for new and changed check-ins"""
+    if not await sync_to_async(_is_staff_request)(request):
+        return HttpResponseForbidden()
+    
+    cursor = parse_cursor(request.headers.get('Last-Event-ID') or request.GET.get('since'))
+    
+    if not isinstance(request, ASGIRequest):
+        # A held-open stream would pin a WSGI worker, so send what changed
+        # and let the browser reconnect after RETRY_MS
+        backlog = await sync_to_async(changes_since)(cursor) if cursor else []
+        body = f'retry: {RETRY_MS}\n\n' + ''.join(format_event(event) for event in backlog)
+        response = HttpResponse(body, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        return response
+    
+    # Subscribe before reading the backlog so nothing slips in between
+    subscription = broadcaster.subscribe()
+    try:
+        backlog = await sync_to_async(changes_since)(cursor) if cursor else []
+    except Exception:
+        broadcaster.unsubscribe(subscription)
+        raise
+    
+    response = StreamingHttpResponse(event_stream(subscription, backlog), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 @user_passes_test(is_staff)
 def staff_approve_checkin(request, checkin_id):
     """Approve a check-in"""
     checkin = get_object_or_404(CheckIn, id=checkin_id)
-    checkin.approve(request.user)
-    
-    messages.success(request, 'Check-in approved.')
+    if checkin.approve(request.user):
+        messages.success(request, 'Check-in approved.')
+    else:
+        messages.info(request, 'Check-in was already approved.')
     return redirect('staff_checkins')
+
+
+@login_required
+@user_passes_test(is_staff)
+@require_POST
+def staff_bulk_approve_checkins(request):
+    """Approve all selected check-ins at once"""
+    checkin_ids = []
+    for value in request.POST.getlist('checkin_ids'):
+        try:
+            checkin_ids.append(uuid.UUID(value))
+        except ValueError:
+            continue
+    
+    approved = approve_checkins(CheckIn.objects.filter(id__in=checkin_ids), request.user)
+    
+    if approved:
+        messages.success(request, f'{approved} check-ins approved.')
+    else:
+        messages.info(request, 'No pending check-ins were selected.')
+    return redirect('staff_checkins')
+
+
+@login_required
+@user_passes_test(is_staff)
+def staff_export(request):
+    """Stream a full export of members, check-ins or signed documents"""
+    if 'dataset' not in request.GET:
+        return render(request, 'staff/export.html', {'form': ExportForm()})
+    
+    form = ExportForm(request.GET)
+    if not form.is_valid():
+        return render(request, 'staff/export.html', {'form': form}, status=400)
+    
+    dataset = form.cleaned_data['dataset']
+    fmt = form.cleaned_data['format']
+    lines = export_lines(
+        dataset,
+        fmt,
+        since=form.cleaned_data['since'],
+        until=form.cleaned_data['until'],
+        status=form.cleaned_data['status'],
+    )
+    
+    # Exports carry personal data, so each one is on the record
+    AuditLog.log(
+        f'Data Export: {dataset}',
+        actor=request.user,
+        details={key: str(value) for key, value in form.cleaned_data.items() if value}
+    )
+    
+    filename = f'{dataset}-{timezone.localdate():%Y-%m-%d}.{fmt}'
+    response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -3,6 +3,11 @@ ASGI config for ranch_portal project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The staff live check-in feed (members.live) holds its connections open,
+so it should be served from here by an ASGI server. gunicorn.conf.py
+does that with GUNICORN_WORKER_CLASS=uvicorn, as render.yaml deploys it.
+Under WSGI the feed degrades to short responses the browser re-polls.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -14,3 +19,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ranch_portal.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.TEMPLATE_CACHE:
+    from ranch_portal.templating import warm_templates
+
+    warm_templates()
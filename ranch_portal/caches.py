@@ -0,0 +1,45 @@
+"""
+Cache backend configuration from a URL
+
+    redis://host:6379/0      Redis (rediss:// for TLS)
+    db://table_name          Database table (run ``manage.py createcachetable``)
+    file:///path/to/dir      Files on local disk (local development uses .cache/django)
+    locmem://name            Per-process memory, for tests
+    dummy://                 No caching
+"""
+from urllib.parse import urlsplit
+
+
+BACKENDS = {
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'rediss': 'django.core.cache.backends.redis.RedisCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'dummy': 'django.core.cache.backends.dummy.DummyCache',
+}
+
+DEFAULT_DB_TABLE = 'portal_cache'
+
+
+def parse_cache_url(url, key_prefix='', timeout=300):
+    """Build one CACHES entry from a cache URL"""
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in BACKENDS:
+        raise ValueError(f'Unsupported cache URL scheme: {scheme!r}')
+
+    config = {
+        'BACKEND': BACKENDS[scheme],
+        'KEY_PREFIX': key_prefix,
+        'TIMEOUT': timeout,
+    }
+    if scheme in ('redis', 'rediss'):
+        config['LOCATION'] = url
+    elif scheme == 'db':
+        config['LOCATION'] = parts.netloc or DEFAULT_DB_TABLE
+    elif scheme == 'file':
+        config['LOCATION'] = parts.path
+    elif scheme == 'locmem':
+        config['LOCATION'] = parts.netloc
+    return config
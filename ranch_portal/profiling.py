@@ -0,0 +1,327 @@
+"""
+Per-view request profiling
+
+ProfilingMiddleware samples a fraction of requests
+(REQUEST_PROFILING_SAMPLE_RATE) and records, for each one:
+
+- the number of SQL queries
+- the time spent in SQL
+- queries that ran more than once with the same shape, which is how an
+  N+1 such as ``member.user.email`` inside a template loop shows up
+- time spent rendering templates (this includes any SQL the templates
+  trigger)
+- total latency
+
+Samples go to a fixed-size ring buffer in process memory, so a busy
+worker never grows it and unsampled requests pay for one random() call.
+The admin page and the Prometheus endpoint summarise the buffer of the
+worker that serves them, as p50/p95/p99 per URL name. Alongside it each
+process keeps running totals per view (sampled requests and the sum of
+each measure) that are never trimmed, which is what Prometheus needs for
+the summaries' _count and _sum.
+
+Only requests served through the synchronous (WSGI) handler are
+profiled. Under ASGI every request, sync views included, is passed
+through untouched: the views' queries run on other threads, out of
+reach of this middleware's execute_wrapper.
+"""
+import contextvars
+import functools
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, deque, namedtuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.db import connection
+from django.http import HttpResponse
+from django.shortcuts import redirect
+from django.template.backends import django as django_backend
+from django.template.response import TemplateResponse
+from django.utils.crypto import constant_time_compare
+
+from . import runtime
+
+
+PROFILING_SAMPLE_RATE = 0.1
+PROFILING_BUFFER_SIZE = 5000
+QUANTILES = (0.5, 0.95, 0.99)
+
+Sample = namedtuple(
+    'Sample',
+    'view method status duration queries sql_time template_time duplicate_queries worst_duplicate',
+)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook: time and fingerprint each query"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        """(extra executions of repeated queries, the most repeated query)"""
+        repeated = {sql: count for sql, count in self.fingerprints.items() if count > 1}
+        if not repeated:
+            return 0, ''
+        worst = max(repeated, key=repeated.get)
+        return sum(repeated.values()) - len(repeated), f'{repeated[worst]}x {worst}'
+
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+_IN_LIST = re.compile(r'\bIN \((?:%s, )*%s\)', re.IGNORECASE)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_SPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Query text with values and IN lists collapsed, so repeats of one query match"""
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _LITERAL.sub('?', sql)
+    return _SPACE.sub(' ', sql).strip()[:300]
+
+
+def _timed_render(render):
+    """Wrap the Django backend's Template.render to time top-level renders"""
+    @functools.wraps(render)
+    def wrapper(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return render(self, context, request)
+        # Templates rendered from inside another (crispy forms, say) are
+        # already inside the outer timing
+        profile.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            profile.template_depth -= 1
+            if not profile.template_depth:
+                profile.template_time += time.perf_counter() - start
+    wrapper.profiled = True
+    return wrapper
+
+
+if not getattr(django_backend.Template.render, 'profiled', False):
+    django_backend.Template.render = _timed_render(django_backend.Template.render)
+
+
+class SampleBuffer:
+    """The last ``size`` samples of this process"""
+
+    def __init__(self, size=PROFILING_BUFFER_SIZE):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, sample):
+        with self._lock:
+            self._samples.append(sample)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._samples)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+class ViewTotals:
+    """Cumulative count and per-measure sums of this process's samples, per view"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def add(self, sample):
+        with self._lock:
+            totals = self._totals.setdefault(sample.view, Counter())
+            totals['count'] += 1
+            for measure, _, _ in METRICS:
+                totals[measure] += getattr(sample, measure)
+
+    def snapshot(self):
+        with self._lock:
+            return {view: dict(totals) for view, totals in self._totals.items()}
+
+    def clear(self):
+        """For tests; the admin's "clear samples" leaves the totals counting"""
+        with self._lock:
+            self._totals.clear()
+
+
+samples = SampleBuffer(getattr(settings, 'REQUEST_PROFILING_BUFFER_SIZE', PROFILING_BUFFER_SIZE))
+totals = ViewTotals()
+
+
+class ProfilingMiddleware:
+    """Record a Sample for a random fraction of requests; see the module docstring"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.get_response(request)
+
+        rate = getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', PROFILING_SAMPLE_RATE)
+        if not rate or random.random() >= rate:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(profile):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        duplicate_queries, worst_duplicate = profile.duplicates()
+        sample = Sample(
+            view=match.view_name if match else '<unresolved>',
+            method=request.method,
+            status=response.status_code,
+            duration=duration,
+            queries=profile.queries,
+            sql_time=profile.sql_time,
+            template_time=profile.template_time,
+            duplicate_queries=duplicate_queries,
+            worst_duplicate=worst_duplicate,
+        )
+        samples.add(sample)
+        totals.add(sample)
+        return response
+
+
+def quantile(ordered, q):
+    """Nearest-rank quantile of an already sorted list"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(snapshot=None):
+    """Per-view counts and p50/p95/p99 of each measure, slowest p95 first"""
+    by_view = {}
+    for sample in samples.snapshot() if snapshot is None else snapshot:
+        by_view.setdefault(sample.view, []).append(sample)
+
+    rows = []
+    for view, view_samples in by_view.items():
+        row = {'view': view, 'count': len(view_samples)}
+        for measure in ('duration', 'queries', 'sql_time', 'template_time', 'duplicate_queries'):
+            values = sorted(getattr(sample, measure) for sample in view_samples)
+            row[measure] = {
+                'sum': sum(values),
+                'max': values[-1],
+                **{f'p{int(q * 100)}': quantile(values, q) for q in QUANTILES},
+            }
+        worst = max(view_samples, key=lambda sample: sample.duplicate_queries)
+        row['worst_duplicate'] = worst.worst_duplicate
+        row['errors'] = sum(1 for sample in view_samples if sample.status >= 500)
+        rows.append(row)
+    rows.sort(key=lambda row: -row['duration']['p95'])
+    return rows
+
+
+METRICS = (
+    ('duration', 'portal_request_duration_seconds', 'Request latency'),
+    ('queries', 'portal_request_queries', 'SQL queries per request'),
+    ('sql_time', 'portal_request_sql_seconds', 'Time spent in SQL per request'),
+    ('template_time', 'portal_request_template_seconds', 'Time spent rendering templates per request'),
+    ('duplicate_queries', 'portal_request_duplicate_queries', 'Repeated executions of the same query per request'),
+)
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def prometheus_text(rows, view_totals, pid=None):
+    """
+    Summaries in the Prometheus text exposition format
+
+    Quantiles come from the recent samples in ``rows``; _sum and _count
+    from ``view_totals``, which only ever grow while the process lives.
+    Every series carries the worker's pid, so scrapes answered by
+    different workers are separate series rather than one that jumps.
+    """
+    pid = os.getpid() if pid is None else pid
+    recent = {row['view']: row for row in rows}
+    lines = []
+    for measure, name, help_text in METRICS:
+        lines.append(f'# HELP {name} {help_text} (sampled, per worker)')
+        lines.append(f'# TYPE {name} summary')
+        for view in sorted(view_totals):
+            labels = f'view="{_label(view)}",pid="{pid}"'
+            if view in recent:
+                stats = recent[view][measure]
+                for q in QUANTILES:
+                    lines.append(f'{name}{{{labels},quantile="{q}"}} {stats[f"p{int(q * 100)}"]:g}')
+            lines.append(f'{name}_sum{{{labels}}} {view_totals[view][measure]:g}')
+            lines.append(f'{name}_count{{{labels}}} {view_totals[view]["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def profiling_view(request):
+    """Latency, query and template percentiles per view, shown in the admin"""
+    if request.method == 'POST' and request.user.is_superuser:
+        samples.clear()
+        messages.success(request, 'Profiling samples cleared.')
+        return redirect('admin_profiling')
+
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Request profiling',
+        'rows': summarize(),
+        'sample_rate': getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', PROFILING_SAMPLE_RATE),
+        'buffer_size': samples._samples.maxlen,
+        'sample_count': len(samples),
+    }
+    return TemplateResponse(request, 'admin/profiling.html', context)
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint
+
+    Scrapers send ``Authorization: Bearer <METRICS_TOKEN>``; staff can
+    also open it in a logged-in browser. Under gunicorn the serving
+    worker's own counters (ranch_portal/runtime.py) follow the summaries.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    header = request.headers.get('Authorization', '')
+    authorized = bool(token) and constant_time_compare(header, f'Bearer {token}')
+    if not authorized and not (request.user.is_active and request.user.is_staff):
+        raise PermissionDenied
+    body = prometheus_text(summarize(), totals.snapshot()) + runtime.prometheus_text()
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
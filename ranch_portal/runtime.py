@@ -0,0 +1,203 @@
+"""
+Gunicorn runtime profile
+
+gunicorn.conf.py asks server_profile() how to run the portal:
+
+- worker class: gthread by default. Each worker serves several requests
+  on threads, so one request waiting on a slow query does not take a
+  whole worker out of service. (The live check-in feed is not held open
+  under WSGI; browsers reconnect every RETRY_MS, see members/live.py.)
+  "sync" gives the classic one-request-per-process model. "uvicorn"
+  serves the ASGI application instead, where the feed is held open and
+  one poller per worker serves every open staff page; sync views still
+  run, each request on its own thread.
+- worker count: from the CPUs this container may use (2 x CPUs + 1 for
+  sync, CPUs + 1 for gthread and uvicorn, whose threads cover the
+  waiting), capped so that the workers fit in its memory limit
+- recycling: each worker restarts after max_requests, plus a random
+  jitter so that workers do not all restart at once
+
+WorkerStats counts what each worker has done; gunicorn's request hooks
+feed it, and /metrics reports it alongside the request profiles.
+"""
+import math
+import os
+import threading
+import time
+from pathlib import Path
+
+
+# Name used in GUNICORN_WORKER_CLASS -> (gunicorn worker class, application)
+WORKER_CLASSES = {
+    'gthread': ('gthread', 'ranch_portal.wsgi:application'),
+    'sync': ('sync', 'ranch_portal.wsgi:application'),
+    'uvicorn': ('uvicorn.workers.UvicornWorker', 'ranch_portal.asgi:application'),
+}
+# Resident memory of one warmed-up worker, used to cap the worker count
+WORKER_MEMORY_MB = 160
+THREADS_PER_WORKER = 4
+MAX_REQUESTS = 1000
+MAX_REQUESTS_JITTER = 100
+
+
+def cpu_count():
+    """CPUs this process may use, honouring a container's CPU quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        quota, period = Path('/sys/fs/cgroup/cpu.max').read_text().split()
+        if quota != 'max':
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def memory_limit():
+    """Bytes of memory this process may use (container limit, else physical RAM), or None"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            value = Path(path).read_text().strip()
+        except OSError:
+            continue
+        # "max", or cgroup v1's "no limit" sentinel near 2**63
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value)
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def worker_count(worker_class, cpus, memory=None, worker_memory_mb=WORKER_MEMORY_MB):
+    """How many workers to run; one worker's worth of memory is left for the master"""
+    workers = 2 * cpus + 1 if worker_class == 'sync' else cpus + 1
+    if memory:
+        workers = min(workers, memory // (worker_memory_mb * 1024 * 1024) - 1)
+    return max(1, workers)
+
+
+def server_profile(worker_class='gthread', workers=None, threads=THREADS_PER_WORKER,
+                   worker_memory_mb=WORKER_MEMORY_MB, cpus=None, memory=None):
+    """
+    Gunicorn settings for this machine
+
+    ``workers`` overrides the computed count (WEB_CONCURRENCY). ``cpus``
+    and ``memory`` default to what this container is allowed. ``app`` is
+    the WSGI or ASGI application the worker class serves.
+    """
+    if worker_class not in WORKER_CLASSES:
+        raise ValueError(f'Unknown worker class {worker_class!r}; use one of {", ".join(WORKER_CLASSES)}.')
+    if not workers:
+        workers = worker_count(
+            worker_class,
+            cpus or cpu_count(),
+            memory_limit() if memory is None else memory,
+            worker_memory_mb,
+        )
+    gunicorn_class, app = WORKER_CLASSES[worker_class]
+    return {
+        'worker_class': gunicorn_class,
+        'workers': workers,
+        'threads': threads if worker_class == 'gthread' else 1,
+        'app': app,
+    }
+
+
+def rss_bytes():
+    """Current resident memory of this process (peak, where /proc is unavailable)"""
+    try:
+        pages = int(Path('/proc/self/statm').read_text().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        import resource
+
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class WorkerStats:
+    """Counters for one gunicorn worker, safe to update from its threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active = False
+        self.reset()
+
+    def reset(self, worker_class='', threads=1, max_requests=0):
+        """Start counting for a freshly forked worker"""
+        with self._lock:
+            self.pid = os.getpid()
+            self.started = time.time()
+            self.worker_class = worker_class
+            self.threads = threads
+            self.max_requests = max_requests
+            self.requests = 0
+            self.errors = 0
+            self.in_flight = 0
+            self.busy_time = 0.0
+
+    def start(self, worker_class, threads, max_requests):
+        self.reset(worker_class, threads, max_requests)
+        self.active = True
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+        return time.perf_counter()
+
+    def request_finished(self, started, status):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.in_flight -= 1
+            self.requests += 1
+            self.busy_time += elapsed
+            if status is None or status >= 500:
+                self.errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pid': self.pid,
+                'worker_class': self.worker_class,
+                'threads': self.threads,
+                'uptime': time.time() - self.started,
+                'requests': self.requests,
+                'errors': self.errors,
+                'in_flight': self.in_flight,
+                'busy_time': self.busy_time,
+                'max_requests': self.max_requests,
+                'rss': rss_bytes(),
+            }
+
+
+worker_stats = WorkerStats()
+
+
+WORKER_METRICS = (
+    ('requests', 'portal_worker_requests_total', 'counter', 'Requests served by this worker'),
+    ('errors', 'portal_worker_errors_total', 'counter', 'Requests that ended in a 5xx or no response'),
+    ('busy_time', 'portal_worker_busy_seconds_total', 'counter', 'Time spent handling requests, summed over threads'),
+    ('in_flight', 'portal_worker_in_flight', 'gauge', 'Requests being handled right now'),
+    ('threads', 'portal_worker_threads', 'gauge', 'Request threads in this worker'),
+    ('uptime', 'portal_worker_uptime_seconds', 'gauge', 'Seconds since this worker started'),
+    ('max_requests', 'portal_worker_max_requests', 'gauge', 'Requests after which this worker is recycled'),
+    ('rss', 'portal_worker_resident_memory_bytes', 'gauge', 'Resident memory of this worker'),
+)
+
+
+def prometheus_text(stats=None):
+    """This worker's counters in the Prometheus text format; empty outside gunicorn"""
+    if stats is None:
+        if not worker_stats.active:
+            return ''
+        stats = worker_stats.snapshot()
+    labels = f'pid="{stats["pid"]}",worker_class="{stats["worker_class"]}"'
+    lines = []
+    for key, name, kind, help_text in WORKER_METRICS:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.append(f'{name}{{{labels}}} {stats[key]:g}')
+    return '\n'.join(lines) + '\n'
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ranch_portal.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -50,6 +51,11 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'ranch_portal.urls'
 
+# Production template mode (ranch_portal/templating.py): templates are
+# compiled as a worker starts and empty forms' fields are rendered once.
+# Django's cached loader is on either way, as no loaders are listed below.
+TEMPLATE_CACHE = config('TEMPLATE_CACHE', default=not DEBUG, cast=bool)
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -76,7 +82,10 @@ if config('DATABASE_URL', default=None):
     DATABASES = {
         'default': dj_database_url.config(
             default=config('DATABASE_URL'),
-            conn_max_age=600,
+            # Persistent connections belong to a thread. Under ASGI (uvicorn
+            # workers, see ranch_portal/runtime.py) every request gets a
+            # thread of its own, so they would only pile up
+            conn_max_age=0 if config('GUNICORN_WORKER_CLASS', default='gthread') == 'uvicorn' else 600,
             conn_health_checks=True,
         )
     }
@@ -86,10 +95,56 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # A file rather than the shared in-memory database, so tests can
+            # write from several threads: SQLite then waits on a lock (for up
+            # to OPTIONS timeout) instead of failing at once
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
         }
     }
 
 
+# Cache configuration
+# Redis when CACHE_URL is set (see ranch_portal/caches.py for the formats).
+# Otherwise the database table in production, so every worker shares it,
+# and files under .cache/ for local development, so management commands
+# and runserver see the same entries. Tests run with their own memory
+# cache (ranch_portal/testing.py), whatever is configured here.
+from .caches import parse_cache_url
+
+CACHE_URL = config('CACHE_URL', default=None)
+if not CACHE_URL:
+    if config('DATABASE_URL', default=None):
+        CACHE_URL = 'db://portal_cache'
+    else:
+        CACHE_URL = f'file://{BASE_DIR / ".cache" / "django"}'
+
+CACHES = {
+    'default': parse_cache_url(CACHE_URL, key_prefix='ranch_portal'),
+}
+
+TEST_RUNNER = 'ranch_portal.testing.TestRunner'
+
+
+# Audit log entries are buffered and bulk-inserted after each request
+# (members/audit.py); set to False to insert every entry immediately
+AUDIT_LOG_BUFFERED = config('AUDIT_LOG_BUFFERED', default=True, cast=bool)
+
+# manage.py archive_audit_log moves months older than this to AUDIT_ARCHIVE_DIR
+# and deletes them from the database, so there is deliberately no default:
+# point it at durable, backed-up storage (not the app's own disk)
+AUDIT_RETENTION_MONTHS = config('AUDIT_RETENTION_MONTHS', default=12, cast=int)
+AUDIT_ARCHIVE_DIR = config('AUDIT_ARCHIVE_DIR', default=None)
+
+
+# Request profiling (ranch_portal/profiling.py): the share of requests
+# measured, and how many recent samples each worker keeps. Results are at
+# /admin/profiling/ and, for Prometheus, /metrics (send METRICS_TOKEN as a
+# bearer token)
+REQUEST_PROFILING_SAMPLE_RATE = config('REQUEST_PROFILING_SAMPLE_RATE', default=0.1, cast=float)
+REQUEST_PROFILING_BUFFER_SIZE = config('REQUEST_PROFILING_BUFFER_SIZE', default=5000, cast=int)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+
 # Custom User Model
 AUTH_USER_MODEL = 'members.User'
 
@@ -152,7 +207,8 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 # Security Settings (for production)
 if not DEBUG:
-    SECURE_SSL_REDIRECT = True
+    # Off only for local production-mode runs over plain HTTP (manage.py loadtest)
+    SECURE_SSL_REDIRECT = config('SECURE_SSL_REDIRECT', default=True, cast=bool)
     SESSION_COOKIE_SECURE = True
     CSRF_COOKIE_SECURE = True
     SECURE_BROWSER_XSS_FILTER = True
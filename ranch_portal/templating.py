@@ -0,0 +1,67 @@
+"""
+Production template mode
+
+Django already compiles each template once per process: with no loaders
+listed in settings.TEMPLATES it uses the cached loader, DEBUG or not.
+TEMPLATE_CACHE adds two things on top. warm_templates() runs as the
+WSGI/ASGI application is created; it compiles every template under
+templates/ and renders the member-facing forms once, which loads the
+widget and crispy templates, so a worker's first requests do not pay for
+them. And unbound forms reuse their rendered fields
+(members.forms.MemoizedFieldsMixin); bound forms, such as one shown again
+with its errors, are rendered in full every time.
+"""
+import logging
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+def template_names():
+    """Every template under the project's template directories, as loader names"""
+    names = []
+    for config in settings.TEMPLATES:
+        for directory in config.get('DIRS', []):
+            directory = Path(directory)
+            for path in sorted(directory.rglob('*.html')):
+                names.append(path.relative_to(directory).as_posix())
+    return names
+
+
+def prerendered_forms():
+    """The unbound forms whose field HTML is memoized"""
+    from members.forms import RegistrationForm, SignDocumentForm, CheckInForm, GoalRequestForm
+
+    return [RegistrationForm, SignDocumentForm, CheckInForm, GoalRequestForm]
+
+
+def render_form_fields(form):
+    """Render each field's widget and label the way the portal templates do"""
+    return ''.join(str(form[name]) + str(form[name].label_tag()) for name in form.fields)
+
+
+def warm_templates():
+    """Compile all project templates and pre-render the memoized forms; returns the template count"""
+    from django.contrib.auth.forms import AuthenticationForm
+    from django.template import engines
+
+    start = time.perf_counter()
+    engine = engines['django']
+    names = template_names()
+    for name in names:
+        try:
+            engine.get_template(name)
+        except Exception:
+            logger.exception('Could not compile template %s', name)
+
+    for form_class in prerendered_forms():
+        render_form_fields(form_class())
+    # The login page renders its form with crispy-forms
+    engine.from_string('{% load crispy_forms_tags %}{{ form|crispy }}').render({'form': AuthenticationForm()})
+
+    logger.info('Warmed %d templates in %.0f ms', len(names), (time.perf_counter() - start) * 1000)
+    return len(names)
@@ -0,0 +1,27 @@
+"""
+Test runner (settings.TEST_RUNNER)
+
+Tests clear the cache in setUp, so the runner swaps in a private memory
+cache for the whole run, whatever CACHE_URL points at: a developer's file
+cache, the database table or a shared Redis are never touched.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from .caches import parse_cache_url
+
+
+TEST_CACHES = {
+    'default': parse_cache_url('locmem://tests', key_prefix='ranch_portal'),
+}
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._test_caches = override_settings(CACHES=TEST_CACHES)
+        self._test_caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_caches.disable()
+        super().teardown_test_environment(**kwargs)
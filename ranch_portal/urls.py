@@ -6,8 +6,14 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from members.admin import cache_stats_view
+from .profiling import metrics_view, profiling_view
+
 urlpatterns = [
+    path('admin/cache-stats/', admin.site.admin_view(cache_stats_view), name='admin_cache_stats'),
+    path('admin/profiling/', admin.site.admin_view(profiling_view), name='admin_profiling'),
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('accounts/', include('django.contrib.auth.urls')),
     path('', include('members.urls')),
 ]
@@ -0,0 +1,93 @@
+/*
+ * Live check-in feed for staff pages
+ *
+ * Markup:
+ *   <tbody data-checkin-feed="{stream url}?since={iso time}"
+ *          data-row-template="{template id}" data-feed-limit="{max rows}">
+ *     <tr data-checkin-id="..." data-status="...">...</tr>
+ *     <tr data-feed-empty>...</tr>   (optional, removed on the first new row)
+ *   </tbody>
+ *   <span data-pending-checkins>3</span>   (optional counter)
+ *
+ * Inside rows, [data-field] elements receive event values as text,
+ * [data-pending-only] elements are removed once the check-in is no longer
+ * pending, and [data-href-template] links get the all-zero UUID in their
+ * URL replaced by the event value named in data-href-field.
+ */
+(function () {
+    'use strict';
+
+    var PLACEHOLDER_ID = '00000000-0000-0000-0000-000000000000';
+
+    function fillRow(row, event) {
+        row.dataset.checkinId = event.id;
+        row.dataset.status = event.status;
+        row.querySelectorAll('[data-field]').forEach(function (el) {
+            var value = event[el.dataset.field];
+            if (el.dataset.format === 'datetime' && value) {
+                value = new Date(value).toLocaleString([], {
+                    month: 'short', day: 'numeric', hour: 'numeric', minute: '2-digit'
+                });
+            }
+            el.textContent = value || '-';
+        });
+        row.querySelectorAll('[data-href-template]').forEach(function (el) {
+            el.href = el.dataset.hrefTemplate.replace(PLACEHOLDER_ID, event[el.dataset.hrefField]);
+        });
+        row.querySelectorAll('input[name="checkin_ids"]').forEach(function (el) {
+            el.value = event.id;
+        });
+        var badge = row.querySelector('.badge');
+        if (badge) {
+            badge.className = 'badge badge-' + event.status.toLowerCase();
+            badge.textContent = event.status;
+        }
+        if (event.status !== 'Pending') {
+            row.querySelectorAll('[data-pending-only]').forEach(function (el) { el.remove(); });
+        }
+    }
+
+    function adjustCounter(delta) {
+        document.querySelectorAll('[data-pending-checkins]').forEach(function (el) {
+            el.textContent = Math.max(0, (parseInt(el.textContent, 10) || 0) + delta);
+        });
+    }
+
+    function connect(tbody) {
+        var template = document.getElementById(tbody.dataset.rowTemplate);
+        var since = new Date(new URL(tbody.dataset.checkinFeed, window.location.href).searchParams.get('since'));
+        var limit = parseInt(tbody.dataset.feedLimit, 10) || 10;
+        var source = new EventSource(tbody.dataset.checkinFeed);
+
+        source.addEventListener('checkin', function (message) {
+            var event = JSON.parse(message.data);
+            var row = tbody.querySelector('tr[data-checkin-id="' + event.id + '"]');
+
+            if (row) {
+                if (row.dataset.status === 'Pending' && event.status !== 'Pending') {
+                    adjustCounter(-1);
+                }
+                fillRow(row, event);
+                return;
+            }
+            if (new Date(event.created_at) <= since) {
+                // Older than the page and not shown on it
+                return;
+            }
+            if (event.status === 'Pending') {
+                adjustCounter(1);
+            }
+            if (template) {
+                row = template.content.firstElementChild.cloneNode(true);
+                fillRow(row, event);
+                tbody.querySelectorAll('[data-feed-empty]').forEach(function (el) { el.remove(); });
+                tbody.prepend(row);
+                while (tbody.rows.length > limit) {
+                    tbody.deleteRow(-1);
+                }
+            }
+        });
+    }
+
+    document.querySelectorAll('[data-checkin-feed]').forEach(connect);
+})();
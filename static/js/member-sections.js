@@ -0,0 +1,42 @@
+/*
+ * "Show all" links on the staff member detail page
+ *
+ * Markup:
+ *   <div data-member-section>
+ *     ...first rows...
+ *     <a href="{section url}" data-section-all>Show all</a>
+ *   </div>
+ *
+ * The link's URL returns the whole section as an HTML fragment, which
+ * replaces the contents of the enclosing [data-member-section].
+ */
+(function () {
+    'use strict';
+
+    document.addEventListener('click', function (event) {
+        var link = event.target.closest('[data-section-all]');
+        if (!link) {
+            return;
+        }
+        var section = link.closest('[data-member-section]');
+        if (!section) {
+            return;
+        }
+        event.preventDefault();
+        link.classList.add('disabled');
+        fetch(link.href, {credentials: 'same-origin'})
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error(response.status);
+                }
+                return response.text();
+            })
+            .then(function (html) {
+                section.innerHTML = html;
+            })
+            .catch(function () {
+                // Fall back to opening the full list on its own
+                window.location.href = link.href;
+            });
+    });
+})();